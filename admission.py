@@ -0,0 +1,133 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Dict, Optional, Any, Callable, Awaitable
+
+from metrics import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+# Admission control (0 disables a limit)
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "64"))
+ADMISSION_MAX_PENDING = int(os.getenv("ADMISSION_MAX_PENDING", "2000"))
+# Fraction of ADMISSION_MAX_PENDING from which typing pauses are skipped
+ADMISSION_DEGRADE_AT = float(os.getenv("ADMISSION_DEGRADE_AT", "0.5"))
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "5"))
+
+ACCEPT = "accept"
+DEGRADE = "degrade"
+SHED = "shed"
+
+
+class AdmissionController:
+    """
+    Bounds inbound message work and decides what happens under overload.
+
+    `pending` reads how much work accepted messages have queued (journal
+    appends, mailbox backlog, delayed and outbound sends); messages waiting
+    here for a slot count as well. Webhooks carrying messages are shed once
+    that reaches `max_pending`, so Meta retries them later; from
+    `degrade_at` of it, or while every processing slot is taken, typing
+    pauses are skipped to drain the backlog faster. At most `max_in_flight`
+    messages are processed at a time.
+    """
+
+    def __init__(
+        self,
+        pending: Callable[[], int],
+        max_in_flight: int = ADMISSION_MAX_IN_FLIGHT,
+        max_pending: int = ADMISSION_MAX_PENDING,
+        degrade_at: float = ADMISSION_DEGRADE_AT,
+        retry_after: int = ADMISSION_RETRY_AFTER
+    ):
+        self._pending = pending
+        self.max_in_flight = max_in_flight
+        self.max_pending = max_pending
+        self.degrade_threshold = max_pending * degrade_at
+        self.retry_after = retry_after
+        self._slots = asyncio.Semaphore(max_in_flight) if max_in_flight > 0 else None
+        self.in_flight = 0
+        self.waiting = 0
+        self._overloaded_since = None
+
+        # Instrumentation
+        self.max_pending_seen = 0
+        self.decisions = Counter(("decision",))
+        self.skipped_delays = Counter()
+        self.slot_wait = Histogram()
+
+    def pending(self) -> int:
+        """Queued work, including messages waiting for a processing slot"""
+        return self._pending() + self.waiting
+
+    def saturated(self) -> bool:
+        return self._slots is not None and self.in_flight >= self.max_in_flight
+
+    def degraded(self, pending: Optional[int] = None) -> bool:
+        """True while typing pauses should be skipped"""
+        if pending is None:
+            pending = self.pending()
+        return (self.max_pending > 0 and pending >= self.degrade_threshold) or self.saturated()
+
+    def admit(self) -> str:
+        """Decide whether a webhook carrying messages is accepted, accepted degraded, or shed"""
+        pending = self.pending()
+        if pending > self.max_pending_seen:
+            self.max_pending_seen = pending
+
+        if self.max_pending > 0 and pending >= self.max_pending:
+            decision = SHED
+        elif self.degraded(pending):
+            decision = DEGRADE
+        else:
+            decision = ACCEPT
+        self.decisions.inc(decision)
+
+        # Log transitions, not every shed request
+        if decision == SHED and self._overloaded_since is None:
+            self._overloaded_since = time.monotonic()
+            logger.warning(f"Overloaded with {pending} pending messages, shedding webhooks with 503")
+        elif decision != SHED and self._overloaded_since is not None:
+            logger.warning(f"Accepting webhooks again after {time.monotonic() - self._overloaded_since:.1f}s of shedding")
+            self._overloaded_since = None
+        return decision
+
+    def typing_delay(self, seconds: float) -> float:
+        """The pause to show before a reply, or 0 while degraded"""
+        if self.degraded():
+            self.skipped_delays.inc()
+            return 0.0
+        return seconds
+
+    async def run(self, job: Callable[[], Awaitable]):
+        """Run one message's processing once a slot is free"""
+        if self._slots is None:
+            return await job()
+
+        started = time.monotonic()
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.slot_wait.observe(time.monotonic() - started)
+        self.in_flight += 1
+        try:
+            return await job()
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "pending": self.pending(),
+            "max_pending": self.max_pending,
+            "max_pending_seen": self.max_pending_seen,
+            "degraded": self.degraded(),
+            "decisions": {values[0]: int(count) for values, count in self.decisions.values.items()},
+            "skipped_typing_delays": int(self.skipped_delays.values.get((), 0)),
+            "slot_wait_seconds": self.slot_wait.snapshot()
+        }
@@ -0,0 +1,134 @@
+"""
+Benchmark: a burst of inbound messages, as after a marketing blast, with and
+without admission control.
+
+Posts signed webhooks from distinct senders as fast as the app acknowledges
+them, while Graph API sends take a fixed latency in-process. Reports how
+many webhooks were accepted or shed with 503, the peak backlog and task
+count, and how long the accepted messages took to drain.
+
+Run from the repository root:
+
+    python benchmarks/bench_admission.py
+"""
+import os
+import sys
+import json
+import hmac
+import time
+import asyncio
+import hashlib
+import logging
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+APP_SECRET = "bench-secret"
+os.environ.update(
+    APP_SECRET=APP_SECRET,
+    JOURNAL_PATH="",
+    DISPATCH_GLOBAL_RATE="0",
+    DISPATCH_RECIPIENT_RATE="0",
+    KB_WATCH_INTERVAL="0"
+)
+
+import httpx
+
+import main
+from admission import AdmissionController
+
+BURST = 3000
+CONCURRENCY = 200
+SEND_LATENCY = 0.05
+# (name, max in flight, max pending); 0 disables a limit
+SETUPS = [
+    ("unbounded", 0, 0),
+    ("64 in flight, 2000 queued", 64, 2000),
+    ("64 in flight, 500 queued", 64, 500)
+]
+
+
+async def fake_post(payload):
+    await asyncio.sleep(SEND_LATENCY)
+    return httpx.Response(
+        200,
+        json={"messages": [{"id": f"wamid.{time.monotonic_ns()}"}]},
+        request=httpx.Request("POST", main.GRAPH_API_URL)
+    )
+
+
+def signed_webhook(i: int):
+    body = json.dumps({
+        "object": "whatsapp_business_account",
+        "entry": [{"changes": [{"value": {"messages": [{
+            "from": f"58414{i:07d}",
+            "id": f"wamid.burst.{time.monotonic_ns()}.{i}",
+            "timestamp": str(int(time.time())),
+            "type": "text",
+            "text": {"body": "Hola"}
+        }]}}]}]
+    }).encode()
+    signature = "sha256=" + hmac.new(APP_SECRET.encode(), body, hashlib.sha256).hexdigest()
+    return body, {"X-Hub-Signature-256": signature}
+
+
+async def burst(max_in_flight: int, max_pending: int):
+    main.admission = AdmissionController(
+        main.queued_work,
+        max_in_flight=max_in_flight,
+        max_pending=max_pending
+    )
+    main.resilient_sender.post = fake_post
+    main.user_sessions.clear()
+    await main.startup_event()
+
+    statuses = Counter()
+    peaks = {"backlog": 0, "tasks": 0}
+    done = asyncio.Event()
+
+    async def sample():
+        while not done.is_set():
+            peaks["backlog"] = max(peaks["backlog"], main.admission.pending())
+            # Not counting the posting tasks and this sampler
+            peaks["tasks"] = max(peaks["tasks"], len(asyncio.all_tasks()) - CONCURRENCY - 2)
+            await asyncio.sleep(0.005)
+
+    sampler = asyncio.create_task(sample())
+    senders = iter(range(BURST))
+    transport = httpx.ASGITransport(app=main.app)
+    started = time.perf_counter()
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def poster():
+            for i in senders:
+                body, headers = signed_webhook(i)
+                response = await client.post("/webhook", content=body, headers=headers)
+                statuses[response.status_code] += 1
+
+        await asyncio.gather(*(poster() for _ in range(CONCURRENCY)))
+        acked = time.perf_counter() - started
+        while main.admission.pending() or main.admission.in_flight:
+            await asyncio.sleep(0.01)
+    drained = time.perf_counter() - started
+    done.set()
+    await sampler
+
+    decisions = dict(main.admission.stats()["decisions"])
+    skipped = main.admission.stats()["skipped_typing_delays"]
+    await main.shutdown_event()
+    return statuses, acked, drained, peaks, decisions, skipped
+
+
+def run():
+    logging.disable(logging.CRITICAL)
+    print(f"{BURST} webhooks, {CONCURRENCY} concurrent posts, {SEND_LATENCY * 1000:.0f} ms per Graph API send")
+    for name, max_in_flight, max_pending in SETUPS:
+        statuses, acked, drained, peaks, decisions, skipped = asyncio.run(burst(max_in_flight, max_pending))
+        print(f"\n{name}:")
+        print(f"  responses:          {dict(statuses)}, decisions {decisions}")
+        print(f"  burst acknowledged: {acked:.2f}s, accepted messages drained: {drained:.2f}s")
+        print(f"  peak queued work:   {peaks['backlog']}, app tasks: {peaks['tasks']}")
+        print(f"  typing pauses skipped: {skipped}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,101 @@
+"""
+Benchmark: broadcast send rate against the configured limit, and what an
+interrupted broadcast loses or sends twice when it is resumed.
+
+Sends go to an in-process stand-in with Graph API-like latency, so the
+numbers show how concurrency and the rate limit interact rather than
+network speed.
+
+Run from the repository root:
+
+    python benchmarks/bench_broadcast.py
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import logging
+import tempfile
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from broadcasts import BroadcastManager, BroadcastStore
+
+RECIPIENTS = 2000
+SEND_LATENCY = 0.08
+SEND_JITTER = 0.06
+# (concurrency, messages per second)
+SETUPS = [(1, 1000), (8, 1000), (32, 1000), (8, 50), (32, 200)]
+RATE_SAMPLE = 400
+
+
+class FakeSender:
+    """Answers sends after a Graph API-like delay and counts every recipient"""
+
+    def __init__(self):
+        self.delivered = Counter()
+
+    async def __call__(self, to, message):
+        await asyncio.sleep(SEND_LATENCY + random.random() * SEND_JITTER)
+        self.delivered[to] += 1
+        return True
+
+
+def recipients(count: int):
+    return [f"58414{i:07d}" for i in range(count)]
+
+
+async def send_rate(path: str, concurrency: int, rate: float) -> float:
+    sender = FakeSender()
+    manager = BroadcastManager(sender, BroadcastStore(path), concurrency=concurrency, rate=rate, burst=concurrency)
+    count = min(RATE_SAMPLE, int(rate * 5))
+    started = time.perf_counter()
+    broadcast_id = await manager.create({"type": "text", "text": "Hola"}, recipients(count))
+    async for event in manager.events(broadcast_id):
+        pass
+    elapsed = time.perf_counter() - started
+    await manager.stop()
+    return count / elapsed
+
+
+async def interrupted(path: str, after: float):
+    """Stop a broadcast partway, resume it with a fresh manager, count losses and duplicates"""
+    sender = FakeSender()
+    message = {"type": "text", "text": "Hola"}
+    manager = BroadcastManager(sender, BroadcastStore(path), concurrency=16, rate=500, burst=16)
+    broadcast_id = await manager.create(message, recipients(RECIPIENTS))
+    await asyncio.sleep(after)
+    await manager.stop()
+    before = sum(sender.delivered.values())
+
+    manager = BroadcastManager(sender, BroadcastStore(path), concurrency=16, rate=500, burst=16)
+    manager.start()
+    async for event in manager.events(broadcast_id):
+        pass
+    summary = await manager.summary(broadcast_id)
+    await manager.stop()
+
+    lost = RECIPIENTS - len(sender.delivered)
+    duplicates = sum(count - 1 for count in sender.delivered.values())
+    return before, summary["status"], lost, duplicates
+
+
+def run():
+    logging.disable(logging.CRITICAL)
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"send latency {SEND_LATENCY * 1000:.0f}-{(SEND_LATENCY + SEND_JITTER) * 1000:.0f} ms")
+        print(f"{'concurrency':>11} {'limit (msg/s)':>14} {'achieved (msg/s)':>17}")
+        for i, (concurrency, rate) in enumerate(SETUPS):
+            achieved = asyncio.run(send_rate(os.path.join(tmp, f"rate{i}.db"), concurrency, rate))
+            print(f"{concurrency:>11} {rate:>14} {achieved:>17.1f}")
+
+        print(f"\ninterrupted broadcasts of {RECIPIENTS} recipients, resumed after a restart:")
+        for i, after in enumerate((0.5, 2.0)):
+            before, status, lost, duplicates = asyncio.run(interrupted(os.path.join(tmp, f"resume{i}.db"), after))
+            print(f"  stopped after {after:.1f}s ({before} sent): {status}, {lost} lost, {duplicates} sent twice")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,143 @@
+"""
+Benchmark: cold start, measured from spawning `uvicorn main:app` to the
+first 200 on a signed POST /webhook, and to the bot's first reply reaching
+the fake Graph API (benchmarks/fake_graph_api.py).
+
+Scenarios add the startup optimizations one at a time; the first one
+preloads httpx and fuzzywuzzy like the module imports used to.
+
+Run from the repository root:
+
+    python benchmarks/bench_cold_start.py
+"""
+import os
+import sys
+import json
+import hmac
+import time
+import hashlib
+import tempfile
+import threading
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+import uvicorn
+
+import fake_graph_api
+
+APP_SECRET = "cold-start-secret"
+GRAPH_PORT = 18093
+APP_PORT = 18094
+RUNS = 7
+
+SCENARIOS = [
+    ("eager imports", {"DEFERRED_STARTUP": "false"}, "httpx, fuzzywuzzy.fuzz"),
+    ("lazy imports", {"DEFERRED_STARTUP": "false"}, None),
+    ("+ deferred startup", {"DEFERRED_STARTUP": "true"}, None)
+]
+
+replies = {}
+
+
+def on_reply(payload):
+    replies.setdefault(payload.get("to"), time.monotonic())
+
+
+def start_fake_graph_api() -> uvicorn.Server:
+    fake_graph_api.on_message = on_reply
+    server = uvicorn.Server(uvicorn.Config(fake_graph_api.app, host="127.0.0.1", port=GRAPH_PORT, log_level="error"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def signed_webhook(sender: str):
+    body = json.dumps({
+        "object": "whatsapp_business_account",
+        "entry": [{"changes": [{"value": {"messages": [{
+            "from": sender,
+            "id": f"wamid.COLD{sender}",
+            "timestamp": str(int(time.time())),
+            "type": "text",
+            "text": {"body": "Hola"}
+        }]}}]}]
+    }).encode()
+    signature = "sha256=" + hmac.new(APP_SECRET.encode(), body, hashlib.sha256).hexdigest()
+    return body, {"X-Hub-Signature-256": signature}
+
+
+def cold_start(env, preload, sender, tmp):
+    """Seconds from spawning the server to the first webhook 200, and to the first reply"""
+    command = [sys.executable, "-m", "uvicorn", "main:app", "--port", str(APP_PORT), "--log-level", "warning"]
+    if preload:
+        command = [
+            sys.executable, "-c", f"import {preload}, uvicorn.main; uvicorn.main.main()",
+            "main:app", "--port", str(APP_PORT), "--log-level", "warning"
+        ]
+    environment = dict(
+        os.environ,
+        APP_SECRET=APP_SECRET,
+        GRAPH_API_BASE_URL=f"http://127.0.0.1:{GRAPH_PORT}",
+        JOURNAL_PATH=os.path.join(tmp, f"journal_{sender}.db"),
+        DEAD_LETTER_PATH=os.path.join(tmp, "dead_letters.db"),
+        LOG_LEVEL="WARNING",
+        **env
+    )
+    body, headers = signed_webhook(sender)
+
+    started = time.monotonic()
+    server = subprocess.Popen(command, cwd=ROOT, env=environment, stderr=subprocess.DEVNULL)
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{APP_PORT}", timeout=10) as client:
+            while True:
+                try:
+                    if client.post("/webhook", content=body, headers=headers).status_code == 200:
+                        acked = time.monotonic() - started
+                        break
+                except httpx.TransportError:
+                    if server.poll() is not None:
+                        raise RuntimeError("uvicorn exited during startup")
+                    time.sleep(0.002)
+
+        deadline = time.monotonic() + 10
+        while sender not in replies and time.monotonic() < deadline:
+            time.sleep(0.002)
+        replied = replies[sender] - started if sender in replies else None
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+    return acked, replied
+
+
+def run():
+    server = start_fake_graph_api()
+
+    acks = {name: [] for name, _, _ in SCENARIOS}
+    firsts = {name: [] for name, _, _ in SCENARIOS}
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            # Round-robin over the scenarios so machine noise spreads evenly across them
+            for run_number in range(RUNS):
+                for i, (name, env, preload) in enumerate(SCENARIOS):
+                    acked, replied = cold_start(env, preload, f"58400{i}{run_number:05d}", tmp)
+                    acks[name].append(acked)
+                    if replied is not None:
+                        firsts[name].append(replied)
+    finally:
+        server.should_exit = True
+
+    print(f"{'scenario':<28} {'first 200 (ms)':>15} {'first reply (ms)':>17}")
+    for name, _, _ in SCENARIOS:
+        reply = f"{statistics.median(firsts[name]) * 1000:>17.0f}" if firsts[name] else f"{'n/a':>17}"
+        print(f"{name:<28} {statistics.median(acks[name]) * 1000:>15.0f} {reply}")
+    print(f"(median of {RUNS} runs each; the first reply includes the welcome message's 2 s typing pause)")
+
+
+if __name__ == "__main__":
+    run()
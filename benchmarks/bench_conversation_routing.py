@@ -0,0 +1,121 @@
+"""
+Benchmark: pure routing decisions per second, the original if/elif dispatch
+(is_greeting / is_negative_response rebuilding their lists per call) vs the
+compiled ConversationRouter. No messages are sent; only the decision is timed.
+
+Run from the repository root:
+
+    python benchmarks/bench_conversation_routing.py
+"""
+import os
+import sys
+import random
+import logging
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+DECISIONS = 200000
+STATES = ("new", "main_menu", "app_submenu", "questions_menu", "more_help", "rating", "finished")
+
+
+def is_greeting(text):
+    """The original greeting check"""
+    greetings = [
+        "hola", "hello", "hi", "buenas", "buenos dias", "buenas tardes",
+        "buenas noches", "saludos", "que tal", "hey", "inicio", "empezar",
+        "comenzar", "start"
+    ]
+    return text.lower().strip() in greetings
+
+
+def is_negative_response(text):
+    """The original negative response check"""
+    negative_responses = [
+        "no", "no gracias", "no, gracias", "nada más", "nada mas",
+        "ya no", "suficiente", "está bien", "esta bien", "listo",
+        "perfecto", "ok", "vale"
+    ]
+    return text.lower().strip() in negative_responses
+
+
+def legacy_route(state, message, index):
+    """The original process_message / process_text_message / process_interactive_message branching"""
+    message_type = message.get("type")
+    if message_type == "text":
+        text = message.get("text", {}).get("body", "")
+        if is_greeting(text):
+            return "welcome"
+        if state in ["new", "finished"]:
+            return "welcome"
+        if state == "more_help" and is_negative_response(text):
+            return "rating_request"
+        return "redirect"
+    elif message_type == "interactive":
+        interactive = message.get("interactive", {})
+        if interactive.get("type") == "list_reply":
+            selection_id = interactive.get("list_reply", {}).get("id")
+            if selection_id == "APP_MAIN":
+                return "app_submenu"
+            elif index.has_category(selection_id):
+                return "category_questions"
+            return "answer"
+        elif interactive.get("type") == "button_reply":
+            button_id = interactive.get("button_reply", {}).get("id")
+            if button_id == "HELP_YES":
+                return "main_menu"
+            elif button_id == "HELP_NO":
+                return "rating_request"
+            elif button_id.startswith("RATE_"):
+                return "rating"
+            return "answer"
+    elif message_type in ["image", "document", "audio", "video", "sticker"]:
+        return "media_redirect"
+    return "main_menu"
+
+
+def sample_messages(index, count):
+    rng = random.Random(3)
+    question_ids = list(index.questions)
+    category_ids = list(index.categories)
+    texts = ["Hola", "buenas tardes", "no gracias", "ok", "¿cuánto cuesta invertir en el fondo?", "necesito ayuda con mi cuenta"]
+    buttons = ["HELP_YES", "HELP_NO", "RATE_GOOD", "RATE_EXCELLENT"] + question_ids[:10]
+
+    messages = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.4:
+            message = {"type": "text", "text": {"body": rng.choice(texts)}}
+        elif kind < 0.7:
+            selection = rng.choice(category_ids + question_ids + ["APP_MAIN"])
+            message = {"type": "interactive", "interactive": {"type": "list_reply", "list_reply": {"id": selection}}}
+        elif kind < 0.95:
+            message = {"type": "interactive", "interactive": {"type": "button_reply", "button_reply": {"id": rng.choice(buttons)}}}
+        else:
+            message = {"type": rng.choice(["image", "audio", "location"])}
+        messages.append((rng.choice(STATES), message))
+    return messages
+
+
+def run():
+    logging.disable(logging.WARNING)
+    index = main.knowledge_store.current.index
+    router = main.conversation
+    messages = sample_messages(index, 10000)
+    rounds = DECISIONS // len(messages)
+
+    # Best of several rounds, to keep scheduler noise out of sub-microsecond timings
+    legacy = min(timeit.repeat(lambda: [legacy_route(s, m, index) for s, m in messages], number=1, repeat=rounds)) * rounds
+    compiled = min(timeit.repeat(lambda: [router.route(s, m, index) for s, m in messages], number=1, repeat=rounds)) * rounds
+
+    print(f"routing decisions:         {rounds * len(messages):,}")
+    print(f"if/elif dispatch:          {rounds * len(messages) / legacy:,.0f} decisions/s")
+    print(f"compiled router:           {rounds * len(messages) / compiled:,.0f} decisions/s ({legacy / compiled:.2f}x)")
+    print(f"compiled transitions:      {router.stats()['compiled_transitions']}")
+    print("(the compiled router also normalizes accents/punctuation and counts every transition)")
+
+
+if __name__ == "__main__":
+    run()
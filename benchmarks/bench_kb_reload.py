@@ -0,0 +1,89 @@
+"""
+Benchmark: knowledge base compile time and retained memory per version,
+and event loop stalls while a reload builds in the background.
+
+Run from the repository root:
+
+    python benchmarks/bench_kb_reload.py
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+from knowledge_store import KnowledgeStore, compile_knowledge_base
+
+SIZES = (50, 1000, 10000)
+QUESTIONS_PER_CATEGORY = 10
+
+
+def synthetic_document(total_questions: int) -> dict:
+    """The bundled menus with a knowledge base of the given size"""
+    categories = {}
+    for c in range(max(1, total_questions // QUESTIONS_PER_CATEGORY)):
+        category_id = f"CAT_{c}"
+        categories[category_id] = {
+            "id": category_id,
+            "title": f"Categoría {c}",
+            "questions": [
+                {
+                    "id": f"Q{q}_{category_id}",
+                    "text": f"¿Cómo funciona el trámite {q} del servicio {c}?",
+                    "answer": f"El trámite {q} del servicio {c} se realiza desde la app en la sección {q % 7}.",
+                    "short_title": f"Trámite {q}"
+                }
+                for q in range(QUESTIONS_PER_CATEGORY)
+            ]
+        }
+    menu = [{"title": "Categorías", "rows": [{"id": "CAT_0", "title": "Categoría 0", "description": "Primera"}]}]
+    return {"version": total_questions, "menus": {"main_menu": menu, "app_submenu": menu}, "categories": categories}
+
+
+async def measure_reload_stall(path: str) -> tuple:
+    """Max event loop lag observed while a reload compiles"""
+    store = KnowledgeStore(main.build_payload_templates, path=path, watch_interval=0)
+    store.load()
+
+    document = json.load(open(path))
+    document["version"] += 1
+    with open(path, "w") as f:
+        json.dump(document, f, ensure_ascii=False)
+
+    max_lag = 0.0
+    reload = asyncio.create_task(store.reload())
+    while not reload.done():
+        started = time.perf_counter()
+        await asyncio.sleep(0.001)
+        max_lag = max(max_lag, time.perf_counter() - started - 0.001)
+    await reload
+    return store.current.build_seconds, max_lag
+
+
+def run():
+    logging.disable(logging.INFO)
+    print(f"{'questions':>10} {'build (ms)':>11} {'memory (KiB)':>13} {'reload loop stall (ms)':>23}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in SIZES:
+            path = os.path.join(tmp, f"kb_{size}.json")
+            raw = json.dumps(synthetic_document(size), ensure_ascii=False).encode("utf-8")
+            with open(path, "wb") as f:
+                f.write(raw)
+
+            compiled = compile_knowledge_base(raw, path, main.build_payload_templates)
+            # Tracing slows the compile, so memory is measured in a separate build
+            traced = compile_knowledge_base(raw, path, main.build_payload_templates, measure_memory=True)
+            _, stall = asyncio.run(measure_reload_stall(path))
+            print(
+                f"{len(compiled.index):>10} {compiled.build_seconds * 1000:>11.1f} "
+                f"{traced.memory_bytes / 1024:>13.0f} {stall * 1000:>23.2f}"
+            )
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,170 @@
+"""
+Benchmark: webhook requests per second (acknowledged and fully processed)
+with the original synchronous logging.basicConfig handler vs the queued
+structured pipeline, with and without sampling. Log output goes to a
+temporary file, once as-is and once behind a sink that takes SLOW_SINK_DELAY
+per write (stderr piped to a busy log collector); Graph API sends are
+answered in-process.
+
+Run from the repository root:
+
+    python benchmarks/bench_logging.py
+"""
+import os
+import sys
+import json
+import hmac
+import time
+import asyncio
+import hashlib
+import logging
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+APP_SECRET = "bench-secret"
+os.environ.update(
+    APP_SECRET=APP_SECRET,
+    JOURNAL_PATH="",
+    DISPATCH_GLOBAL_RATE="0",
+    DISPATCH_RECIPIENT_RATE="0",
+    KB_WATCH_INTERVAL="0",
+    ADMISSION_MAX_PENDING="0",
+    THROTTLE_LIMIT="0"
+)
+
+import httpx
+
+import main
+from structured_logging import setup_logging, TEXT_FORMAT
+
+REQUESTS = 3000
+CONCURRENCY = 50
+SLOW_SINK_DELAY = 0.0002
+SAMPLING = {"message.received": 0.1, "message.routed": 0.1, "message.sent": 0.1}
+
+
+async def fake_post(payload):
+    """Answer sends in-process, like the Graph API would"""
+    return httpx.Response(
+        200,
+        json={"messages": [{"id": f"wamid.{time.monotonic_ns()}"}]},
+        request=httpx.Request("POST", main.GRAPH_API_URL)
+    )
+
+
+def webhook_body(i: int) -> bytes:
+    message = {
+        "from": f"58414{i % 500:07d}",
+        "id": f"wamid.bench.{time.monotonic_ns()}.{i}",
+        "timestamp": str(int(time.time())),
+        "type": "interactive",
+        "interactive": {"type": "list_reply", "list_reply": {"id": "SOPORTE"}}
+    }
+    return json.dumps({
+        "object": "whatsapp_business_account",
+        "entry": [{"changes": [{"value": {"messages": [message]}}]}]
+    }).encode()
+
+
+async def drive(client: httpx.AsyncClient) -> float:
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def post(i):
+        body = webhook_body(i)
+        signature = "sha256=" + hmac.new(APP_SECRET.encode(), body, hashlib.sha256).hexdigest()
+        async with semaphore:
+            response = await client.post("/webhook", content=body, headers={"X-Hub-Signature-256": signature})
+            assert response.status_code == 200
+
+    started = time.perf_counter()
+    await asyncio.gather(*(post(i) for i in range(REQUESTS)))
+    while main.mailboxes.backlog() or main.dispatcher.queue_depth():
+        await asyncio.sleep(0.001)
+    return time.perf_counter() - started
+
+
+class SlowSink:
+    """File wrapper whose writes block, like a pipe whose reader falls behind"""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, data):
+        time.sleep(SLOW_SINK_DELAY)
+        return self.stream.write(data)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def use_basic_config(log_file):
+    """The original logging.basicConfig setup: synchronous text handler"""
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    handler = logging.StreamHandler(log_file)
+    handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    root.addHandler(handler)
+    return None
+
+
+async def run_scenario(name, configure, log_path, slow):
+    with open(log_path, "w") as log_file:
+        pipeline = configure(SlowSink(log_file) if slow else log_file)
+        main.resilient_sender.post = fake_post
+        await main.startup_event()
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            await drive(client)  # warm-up
+            elapsed = await drive(client)
+        await main.shutdown_event()
+        dropped = 0
+        if pipeline is not None:
+            pipeline.stop()
+            dropped = pipeline.stats()["dropped"]
+
+    lines = sum(1 for _ in open(log_path))
+    print(f"{name:<30} {REQUESTS / elapsed:>10,.0f} req/s   {lines:>7,} log lines   {dropped:>6,} dropped")
+
+
+def run():
+    with tempfile.TemporaryDirectory() as tmp:
+        log_path = os.path.join(tmp, "bench.log")
+        # Each scenario installs its own handlers; startup/shutdown must leave them alone
+        main.log_pipeline.stop()
+        main.log_pipeline = _Inert()
+
+        def queued(log_file):
+            return setup_logging(log_file)
+
+        def sampled(log_file):
+            pipeline = setup_logging(log_file)
+            pipeline.sampler.rates.update(SAMPLING)
+            return pipeline
+
+        for slow in (False, True):
+            print(f"sink: {'slow (%.1f ms per write)' % (SLOW_SINK_DELAY * 1000) if slow else 'file'}")
+            for name, configure in (
+                ("  basicConfig (sync, text)", use_basic_config),
+                ("  queue + JSON", queued),
+                ("  queue + JSON + 10% sampling", sampled)
+            ):
+                asyncio.run(run_scenario(name, configure, log_path, slow))
+
+
+class _Inert:
+    """Stands in for main.log_pipeline so startup/shutdown leave the scenario's handlers alone"""
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def stats(self):
+        return {}
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,60 @@
+"""
+Benchmark: per-send CPU for building + serializing interactive payloads,
+per-call dict builders vs the pre-serialized PayloadTemplate cache.
+
+Run from the repository root:
+
+    python benchmarks/bench_payload_templates.py
+"""
+import os
+import sys
+import json
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+ITERATIONS = 20000
+RECIPIENT = "584141234567"
+
+
+def builder_cases():
+    """(name, per-call builder, template key) for every cached payload"""
+    kb = main.knowledge_store.current
+    cases = [
+        ("main_menu", lambda to: main.build_main_menu_message(to, kb.menus["main_menu"]), "main_menu"),
+        ("app_submenu", lambda to: main.build_app_submenu_message(to, kb.menus["app_submenu"]), "app_submenu"),
+        ("more_help", main.build_more_help_message, "more_help"),
+        ("rating_request", main.build_rating_request_message, "rating_request"),
+    ]
+    for category_id in ("SOPORTE", "RIESGOS"):
+        entries = kb.index.category_questions(category_id)
+        category = kb.categories[category_id]
+
+        def build(to, category=category):
+            # Mirrors the original send_category_questions: re-runs truncation every call
+            return main.build_category_questions_message(to, category, category["questions"])
+
+        cases.append((f"category:{category_id} ({len(entries)}q)", build, f"category:{category_id}"))
+    return cases
+
+
+def run():
+    print(f"{'payload':<26} {'builder+json (us)':>18} {'template (us)':>14} {'speedup':>8}")
+    for name, build, key in builder_cases():
+        template = main.knowledge_store.current.templates[key]
+
+        # httpx encodes json= payloads with json.dumps(...).encode()
+        assert json.loads(template.render(RECIPIENT).body) == build(RECIPIENT)
+
+        built = timeit.timeit(lambda: json.dumps(build(RECIPIENT)).encode("utf-8"), number=ITERATIONS)
+        cached = timeit.timeit(lambda: template.render(RECIPIENT), number=ITERATIONS)
+
+        built_us = built / ITERATIONS * 1e6
+        cached_us = cached / ITERATIONS * 1e6
+        print(f"{name:<26} {built_us:>18.2f} {cached_us:>14.2f} {built_us / cached_us:>7.1f}x")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,70 @@
+"""
+Micro-benchmark: question lookup by ID, linear KNOWLEDGE_BASE scan vs QuestionIndex.
+
+Run from the repository root:
+
+    python benchmarks/bench_question_index.py
+"""
+import os
+import sys
+import random
+import timeit
+from typing import Dict, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from knowledge import build_question_index
+
+SIZES = (50, 500, 5000, 20000)
+QUESTIONS_PER_CATEGORY = 10
+LOOKUPS = 2000
+
+
+def synthetic_knowledge_base(total_questions: int) -> Dict[str, Dict]:
+    """Build a knowledge base with the given number of questions"""
+    knowledge_base = {}
+    categories = max(1, total_questions // QUESTIONS_PER_CATEGORY)
+    for c in range(categories):
+        category_id = f"CAT_{c}"
+        knowledge_base[category_id] = {
+            "id": category_id,
+            "title": f"Categoria {c}",
+            "questions": [
+                {
+                    "id": f"Q{q}_{category_id}",
+                    "text": f"¿Pregunta {q} de la categoria {c}?",
+                    "answer": f"Respuesta {q} de la categoria {c}",
+                    "short_title": f"Pregunta {q}"
+                }
+                for q in range(QUESTIONS_PER_CATEGORY)
+            ]
+        }
+    return knowledge_base
+
+
+def linear_lookup(knowledge_base: Dict[str, Dict], question_id: str) -> Optional[str]:
+    """The original send_answer scan"""
+    for category in knowledge_base.values():
+        for question in category["questions"]:
+            if question["id"] == question_id:
+                return f"📋 *Pregunta:*\n{question['text']}\n\n💡 *Respuesta:*\n{question['answer']}"
+    return None
+
+
+def run():
+    print(f"{'questions':>10} {'linear (us)':>12} {'index (us)':>12} {'speedup':>9}")
+    for size in SIZES:
+        knowledge_base = synthetic_knowledge_base(size)
+        index = build_question_index(knowledge_base)
+        ids = random.choices(list(index.questions), k=LOOKUPS)
+
+        linear = timeit.timeit(lambda: [linear_lookup(knowledge_base, i) for i in ids], number=1)
+        indexed = timeit.timeit(lambda: [index.get(i).answer_text for i in ids], number=5) / 5
+
+        linear_us = linear / LOOKUPS * 1e6
+        indexed_us = indexed / LOOKUPS * 1e6
+        print(f"{len(index):>10} {linear_us:>12.2f} {indexed_us:>12.3f} {linear_us / indexed_us:>8.0f}x")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,102 @@
+"""
+Benchmark: free-text question lookup over a synthetic 10k-question
+knowledge base, fuzzy scanning every question (naive) vs QuestionSearch
+(inverted index + trigram candidates, fuzzy scoring of the top few only).
+
+Run from the repository root:
+
+    python benchmarks/bench_question_search.py
+"""
+import os
+import sys
+import time
+import random
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fuzzywuzzy import fuzz, process
+
+from knowledge import build_question_index
+from search import build_question_search, normalize
+
+CATEGORIES = 100
+QUESTIONS_PER_CATEGORY = 100
+QUERIES = 200
+NAIVE_QUERIES = 5
+
+# Spanish-like consonant-vowel(-consonant) syllables
+SYLLABLES = [c + v + e for c in "bcdfglmnprstv" for v in "aeiou" for e in ("", "", "n", "s", "r")]
+
+
+def make_word(rng):
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+
+def make_knowledge_base(rng):
+    vocabulary = list({make_word(rng) for _ in range(20000)})
+    knowledge_base = {}
+    for c in range(CATEGORIES):
+        category_id = f"CAT_{c}"
+        questions = []
+        for q in range(QUESTIONS_PER_CATEGORY):
+            words = rng.sample(vocabulary, rng.randint(3, 7))
+            questions.append({
+                "id": f"Q{q}_{category_id}",
+                "text": "¿" + " ".join(words).capitalize() + "?",
+                "answer": " ".join(rng.sample(vocabulary, 15))
+            })
+        knowledge_base[category_id] = {"id": category_id, "title": f"Categoría {c}", "questions": questions}
+    return knowledge_base
+
+
+def misspell(rng, text):
+    """Drop one character from a random word to simulate a typo"""
+    words = text.strip("¿?").split()
+    i = rng.randrange(len(words))
+    if len(words[i]) > 4:
+        j = rng.randrange(len(words[i]))
+        words[i] = words[i][:j] + words[i][j + 1:]
+    return " ".join(words)
+
+
+def run():
+    rng = random.Random(7)
+    knowledge_base = make_knowledge_base(rng)
+
+    index = build_question_index(knowledge_base)
+    started = time.perf_counter()
+    search = build_question_search(index)
+    build_ms = (time.perf_counter() - started) * 1e3
+
+    questions = [entry.question for entry in index.questions.values()]
+    queries = [(q["id"], misspell(rng, q["text"])) for q in rng.sample(questions, QUERIES)]
+
+    choices = {q["id"]: normalize(q["text"]) for q in questions}
+
+    def naive(text):
+        return process.extractOne(normalize(text), choices, scorer=fuzz.token_set_ratio, processor=None)
+
+    naive_ms = timeit.timeit(
+        lambda: [naive(text) for _, text in queries[:NAIVE_QUERIES]], number=1
+    ) / NAIVE_QUERIES * 1e3
+    indexed_ms = timeit.timeit(
+        lambda: [search.search(text) for _, text in queries], number=1
+    ) / QUERIES * 1e3
+
+    hits = 0
+    for question_id, text in queries:
+        matches = search.search(text)
+        if matches and matches[0].entry.question["id"] == question_id:
+            hits += 1
+
+    print(f"questions:                 {len(index):,}")
+    print(f"vocabulary tokens:         {len(search.postings):,}")
+    print(f"index build:               {build_ms:.0f} ms")
+    print(f"linear fuzzy scan:         {naive_ms:.2f} ms/query")
+    print(f"indexed search:            {indexed_ms:.3f} ms/query ({naive_ms / indexed_ms:.0f}x faster)")
+    print(f"top-1 accuracy (typos):    {hits / QUERIES:.1%}")
+
+
+if __name__ == "__main__":
+    run()
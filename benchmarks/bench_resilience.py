@@ -0,0 +1,93 @@
+"""
+Resilience check: sends messages through ResilientSender against the fake
+Graph API (benchmarks/fake_graph_api.py) under injected failures and reports
+delivery rate, retries, breaker trips and dead letters per scenario.
+
+Run from the repository root:
+
+    python benchmarks/bench_resilience.py
+"""
+import os
+import sys
+import time
+import asyncio
+import tempfile
+import logging
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import uvicorn
+
+import fake_graph_api
+from graph_client import GraphClient
+from resilience import ResilientSender, RetryPolicy, CircuitBreaker, DeadLetterStore
+
+PORT = 18090
+MESSAGES = 200
+CONCURRENCY = 20
+
+SCENARIOS = [
+    ("healthy", {"error_rate": 0.0}),
+    ("20% 500s", {"error_rate": 0.2, "error_status": 500}),
+    ("30% 429 + Retry-After", {"error_rate": 0.3, "error_status": 429, "retry_after": 0.05}),
+    ("10% 400s (permanent)", {"error_rate": 0.1, "error_status": 400}),
+    ("outage (all 503)", {"error_rate": 1.0, "error_status": 503})
+]
+
+
+def start_server():
+    server = uvicorn.Server(uvicorn.Config(fake_graph_api.app, host="127.0.0.1", port=PORT, log_level="error"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def run_scenario(name, faults, dead_letter_path):
+    fake_graph_api.faults.update(latency=0.0, jitter=0.0, error_rate=0.0, error_status=500, retry_after=None, hang_rate=0.0)
+    fake_graph_api.faults.update(faults)
+
+    client = GraphClient(f"http://127.0.0.1:{PORT}/v18.0/123/messages", {"Content-Type": "application/json"})
+    client.start()
+    sender = ResilientSender(
+        client.post,
+        RetryPolicy(max_attempts=4, base_delay=0.01, max_delay=0.2),
+        CircuitBreaker(failure_threshold=10, reset_timeout=0.5),
+        DeadLetterStore(dead_letter_path)
+    )
+
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def send(i):
+        async with semaphore:
+            payload = {"messaging_product": "whatsapp", "to": f"58414{i:07d}", "type": "text", "text": {"body": "hola"}}
+            return await sender.send(payload) is not None
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(send(i) for i in range(MESSAGES)))
+    elapsed = time.perf_counter() - started
+    await client.close()
+
+    stats = sender.stats()
+    print(
+        f"{name:<24} delivered {sum(results):>3}/{MESSAGES}  retries {stats['retries']:>4}  "
+        f"breaker trips {stats['circuit_breaker']['trips']}  rejected {stats['circuit_breaker']['rejected']:>3}  "
+        f"dead letters {stats['dead_letters']:>3}  {elapsed:.2f}s"
+    )
+    await sender.dead_letters.close()
+
+
+def run():
+    # Each failed attempt is logged; keep the report readable
+    logging.disable(logging.CRITICAL)
+    server = start_server()
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, (name, faults) in enumerate(SCENARIOS):
+            asyncio.run(run_scenario(name, faults, os.path.join(tmp, f"dead_letters_{i}.db")))
+    server.should_exit = True
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,79 @@
+"""
+Memory benchmark: bytes per tracked user, original dict-of-dicts layout vs
+the compact SessionRecord store.
+
+Run from the repository root:
+
+    python benchmarks/bench_session_memory.py
+"""
+import os
+import sys
+import gc
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sessions import InMemorySessionStore
+
+USER_COUNTS = (100_000, 1_000_000)
+CATEGORIES = ("PER_CAPITAL", "FONDO_MUTUAL", "APP_REGISTRO", "SOPORTE")
+
+
+def phone(i: int) -> str:
+    return f"58414{i:07d}"
+
+
+def legacy_layout(users: int):
+    """The original global dict with a dict per session"""
+    sessions = {}
+    for i in range(users):
+        sessions[phone(i)] = {
+            "state": "questions_menu",
+            "category": CATEGORIES[i % len(CATEGORIES)],
+            "last_interaction": datetime.now().isoformat()
+        }
+    return sessions
+
+
+def compact_layout(users: int):
+    """The SessionStore holding SessionRecords"""
+    store = InMemorySessionStore(max_entries=users, sweep_interval=0)
+    now = int(time.time())
+    for i in range(users):
+        store[phone(i)] = {
+            "state": "questions_menu",
+            "category": CATEGORIES[i % len(CATEGORIES)],
+            "last_interaction": now + i
+        }
+    return store
+
+
+def measure(builder, users: int) -> float:
+    """Bytes allocated per user by a layout builder"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    layout = builder(users)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del layout
+    gc.collect()
+    return (after - before) / users
+
+
+def run():
+    print(f"{'users':>10} {'dict layout (B)':>16} {'compact (B)':>12} {'saving':>8}")
+    for users in USER_COUNTS:
+        legacy = measure(legacy_layout, users)
+        compact = measure(compact_layout, users)
+        print(f"{users:>10} {legacy:>16.0f} {compact:>12.0f} {1 - compact / legacy:>7.0%}")
+
+    # What is left per compact session is mostly the phone-number key and the OrderedDict entry
+    key, packed = sys.getsizeof(phone(0)), sys.getsizeof(int(time.time()) << 24)
+    print(f"of the compact figure: {key} B key string, {packed} B packed record, the rest OrderedDict entry")
+
+
+if __name__ == "__main__":
+    run()
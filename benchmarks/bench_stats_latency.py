@@ -0,0 +1,68 @@
+"""
+Benchmark: /stats latency with 1M recorded ratings, rescanning a ratings
+list (original) vs the incrementally maintained RatingsAggregator.
+
+Run from the repository root:
+
+    python benchmarks/bench_stats_latency.py
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+from ratings import RatingsAggregator
+
+RATINGS = 1_000_000
+DAYS = 30
+CALLS = 200
+LABELS = ("Excelente ⭐⭐⭐", "Bueno ⭐⭐", "Necesita mejorar ⭐")
+
+
+def legacy_stats(ratings_list):
+    """The original /stats rating_breakdown loop"""
+    rating_counts = {}
+    for rating_data in ratings_list:
+        rating = rating_data["rating"]
+        rating_counts[rating] = rating_counts.get(rating, 0) + 1
+    return rating_counts
+
+
+def run():
+    now = time.time()
+    events = [
+        (f"58414{i % 50000:07d}", random.choice(LABELS), now - random.random() * DAYS * 86400)
+        for i in range(RATINGS)
+    ]
+
+    legacy = [{"user": user, "rating": rating, "timestamp": ts} for user, rating, ts in events]
+    main.user_ratings = RatingsAggregator()
+    started = time.perf_counter()
+    for user, rating, ts in events:
+        main.user_ratings.record(user, rating, ts)
+    record_us = (time.perf_counter() - started) / RATINGS * 1e6
+
+    loop = asyncio.new_event_loop()
+    since = str(now - 7 * 86400)
+
+    legacy_ms = timeit.timeit(lambda: legacy_stats(legacy), number=3) / 3 * 1e3
+    stats_ms = timeit.timeit(lambda: loop.run_until_complete(main.get_stats()), number=CALLS) / CALLS * 1e3
+    range_ms = timeit.timeit(
+        lambda: loop.run_until_complete(main.get_stats(since=since, granularity="day")), number=CALLS
+    ) / CALLS * 1e3
+    loop.close()
+
+    print(f"ratings recorded:          {RATINGS:,} over {DAYS} days")
+    print(f"record() per rating:       {record_us:.2f} us")
+    print(f"legacy breakdown rescan:   {legacy_ms:.2f} ms")
+    print(f"/stats (aggregator):       {stats_ms:.3f} ms")
+    print(f"/stats?since=7d&day:       {range_ms:.3f} ms")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,84 @@
+"""
+Benchmark: per-sender throttling cost and accuracy.
+
+Feeds SenderThrottle a stream of many well-behaved senders (a few messages
+each) with a handful of spammers mixed in, and reports the cost per check,
+the memory used against an exact per-sender dict, how quickly spammers are
+throttled, and how many well-behaved senders were wrongly throttled by
+sketch collisions.
+
+Run from the repository root:
+
+    python benchmarks/bench_throttle.py
+"""
+import os
+import sys
+import time
+import random
+import tracemalloc
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from throttle import SenderThrottle, DecayingSketch, ALLOW
+
+# (senders, sketch width)
+SETUPS = [(10000, 4096), (100000, 4096), (100000, 65536), (500000, 65536)]
+MESSAGES_PER_SENDER = 5
+SPAMMERS = 20
+SPAM_MESSAGES = 1000
+DURATION = 600.0
+
+
+def stream(senders: int, rng: random.Random):
+    """(time, sender) pairs over DURATION seconds, spammers sending steadily throughout"""
+    events = [(rng.random() * DURATION, f"58414{i:07d}") for i in range(senders) for _ in range(MESSAGES_PER_SENDER)]
+    events += [(rng.random() * DURATION, f"spam{i}") for i in range(SPAMMERS) for _ in range(SPAM_MESSAGES)]
+    events.sort()
+    return events
+
+
+def exact_dict_bytes(senders: int) -> int:
+    """Memory of the obvious alternative: a dict of sender -> [count, updated]"""
+    tracemalloc.start()
+    counts = {f"58414{i:07d}": [1.0, 0.0] for i in range(senders)}
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del counts
+    return size
+
+
+def run():
+    rng = random.Random(7)
+    print(f"{MESSAGES_PER_SENDER} messages per sender and {SPAMMERS} spammers sending {SPAM_MESSAGES} each over {DURATION:.0f} s")
+    print(f"{'senders':>8} {'msg/s':>6} {'width':>6} {'ns/check':>9} {'sketch KiB':>11} {'dict KiB':>9} {'spam dropped':>13} {'false throttles':>16}")
+    for senders, width in SETUPS:
+        events = stream(senders, rng)
+        throttle = SenderThrottle()
+        throttle.sketch = DecayingSketch(throttle.half_life, width=width)
+        wrongly_dropped = set()
+        spam_dropped = 0
+
+        clock = [0.0]
+        with mock.patch("throttle.time.monotonic", lambda: clock[0]):
+            started = time.perf_counter()
+            for at, sender in events:
+                clock[0] = at
+                if throttle.check(sender) != ALLOW:
+                    if sender.startswith("spam"):
+                        spam_dropped += 1
+                    else:
+                        wrongly_dropped.add(sender)
+            elapsed = time.perf_counter() - started
+
+        print(
+            f"{senders:>8} {len(events) / DURATION:>6.0f} {width:>6} {elapsed / len(events) * 1e9:>9.0f} {throttle.sketch.memory_bytes() / 1024:>11.0f} "
+            f"{exact_dict_bytes(senders) / 1024:>9.0f} {spam_dropped / (SPAMMERS * SPAM_MESSAGES):>12.0%} "
+            f"{len(wrongly_dropped):>16}"
+        )
+    print(f"(limit {throttle.limit:.0f}, half-life {throttle.half_life:.0f} s; a spammer settles at ~{SPAM_MESSAGES / DURATION * throttle.half_life / 0.693:.0f})")
+    print("Sketch cells each hold about msg/s * half-life / ln 2 / width of everyone's traffic; keep that well under the limit")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,130 @@
+"""
+Local stand-in for the WhatsApp Cloud API messages endpoint, with
+configurable latency and failure injection.
+
+Run from the repository root:
+
+    python benchmarks/fake_graph_api.py --port 9000 --error-rate 0.2 --error-status 429 --retry-after 1
+
+then point the bot at it:
+
+    GRAPH_API_BASE_URL=http://127.0.0.1:9000 uvicorn main:app
+
+Faults can be changed while it runs, e.g. to simulate an outage:
+
+    curl -X POST localhost:9000/_faults -d '{"error_rate": 1.0, "error_status": 503}'
+"""
+import time
+import random
+import asyncio
+import argparse
+import itertools
+from typing import Dict, Any, Optional, Callable
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+app = FastAPI(title="Fake Graph API")
+
+faults: Dict[str, Any] = {
+    "latency": 0.0,         # seconds added to every response
+    "jitter": 0.0,          # extra random latency, up to this many seconds
+    "error_rate": 0.0,      # fraction of requests that fail
+    "error_status": 500,    # HTTP status of injected failures
+    "retry_after": None,    # Retry-After header sent with injected failures
+    "hang_rate": 0.0        # fraction of requests that never answer (client timeout)
+}
+
+counters = {"received": 0, "succeeded": 0, "failed": 0, "hung": 0}
+sent_messages = []
+wamids = itertools.count(1)
+
+# Optional callback(payload) for every accepted message, used by in-process load tests
+on_message: Optional[Callable[[Dict[str, Any]], None]] = None
+
+# Graph API style error bodies for the statuses we inject
+ERROR_BODIES = {
+    400: {"message": "(#100) Invalid parameter", "type": "OAuthException", "code": 100},
+    401: {"message": "Error validating access token", "type": "OAuthException", "code": 190},
+    429: {"message": "(#130429) Rate limit hit", "type": "OAuthException", "code": 130429},
+    500: {"message": "An unknown error has occurred.", "type": "OAuthException", "code": 1},
+    503: {"message": "Service temporarily unavailable", "type": "OAuthException", "code": 2}
+}
+
+
+@app.post("/{version}/{phone_number_id}/messages")
+async def post_message(version: str, phone_number_id: str, request: Request):
+    """Accept a message, or fail it according to the configured faults"""
+    payload = await request.json()
+    counters["received"] += 1
+
+    delay = faults["latency"] + random.random() * faults["jitter"]
+    if delay > 0:
+        await asyncio.sleep(delay)
+
+    if random.random() < faults["hang_rate"]:
+        counters["hung"] += 1
+        await asyncio.sleep(3600)
+
+    if random.random() < faults["error_rate"]:
+        counters["failed"] += 1
+        status = faults["error_status"]
+        headers = {}
+        if faults["retry_after"] is not None:
+            headers["Retry-After"] = str(faults["retry_after"])
+        error = ERROR_BODIES.get(status, {"message": "Injected failure", "code": status})
+        return JSONResponse(status_code=status, content={"error": error}, headers=headers)
+
+    counters["succeeded"] += 1
+    if on_message is not None:
+        on_message(payload)
+    sent_messages.append((time.time(), payload))
+    del sent_messages[:-1000]
+    return {
+        "messaging_product": "whatsapp",
+        "contacts": [{"input": payload.get("to"), "wa_id": payload.get("to")}],
+        "messages": [{"id": f"wamid.FAKE{next(wamids):012d}"}]
+    }
+
+
+@app.post("/_faults")
+async def set_faults(request: Request):
+    """Update fault injection settings at runtime"""
+    updates = await request.json()
+    faults.update({key: value for key, value in updates.items() if key in faults})
+    return faults
+
+
+@app.get("/_stats")
+async def get_stats():
+    """Request counters and the last few accepted messages"""
+    return {"faults": faults, "counters": counters, "recent": sent_messages[-10:]}
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--retry-after", type=float, default=None)
+    parser.add_argument("--hang-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    faults.update(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        retry_after=args.retry_after,
+        hang_rate=args.hang_rate
+    )
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    run()
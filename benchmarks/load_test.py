@@ -0,0 +1,296 @@
+"""
+Load test: simulated investors walk through multi-step conversations
+(greeting -> category -> question -> "no more help" -> rating) against the
+bot, which talks to the fake Graph API (benchmarks/fake_graph_api.py)
+running in this process. Every webhook is signed like Meta signs them.
+
+Reports webhook throughput, p50/p99 ack latency, end-to-end reply latency
+(webhook POST to the first reply reaching the fake Graph API) and the bot's
+memory growth.
+
+Run from the repository root, with the app in-process (default) or as a
+separate uvicorn server:
+
+    python benchmarks/load_test.py --rate 5 --duration 30
+    python benchmarks/load_test.py --mode uvicorn --rate 20 --graph-latency 0.15 --error-rate 0.05
+"""
+import os
+import sys
+import json
+import hmac
+import time
+import random
+import asyncio
+import hashlib
+import logging
+import argparse
+import tempfile
+import threading
+import subprocess
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+import uvicorn
+
+import fake_graph_api
+
+APP_SECRET = "load-test-secret"
+GRAPH_PORT = 18091
+APP_PORT = 18092
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def rss_bytes(pid: Optional[int] = None) -> Optional[int]:
+    """Resident set size from /proc (Linux only)"""
+    try:
+        with open(f"/proc/{pid or 'self'}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+class ConversationScript:
+    """Builds the inbound messages of one investor's conversation"""
+
+    def __init__(self, knowledge_base: Dict, rng: random.Random):
+        self.rng = rng
+        self.categories = [c for c in knowledge_base["categories"].values() if c.get("questions")]
+
+    def steps(self) -> List[Dict]:
+        category = self.rng.choice(self.categories)
+        question = self.rng.choice(category["questions"])
+        return [
+            {"type": "text", "text": {"body": self.rng.choice(["Hola", "buenas tardes", "hola!", "Buenos días"])}},
+            {"type": "interactive", "interactive": {"type": "list_reply", "list_reply": {"id": category["id"]}}},
+            {"type": "interactive", "interactive": {"type": "list_reply", "list_reply": {"id": question["id"]}}},
+            {"type": "interactive", "interactive": {"type": "button_reply", "button_reply": {"id": "HELP_NO"}}},
+            {"type": "interactive", "interactive": {"type": "button_reply", "button_reply": {"id": "RATE_GOOD"}}}
+        ]
+
+
+def signed_webhook(sender: str, message: Dict, sequence: int) -> Tuple[bytes, Dict[str, str]]:
+    message = dict(message, **{
+        "from": sender,
+        "id": f"wamid.LOAD{sender}{sequence:03d}",
+        "timestamp": str(int(time.time()))
+    })
+    body = json.dumps({
+        "object": "whatsapp_business_account",
+        "entry": [{"changes": [{"value": {"messages": [message]}}]}]
+    }).encode()
+    signature = "sha256=" + hmac.new(APP_SECRET.encode(), body, hashlib.sha256).hexdigest()
+    return body, {"X-Hub-Signature-256": signature, "Content-Type": "application/json"}
+
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        with open(os.path.join(ROOT, "knowledge_base.json"), encoding="utf-8") as f:
+            self.script = ConversationScript(json.load(f), self.rng)
+
+        self.acks: List[float] = []
+        self.failed_acks: Dict[str, int] = defaultdict(int)
+        # sender -> [(monotonic time the step was posted)], and replies seen by the fake Graph API
+        self.steps_sent: Dict[str, List[float]] = defaultdict(list)
+        self.replies: Dict[str, List[float]] = defaultdict(list)
+        self.replies_lock = threading.Lock()
+        self.memory: List[Tuple[float, Optional[int]]] = []
+
+    def on_reply(self, payload: Dict):
+        """Called from the fake Graph API's thread for every accepted message"""
+        now = time.monotonic()
+        with self.replies_lock:
+            self.replies[payload.get("to")].append(now)
+
+    async def post(self, client: httpx.AsyncClient, sender: str, message: Dict, sequence: int):
+        body, headers = signed_webhook(sender, message, sequence)
+        started = time.monotonic()
+        self.steps_sent[sender].append(started)
+        try:
+            response = await client.post("/webhook", content=body, headers=headers)
+        except httpx.HTTPError as e:
+            self.failed_acks[type(e).__name__] += 1
+            return
+        if response.status_code == 200:
+            self.acks.append(time.monotonic() - started)
+        else:
+            self.failed_acks[str(response.status_code)] += 1
+
+    async def conversation(self, client: httpx.AsyncClient, sender: str):
+        for sequence, message in enumerate(self.script.steps()):
+            if sequence:
+                await asyncio.sleep(self.args.think_time * (0.5 + self.rng.random()))
+            await self.post(client, sender, message, sequence)
+
+    async def sample_memory(self, pid: Optional[int]):
+        while True:
+            self.memory.append((time.monotonic(), rss_bytes(pid)))
+            await asyncio.sleep(1.0)
+
+    async def drive(self, client: httpx.AsyncClient, pid: Optional[int]):
+        sampler = asyncio.create_task(self.sample_memory(pid))
+        conversations = []
+        started = time.monotonic()
+        next_start = started
+        count = 0
+        # Open-loop arrivals: conversations start at the target rate regardless of how the bot keeps up
+        while time.monotonic() - started < self.args.duration:
+            sender = f"58{self.args.seed:02d}{count:08d}"
+            conversations.append(asyncio.create_task(self.conversation(client, sender)))
+            count += 1
+            next_start += self.rng.expovariate(self.args.rate)
+            await asyncio.sleep(max(next_start - time.monotonic(), 0))
+        arrival_seconds = time.monotonic() - started
+        await asyncio.gather(*conversations)
+        posting_seconds = time.monotonic() - started
+
+        # Let replies still scheduled or queued in the bot arrive
+        await asyncio.sleep(self.args.drain)
+        sampler.cancel()
+        return count, arrival_seconds, posting_seconds
+
+    def reply_latencies(self) -> Tuple[List[float], int]:
+        """Per step, the delay until the first reply that arrived after it (and before the next step)"""
+        latencies, unanswered = [], 0
+        with self.replies_lock:
+            replies = {sender: sorted(times) for sender, times in self.replies.items()}
+        for sender, steps in self.steps_sent.items():
+            received = replies.get(sender, [])
+            for i, step in enumerate(steps):
+                until = steps[i + 1] if i + 1 < len(steps) else float("inf")
+                first = next((t for t in received if step <= t < until), None)
+                if first is None:
+                    unanswered += 1
+                else:
+                    latencies.append(first - step)
+        return latencies, unanswered
+
+    def report(self, conversations: int, arrival_seconds: float, seconds: float):
+        latencies, unanswered = self.reply_latencies()
+        posted = sum(len(steps) for steps in self.steps_sent.values())
+        memory = [rss for _, rss in self.memory if rss is not None]
+
+        def ms(value):
+            return f"{value * 1000:8.1f} ms" if value is not None else "       n/a"
+
+        print(f"conversations started:    {conversations} ({conversations / arrival_seconds:.1f}/s, target {self.args.rate}/s)")
+        print(f"webhooks posted:          {posted} ({posted / seconds:.1f}/s)")
+        print(f"webhooks acknowledged:    {len(self.acks)}, failed: {dict(self.failed_acks) or 0}")
+        print(f"ack latency p50 / p99:    {ms(percentile(self.acks, 0.5))} / {ms(percentile(self.acks, 0.99))}")
+        print(f"reply latency p50 / p99:  {ms(percentile(latencies, 0.5))} / {ms(percentile(latencies, 0.99))}")
+        # The bot drops pending replies when the user moves on, so short think times leave steps unanswered
+        print(f"steps without a reply before the next one: {unanswered}")
+        print(f"graph API requests:       {fake_graph_api.counters}")
+        if memory:
+            print(
+                f"bot RSS start / end / peak: {memory[0] / 2**20:.1f} / {memory[-1] / 2**20:.1f} / "
+                f"{max(memory) / 2**20:.1f} MiB (growth {(memory[-1] - memory[0]) / 2**20:+.1f} MiB)"
+            )
+        if self.args.mode == "inprocess":
+            print("(in-process mode: RSS includes the load generator and the fake Graph API)")
+
+
+def start_fake_graph_api(args, on_reply) -> uvicorn.Server:
+    fake_graph_api.faults.update(
+        latency=args.graph_latency,
+        jitter=args.graph_jitter,
+        error_rate=args.error_rate,
+        error_status=args.error_status
+    )
+    fake_graph_api.on_message = on_reply
+    server = uvicorn.Server(uvicorn.Config(fake_graph_api.app, host="127.0.0.1", port=GRAPH_PORT, log_level="error"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def bot_environment(tmp: str) -> Dict[str, str]:
+    return {
+        "APP_SECRET": APP_SECRET,
+        "GRAPH_API_BASE_URL": f"http://127.0.0.1:{GRAPH_PORT}",
+        "JOURNAL_PATH": os.path.join(tmp, "journal.db"),
+        "DEAD_LETTER_PATH": os.path.join(tmp, "dead_letters.db"),
+        "LOG_LEVEL": "WARNING"
+    }
+
+
+async def run_inprocess(test: LoadTest, tmp: str):
+    os.environ.update(bot_environment(tmp))
+    import main
+
+    await main.startup_event()
+    try:
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bot") as client:
+            return await test.drive(client, None)
+    finally:
+        await main.shutdown_event()
+
+
+async def run_uvicorn(test: LoadTest, tmp: str):
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(APP_PORT), "--log-level", "warning"],
+        cwd=ROOT,
+        env=dict(os.environ, **bot_environment(tmp))
+    )
+    try:
+        limits = httpx.Limits(max_connections=1000, max_keepalive_connections=200)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{APP_PORT}", limits=limits, timeout=30) as client:
+            while True:
+                try:
+                    await client.get("/")
+                    break
+                except httpx.TransportError:
+                    if server.poll() is not None:
+                        raise RuntimeError("uvicorn exited during startup")
+                    await asyncio.sleep(0.1)
+            return await test.drive(client, server.pid)
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--mode", choices=("inprocess", "uvicorn"), default="inprocess")
+    parser.add_argument("--rate", type=float, default=5.0, help="new conversations per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to keep starting conversations")
+    parser.add_argument("--think-time", type=float, default=2.0, help="mean seconds between a user's messages")
+    parser.add_argument("--drain", type=float, default=5.0, help="seconds to wait for late replies")
+    parser.add_argument("--graph-latency", type=float, default=0.05)
+    parser.add_argument("--graph-jitter", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    test = LoadTest(args)
+    server = start_fake_graph_api(args, test.on_reply)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            runner = run_inprocess if args.mode == "inprocess" else run_uvicorn
+            result = asyncio.run(runner(test, tmp))
+    finally:
+        server.should_exit = True
+    test.report(*result)
+
+
+if __name__ == "__main__":
+    run()
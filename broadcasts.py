@@ -0,0 +1,503 @@
+import os
+import io
+import csv
+import json
+import time
+import asyncio
+import logging
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Any, Callable, Awaitable, AsyncIterator, Iterable, Tuple, Set
+
+from dispatcher import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Broadcast configuration
+BROADCAST_PATH = os.getenv("BROADCAST_PATH", "broadcasts.db")
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "8"))
+# Campaign sends per second, kept below DISPATCH_GLOBAL_RATE so conversations still get replies
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "20"))
+BROADCAST_BURST = float(os.getenv("BROADCAST_BURST", "20"))
+BROADCAST_MAX_RECIPIENTS = int(os.getenv("BROADCAST_MAX_RECIPIENTS", "100000"))
+BROADCAST_CHECKPOINT_INTERVAL = float(os.getenv("BROADCAST_CHECKPOINT_INTERVAL", "0.5"))
+# Recipient events buffered per progress stream; a slower client gets a progress summary in their place
+BROADCAST_SUBSCRIBER_BUFFER = int(os.getenv("BROADCAST_SUBSCRIBER_BUFFER", "1000"))
+
+# Column names accepted for the phone number in uploaded CSV files
+PHONE_COLUMNS = ("phone", "to", "wa_id", "telefono", "teléfono", "numero", "número")
+
+PENDING = "pending"
+SENT = "sent"
+FAILED = "failed"
+
+RUNNING = "running"
+COMPLETED = "completed"
+CANCELLED = "cancelled"
+
+
+class BroadcastError(ValueError):
+    """Raised for an invalid broadcast request"""
+
+
+def normalize_phone(value: Any) -> Optional[str]:
+    """WhatsApp IDs are the number in international format, digits only"""
+    digits = "".join(ch for ch in str(value) if ch.isdigit())
+    return digits if 8 <= len(digits) <= 15 else None
+
+
+def parse_recipients(values: Iterable[Any]) -> Tuple[List[str], List[str]]:
+    """Normalize and de-duplicate recipients, keeping their order; returns (valid, invalid)"""
+    recipients, invalid, seen = [], [], set()
+    for value in values:
+        if isinstance(value, dict):
+            value = value.get("phone") or value.get("to") or ""
+        phone = normalize_phone(value)
+        if phone is None:
+            invalid.append(str(value))
+        elif phone not in seen:
+            seen.add(phone)
+            recipients.append(phone)
+    return recipients, invalid
+
+
+def parse_recipients_csv(text: str) -> Tuple[List[str], List[str]]:
+    """Read recipients from CSV with a phone column, or a single column without a header"""
+    rows = list(csv.reader(io.StringIO(text)))
+    if not rows:
+        return [], []
+
+    header = [cell.strip().lower() for cell in rows[0]]
+    column = next((header.index(name) for name in PHONE_COLUMNS if name in header), None)
+    if column is None:
+        if len(header) != 1:
+            raise BroadcastError(f"CSV needs a phone column, one of: {', '.join(PHONE_COLUMNS)}")
+        column = 0
+    else:
+        rows = rows[1:]
+    return parse_recipients(row[column] for row in rows if len(row) > column and row[column].strip())
+
+
+def parse_message(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate the text or template message a broadcast sends"""
+    if data.get("template"):
+        template = data["template"]
+        if isinstance(template, str):
+            template = {"name": template}
+        if not isinstance(template, dict) or not template.get("name"):
+            raise BroadcastError("'template' must be a template name or an object with a 'name'")
+        return {
+            "type": "template",
+            "name": template["name"],
+            "language": template.get("language") or data.get("language") or "es",
+            "components": template.get("components") or []
+        }
+
+    text = data.get("text")
+    if not isinstance(text, str) or not text.strip():
+        raise BroadcastError("A broadcast needs a non-empty 'text' or a 'template'")
+    if len(text) > 4096:
+        raise BroadcastError("'text' is longer than WhatsApp's 4096 character limit")
+    return {"type": "text", "text": text}
+
+
+class BroadcastStore:
+    """Local SQLite checkpoint of broadcasts and the outcome for every recipient"""
+
+    def __init__(self, path: str = BROADCAST_PATH):
+        self.path = path
+        self._db: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS broadcasts ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "message TEXT NOT NULL, "
+                "status TEXT NOT NULL, "
+                "total INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, "
+                "finished_at REAL)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS broadcast_recipients ("
+                "broadcast_id INTEGER NOT NULL, "
+                "position INTEGER NOT NULL, "
+                "phone TEXT NOT NULL, "
+                "status TEXT NOT NULL, "
+                "error TEXT, "
+                "updated_at REAL, "
+                "PRIMARY KEY (broadcast_id, position))"
+            )
+        return self._db
+
+    def create(self, message: Dict[str, Any], recipients: List[str]) -> int:
+        db = self._connect()
+        db.execute("BEGIN")
+        try:
+            cursor = db.execute(
+                "INSERT INTO broadcasts (message, status, total, created_at) VALUES (?, ?, ?, ?)",
+                (json.dumps(message, ensure_ascii=False), RUNNING, len(recipients), time.time())
+            )
+            broadcast_id = cursor.lastrowid
+            db.executemany(
+                "INSERT INTO broadcast_recipients (broadcast_id, position, phone, status) VALUES (?, ?, ?, ?)",
+                ((broadcast_id, position, phone, PENDING) for position, phone in enumerate(recipients))
+            )
+            db.execute("COMMIT")
+        except sqlite3.Error:
+            db.execute("ROLLBACK")
+            raise
+        return broadcast_id
+
+    def message(self, broadcast_id: int) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute("SELECT message FROM broadcasts WHERE id = ?", (broadcast_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def pending(self, broadcast_id: int) -> List[Tuple[int, str]]:
+        return self._connect().execute(
+            "SELECT position, phone FROM broadcast_recipients WHERE broadcast_id = ? AND status = ? ORDER BY position",
+            (broadcast_id, PENDING)
+        ).fetchall()
+
+    def record(self, broadcast_id: int, results: List[Tuple[int, str, Optional[str]]]):
+        """Checkpoint a batch of per-recipient outcomes in one transaction"""
+        db = self._connect()
+        now = time.time()
+        db.execute("BEGIN")
+        try:
+            db.executemany(
+                "UPDATE broadcast_recipients SET status = ?, error = ?, updated_at = ? WHERE broadcast_id = ? AND position = ?",
+                ((status, error, now, broadcast_id, position) for position, status, error in results)
+            )
+            db.execute("COMMIT")
+        except sqlite3.Error:
+            db.execute("ROLLBACK")
+            raise
+
+    def set_status(self, broadcast_id: int, status: str):
+        finished_at = time.time() if status != RUNNING else None
+        self._connect().execute(
+            "UPDATE broadcasts SET status = ?, finished_at = ? WHERE id = ?", (status, finished_at, broadcast_id)
+        )
+
+    def unfinished(self) -> List[int]:
+        rows = self._connect().execute("SELECT id FROM broadcasts WHERE status = ? ORDER BY id", (RUNNING,)).fetchall()
+        return [row[0] for row in rows]
+
+    def summary(self, broadcast_id: int) -> Optional[Dict[str, Any]]:
+        db = self._connect()
+        row = db.execute(
+            "SELECT id, message, status, total, created_at, finished_at FROM broadcasts WHERE id = ?", (broadcast_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        counts = dict(db.execute(
+            "SELECT status, COUNT(*) FROM broadcast_recipients WHERE broadcast_id = ? GROUP BY status", (broadcast_id,)
+        ).fetchall())
+        return {
+            "id": row[0],
+            "message": json.loads(row[1]),
+            "status": row[2],
+            "total": row[3],
+            "sent": counts.get(SENT, 0),
+            "failed": counts.get(FAILED, 0),
+            "pending": counts.get(PENDING, 0),
+            "created_at": row[4],
+            "finished_at": row[5]
+        }
+
+    def failures(self, broadcast_id: int, limit: int = 100) -> List[Dict[str, Any]]:
+        rows = self._connect().execute(
+            "SELECT position, phone, error FROM broadcast_recipients "
+            "WHERE broadcast_id = ? AND status = ? ORDER BY position LIMIT ?",
+            (broadcast_id, FAILED, limit)
+        ).fetchall()
+        return [{"position": r[0], "to": r[1], "error": r[2]} for r in rows]
+
+    def list(self, limit: int = 20) -> List[Dict[str, Any]]:
+        rows = self._connect().execute("SELECT id FROM broadcasts ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return [self.summary(row[0]) for row in rows]
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+class BroadcastSubscriber:
+    """One progress stream's bounded buffer of events"""
+
+    def __init__(self, buffer: int = BROADCAST_SUBSCRIBER_BUFFER):
+        self.buffer = buffer
+        # One slot over the buffer, so the final event always fits
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer + 1)
+        self.dropped = 0
+
+    def put(self, event: Dict[str, Any]):
+        if event["event"] == "recipient" and self.queue.qsize() >= self.buffer:
+            self.dropped += 1
+            return
+        self.queue.put_nowait(event)
+
+    def skip(self) -> int:
+        """Discard the buffered recipient events, returning how many were missed in all"""
+        skipped, self.dropped = self.dropped, 0
+        kept = []
+        while not self.queue.empty():
+            event = self.queue.get_nowait()
+            if event["event"] == "recipient":
+                skipped += 1
+            else:
+                kept.append(event)
+        for event in kept:
+            self.queue.put_nowait(event)
+        return skipped
+
+
+class BroadcastJob:
+    """A broadcast being sent by this process"""
+
+    def __init__(self, broadcast_id: int, message: Dict[str, Any]):
+        self.id = broadcast_id
+        self.message = message
+        self.task: Optional[asyncio.Task] = None
+        self.subscribers: Set[BroadcastSubscriber] = set()
+        self.results: List[Tuple[int, str, Optional[str]]] = []
+        self.cancelled = False
+        self.started = time.monotonic()
+
+    def publish(self, event: Dict[str, Any]):
+        for subscriber in self.subscribers:
+            subscriber.put(event)
+
+
+class BroadcastManager:
+    """
+    Sends broadcasts with bounded concurrency and a campaign rate limit.
+
+    Every recipient's outcome is checkpointed to SQLite in batches, so a
+    broadcast interrupted by a restart resumes with the recipients that
+    were still pending. Delivery is at-least-once: sends that were in
+    flight, or finished after the last checkpoint, are sent again.
+    Progress is published per recipient to any number of subscribers.
+    All store access runs on one thread, so inserting a large broadcast
+    never stalls the event loop.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[str, Dict[str, Any]], Awaitable[bool]],
+        store: Optional[BroadcastStore] = None,
+        concurrency: int = BROADCAST_CONCURRENCY,
+        rate: float = BROADCAST_RATE,
+        burst: float = BROADCAST_BURST,
+        checkpoint_interval: float = BROADCAST_CHECKPOINT_INTERVAL
+    ):
+        self.send = send
+        self.store = store or BroadcastStore()
+        self.concurrency = concurrency
+        self.bucket = TokenBucket(rate, burst)
+        self.checkpoint_interval = checkpoint_interval
+        self._jobs: Dict[int, BroadcastJob] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+        # Counters
+        self.created = 0
+        self.resumed = 0
+        self.sent = 0
+        self.failed = 0
+
+    async def _db(self, fn, *args):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="broadcasts")
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def create(self, message: Dict[str, Any], recipients: List[str]) -> int:
+        """Checkpoint a new broadcast and start sending it"""
+        if not recipients:
+            raise BroadcastError("No valid recipients")
+        if len(recipients) > BROADCAST_MAX_RECIPIENTS:
+            raise BroadcastError(f"At most {BROADCAST_MAX_RECIPIENTS} recipients per broadcast")
+
+        broadcast_id = await self._db(self.store.create, message, recipients)
+        self.created += 1
+        logger.info(f"Broadcast {broadcast_id} created for {len(recipients)} recipients")
+        self._run(broadcast_id, message)
+        return broadcast_id
+
+    async def resume(self, broadcast_id: int) -> bool:
+        """Continue sending a broadcast's pending recipients; False if unknown or already running"""
+        if broadcast_id in self._jobs:
+            return False
+        message = await self._db(self.store.message, broadcast_id)
+        # Checked again: another resume may have started it while the store was read
+        if message is None or broadcast_id in self._jobs:
+            return False
+        self.resumed += 1
+        logger.info(f"Resuming broadcast {broadcast_id}")
+        self._run(broadcast_id, message)
+        # Queued on the store thread ahead of the job's own reads
+        await self._db(self.store.set_status, broadcast_id, RUNNING)
+        return True
+
+    def cancel(self, broadcast_id: int) -> bool:
+        job = self._jobs.get(broadcast_id)
+        if job is None:
+            return False
+        job.cancelled = True
+        return True
+
+    def start(self):
+        """Resume broadcasts interrupted by the last shutdown"""
+        # Nothing else touches the store yet, so these few reads can run inline
+        for broadcast_id in self.store.unfinished():
+            self.resumed += 1
+            logger.info(f"Resuming broadcast {broadcast_id}")
+            self._run(broadcast_id, self.store.message(broadcast_id))
+
+    async def stop(self):
+        """Stop sending, checkpointing what finished; unfinished broadcasts resume on next start"""
+        jobs = list(self._jobs.values())
+        for job in jobs:
+            job.task.cancel()
+        await asyncio.gather(*(job.task for job in jobs), return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self.store.close()
+
+    def _run(self, broadcast_id: int, message: Dict[str, Any]):
+        job = BroadcastJob(broadcast_id, message)
+        self._jobs[broadcast_id] = job
+        job.task = asyncio.create_task(self._send_all(job), name=f"broadcast-{broadcast_id}")
+
+    async def _checkpoint(self, job: BroadcastJob):
+        if job.results:
+            results, job.results = job.results, []
+            try:
+                await self._db(self.store.record, job.id, results)
+            except sqlite3.Error:
+                # Keep the outcomes for the next checkpoint
+                job.results[:0] = results
+                raise
+
+    async def _checkpoint_loop(self, job: BroadcastJob):
+        while True:
+            await asyncio.sleep(self.checkpoint_interval)
+            try:
+                await self._checkpoint(job)
+            except sqlite3.Error as e:
+                logger.error(f"Could not checkpoint broadcast {job.id}: {e}")
+
+    async def _worker(self, job: BroadcastJob, recipients):
+        # Workers share one iterator, so each pending recipient is taken exactly once
+        for position, phone in recipients:
+            if job.cancelled:
+                return
+            await self.bucket.acquire()
+            try:
+                ok = await self.send(phone, job.message)
+                error = None if ok else "not delivered, see /dead-letters"
+            except Exception as e:
+                ok, error = False, f"{type(e).__name__}: {e}"
+
+            status = SENT if ok else FAILED
+            if ok:
+                self.sent += 1
+            else:
+                self.failed += 1
+            job.results.append((position, status, error))
+            job.publish({"event": "recipient", "position": position, "to": phone, "status": status, "error": error})
+
+    async def _send_all(self, job: BroadcastJob):
+        checkpointer = asyncio.create_task(self._checkpoint_loop(job))
+        status = None
+        try:
+            recipients = iter(await self._db(self.store.pending, job.id))
+            await asyncio.gather(*(self._worker(job, recipients) for _ in range(self.concurrency)))
+            status = CANCELLED if job.cancelled else COMPLETED
+        finally:
+            checkpointer.cancel()
+            summary = None
+            try:
+                await self._checkpoint(job)
+                if status is not None:
+                    await self._db(self.store.set_status, job.id, status)
+                summary = await self._db(self.store.summary, job.id)
+            except sqlite3.Error as e:
+                logger.error(f"Could not checkpoint broadcast {job.id}: {e}")
+            del self._jobs[job.id]
+
+            job.publish({"event": "done", "status": status or "interrupted", "summary": summary})
+            if status is not None and summary is not None:
+                logger.info(
+                    f"Broadcast {job.id} {status} in {time.monotonic() - job.started:.1f}s: "
+                    f"{summary['sent']} sent, {summary['failed']} failed, {summary['pending']} pending"
+                )
+
+    async def _progress(self, broadcast_id: int, job: Optional[BroadcastJob]) -> Optional[Dict[str, Any]]:
+        """Checkpointed counts plus the outcomes still waiting for the next checkpoint"""
+        # Copied before the query is queued, so a checkpoint queued later can't count them twice
+        results = list(job.results) if job is not None else []
+        summary = await self._db(self.store.summary, broadcast_id)
+        if summary is not None:
+            for _, status, _ in results:
+                summary[status] += 1
+            summary["pending"] -= len(results)
+        return summary
+
+    async def events(self, broadcast_id: int) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Current progress, then one event per recipient until the broadcast finishes.
+
+        A client that falls more than a buffer behind gets one progress event
+        with the live counts in place of the recipient events it missed.
+        """
+        job = self._jobs.get(broadcast_id)
+        subscriber = BroadcastSubscriber()
+        if job is not None:
+            job.subscribers.add(subscriber)
+        try:
+            summary = await self._progress(broadcast_id, job)
+            if summary is None:
+                return
+            yield {"event": "progress", "summary": summary}
+            if job is None:
+                yield {"event": "done", "status": summary["status"], "summary": summary}
+                return
+            while True:
+                if subscriber.dropped:
+                    skipped = subscriber.skip()
+                    yield {"event": "progress", "summary": await self._progress(broadcast_id, job), "skipped": skipped}
+                    continue
+                event = await subscriber.queue.get()
+                yield event
+                if event["event"] == "done":
+                    return
+        finally:
+            if job is not None:
+                job.subscribers.discard(subscriber)
+
+    async def summary(self, broadcast_id: int) -> Optional[Dict[str, Any]]:
+        summary = await self._db(self.store.summary, broadcast_id)
+        if summary is not None:
+            summary["active"] = broadcast_id in self._jobs
+            summary["failures"] = await self._db(self.store.failures, broadcast_id)
+        return summary
+
+    async def list(self, limit: int = 20) -> List[Dict[str, Any]]:
+        return await self._db(self.store.list, limit)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": sorted(self._jobs),
+            "created": self.created,
+            "resumed": self.resumed,
+            "sent": self.sent,
+            "failed": self.failed,
+            "concurrency": self.concurrency,
+            "rate": self.bucket.rate
+        }
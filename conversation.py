@@ -0,0 +1,220 @@
+import logging
+from typing import Dict, Optional, Any, Iterable, Tuple
+
+from sessions import SESSION_STATES
+from search import normalize
+from metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+# Any-state transitions, used when a state has no transition of its own for an event
+ANY_STATE = "*"
+
+MEDIA_TYPES = frozenset({"image", "document", "audio", "video", "sticker"})
+
+# Interactive replies that carry a selected menu, category or question ID
+SELECTION_TYPES = frozenset({"list_reply", "button_reply"})
+
+EVENTS = (
+    "greeting", "negative", "free_text",
+    "app_menu", "category", "question", "help_yes", "help_no", "rate", "unknown_selection",
+    "media", "unsupported", "unsupported_interactive"
+)
+
+# Declarative conversation flow: keyword intents, fixed menu selections and
+# (state, event) -> action transitions. Compiled once by ConversationRouter.
+CONVERSATION_FLOW = {
+    "keywords": {
+        "greeting": [
+            "hola", "hello", "hi", "buenas", "buenos dias", "buenas tardes",
+            "buenas noches", "saludos", "que tal", "hey", "inicio", "empezar",
+            "comenzar", "start"
+        ],
+        "negative": [
+            "no", "no gracias", "no, gracias", "nada más", "nada mas",
+            "ya no", "suficiente", "está bien", "esta bien", "listo",
+            "perfecto", "ok", "vale"
+        ]
+    },
+    "selections": {
+        "APP_MAIN": "app_menu",
+        "HELP_YES": "help_yes",
+        "HELP_NO": "help_no",
+        "RATE_EXCELLENT": "rate",
+        "RATE_GOOD": "rate",
+        "RATE_POOR": "rate"
+    },
+    "transitions": {
+        ANY_STATE: {
+            "greeting": "welcome",
+            "negative": "answer_or_redirect",
+            "free_text": "answer_or_redirect",
+            "app_menu": "app_submenu",
+            "category": "category_questions",
+            "question": "answer",
+            "help_yes": "main_menu",
+            "help_no": "rating_request",
+            "rate": "rating",
+            "media": "media_redirect",
+            "unsupported": "main_menu",
+            # Other interactive replies (e.g. flow submissions) are not answered
+            "unsupported_interactive": "ignore"
+        },
+        "new": {
+            "negative": "answer_or_welcome",
+            "free_text": "answer_or_welcome"
+        },
+        "finished": {
+            "negative": "answer_or_welcome",
+            "free_text": "answer_or_welcome"
+        },
+        "more_help": {
+            "negative": "rating_request"
+        }
+    },
+    # Action for (state, event) pairs with no transition, e.g. a stale or unknown selection ID
+    "fallback": "not_found"
+}
+
+
+class FlowError(ValueError):
+    """Raised when a conversation flow definition is invalid"""
+
+
+class ConversationRouter:
+    """
+    Routes inbound messages through the compiled conversation flow.
+
+    Compilation normalizes every keyword into a single keyword -> intent
+    lookup and expands the transitions into a state -> event -> action
+    table with any-state transitions already resolved, so a routing
+    decision is a few hash lookups. Selection IDs are resolved through one
+    dict covering the fixed selections and the current knowledge base's
+    categories and questions, rebuilt when the knowledge base changes.
+    Pairs that have no transition fall back to the flow's fallback action
+    and are counted.
+    """
+
+    def __init__(self, actions: Iterable[str], flow: Dict[str, Any] = CONVERSATION_FLOW):
+        self.keywords: Dict[str, str] = {}
+        self.max_keyword_length = 0
+        self.selections: Dict[str, str] = {}
+        self._selection_index = None
+        self._selection_events: Dict[str, str] = {}
+        self.table: Dict[str, Dict[str, str]] = {state: {} for state in SESSION_STATES}
+        self.fallback = flow.get("fallback")
+        self._compile(flow, set(actions))
+
+        # Instrumentation; routed transitions are counted per state, without building a key per message
+        self.transitions: Dict[str, Dict[str, int]] = {
+            state: dict.fromkeys(events, 0) for state, events in self.table.items()
+        }
+        self.unknown_transitions = Counter(("state", "event"))
+
+    def _compile(self, flow: Dict[str, Any], actions: set):
+        errors = []
+
+        # Keyword intents: normalized text -> event; intents listed first win on overlap
+        for event, keywords in flow.get("keywords", {}).items():
+            if event not in EVENTS:
+                errors.append(f"Unknown keyword event {event!r}")
+            # Both the normalized and the plain lowercased spelling, for an exact-match fast path
+            for keyword in frozenset(normalize(k) for k in keywords) | frozenset(k.lower() for k in keywords):
+                self.keywords.setdefault(keyword, event)
+                self.max_keyword_length = max(self.max_keyword_length, len(keyword))
+
+        for selection_id, event in flow.get("selections", {}).items():
+            if event not in EVENTS:
+                errors.append(f"Selection {selection_id} maps to unknown event {event!r}")
+            self.selections[selection_id] = event
+
+        transitions = flow.get("transitions", {})
+        for state in transitions:
+            if state != ANY_STATE and state not in SESSION_STATES:
+                errors.append(f"Transitions defined for unknown state {state!r}")
+        for state, events in transitions.items():
+            for event, action in events.items():
+                if event not in EVENTS:
+                    errors.append(f"State {state} has a transition for unknown event {event!r}")
+                if action not in actions:
+                    errors.append(f"Transition {state}/{event} uses unknown action {action!r}")
+
+        if self.fallback not in actions:
+            errors.append(f"Unknown fallback action {self.fallback!r}")
+
+        if errors:
+            raise FlowError("Invalid conversation flow: " + "; ".join(errors))
+
+        any_state = transitions.get(ANY_STATE, {})
+        for state in SESSION_STATES:
+            for event in EVENTS:
+                action = transitions.get(state, {}).get(event) or any_state.get(event)
+                if action is not None:
+                    self.table[state][event] = action
+
+    def text_event(self, text: str) -> str:
+        event = self.keywords.get(text.lower().strip())
+        if event is not None:
+            return event
+        # Punctuation and repeated letters aside, long texts cannot be a keyword
+        if len(text) > 2 * self.max_keyword_length:
+            return "free_text"
+        return self.keywords.get(normalize(text), "free_text")
+
+    def selection_event(self, selection_id: Optional[str], question_index) -> str:
+        if question_index is not self._selection_index:
+            # Fixed selections win over categories, which win over questions
+            events = dict.fromkeys(question_index.questions, "question")
+            events.update(dict.fromkeys(question_index.categories, "category"))
+            events.update(self.selections)
+            self._selection_events, self._selection_index = events, question_index
+        return self._selection_events.get(selection_id, "unknown_selection")
+
+    def route(self, state: str, message: Dict, question_index) -> Tuple[str, str, Optional[str]]:
+        """
+        Decide what to do with an inbound message in the sender's current state.
+
+        Returns (event, action, argument), where argument is the text body or
+        the selected ID. A plain tuple keeps the hot path allocation-light.
+        """
+        message_type = message.get("type")
+
+        if message_type == "text":
+            argument = message.get("text", {}).get("body", "")
+            event = self.text_event(argument)
+        elif message_type == "interactive":
+            interactive = message.get("interactive", {})
+            reply_type = interactive.get("type")
+            if reply_type in SELECTION_TYPES:
+                argument = interactive.get(reply_type, {}).get("id")
+                event = self.selection_event(argument, question_index)
+            else:
+                argument, event = reply_type, "unsupported_interactive"
+        elif message_type in MEDIA_TYPES:
+            argument, event = None, "media"
+        else:
+            argument, event = message_type, "unsupported"
+
+        action = self.table.get(state, {}).get(event)
+        if action is None:
+            action = self.fallback
+            self.unknown_transitions.inc(state, event)
+            logger.warning(f"No transition for event {event} in state {state}, using {action}")
+        else:
+            self.transitions[state][event] += 1
+
+        return event, action, argument
+
+    def stats(self) -> Dict[str, Any]:
+        """Transition counts, including pairs that had no transition"""
+        return {
+            "compiled_transitions": sum(len(events) for events in self.table.values()),
+            "keywords": len(self.keywords),
+            "transitions": {
+                f"{state}:{event}": count
+                for state, events in self.transitions.items() for event, count in events.items() if count
+            },
+            "unknown_transitions": {
+                f"{state}:{event}": int(count) for (state, event), count in self.unknown_transitions.values.items()
+            }
+        }
@@ -0,0 +1,128 @@
+import os
+import time
+import contextvars
+from collections import OrderedDict
+from typing import Dict, Optional, Any
+
+from metrics import Histogram
+
+# Correlation table configuration
+CORRELATION_MAX_ENTRIES = int(os.getenv("CORRELATION_MAX_ENTRIES", "50000"))
+CORRELATION_TTL = float(os.getenv("CORRELATION_TTL", "86400"))
+
+# Delivery latencies span seconds to hours
+DELIVERY_BUCKETS = (0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 900.0, 3600.0, 21600.0)
+
+# Epoch timestamp of the inbound message the current handler is replying to
+current_inbound: contextvars.ContextVar = contextvars.ContextVar("current_inbound", default=None)
+
+
+class Correlation:
+    """Timeline of one outbound message"""
+
+    __slots__ = ("inbound_at", "sent_at", "delivered_at")
+
+    def __init__(self, inbound_at: Optional[float], sent_at: float):
+        self.inbound_at = inbound_at
+        self.sent_at = sent_at
+        self.delivered_at: Optional[float] = None
+
+
+class DeliveryTracker:
+    """
+    Correlates sent wamids with their status callbacks.
+
+    The sender records each wamid returned by the Graph API together with
+    the timestamp of the inbound message being answered. Status callbacks
+    then close out the timeline into inbound→sent→delivered→read latency
+    histograms. The table is bounded: entries whose callbacks never arrive
+    are evicted after `ttl` or when `max_entries` is exceeded.
+    """
+
+    def __init__(self, max_entries: int = CORRELATION_MAX_ENTRIES, ttl: float = CORRELATION_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._pending: "OrderedDict[str, Correlation]" = OrderedDict()
+
+        self.histograms = {
+            "inbound_to_sent": Histogram(DELIVERY_BUCKETS),
+            "sent_to_delivered": Histogram(DELIVERY_BUCKETS),
+            "delivered_to_read": Histogram(DELIVERY_BUCKETS),
+            "inbound_to_delivered": Histogram(DELIVERY_BUCKETS),
+            "inbound_to_read": Histogram(DELIVERY_BUCKETS)
+        }
+
+        # Counters
+        self.tracked = 0
+        self.completed = 0
+        self.failed = 0
+        self.unmatched = 0
+        self.evicted = 0
+
+    def record_sent(self, wamid: Optional[str], inbound_at: Optional[float] = None, sent_at: Optional[float] = None):
+        """Remember a wamid returned by the Graph API"""
+        if not wamid:
+            return
+
+        sent_at = time.time() if sent_at is None else sent_at
+        if inbound_at is not None:
+            self.histograms["inbound_to_sent"].observe(max(sent_at - inbound_at, 0.0))
+
+        self._pending[wamid] = Correlation(inbound_at, sent_at)
+        self.tracked += 1
+        self._evict(sent_at)
+
+    def _evict(self, now: float):
+        while self._pending:
+            wamid, correlation = next(iter(self._pending.items()))
+            if len(self._pending) <= self.max_entries and now - correlation.sent_at <= self.ttl:
+                break
+            del self._pending[wamid]
+            self.evicted += 1
+
+    def on_status(self, status: Dict):
+        """Update latencies from a status callback"""
+        correlation = self._pending.get(status.get("id"))
+        if correlation is None:
+            self.unmatched += 1
+            return
+
+        name = status.get("status")
+        try:
+            at = float(status.get("timestamp") or time.time())
+        except (TypeError, ValueError):
+            at = time.time()
+
+        if name == "delivered" and correlation.delivered_at is None:
+            correlation.delivered_at = at
+            self.histograms["sent_to_delivered"].observe(max(at - correlation.sent_at, 0.0))
+            if correlation.inbound_at is not None:
+                self.histograms["inbound_to_delivered"].observe(max(at - correlation.inbound_at, 0.0))
+
+        elif name == "read":
+            if correlation.delivered_at is not None:
+                self.histograms["delivered_to_read"].observe(max(at - correlation.delivered_at, 0.0))
+            if correlation.inbound_at is not None:
+                self.histograms["inbound_to_read"].observe(max(at - correlation.inbound_at, 0.0))
+            # Read is the last callback for a message
+            del self._pending[status["id"]]
+            self.completed += 1
+
+        elif name == "failed":
+            del self._pending[status["id"]]
+            self.failed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Correlation table size and latency histograms"""
+        self._evict(time.time())
+        return {
+            "pending": len(self._pending),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "tracked": self.tracked,
+            "completed": self.completed,
+            "failed": self.failed,
+            "unmatched_callbacks": self.unmatched,
+            "evicted": self.evicted,
+            "latency_seconds": {name: histogram.snapshot() for name, histogram in self.histograms.items()}
+        }
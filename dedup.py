@@ -0,0 +1,84 @@
+import os
+import time
+from collections import deque
+from typing import Dict, Optional, Any, Deque, Tuple
+
+# Dedup configuration
+DEDUP_WINDOW = float(os.getenv("DEDUP_WINDOW", "86400"))
+DEDUP_MAX_ENTRIES = int(os.getenv("DEDUP_MAX_ENTRIES", "100000"))
+
+
+class MessageDeduplicator:
+    """
+    Bounded, time-windowed set of recently seen message IDs.
+
+    IDs live in a FIFO ring alongside a hash map of ID to the time it was
+    seen: lookups are O(1), entries older than `window` seconds fall off
+    the front, and once `max_entries` is reached the oldest ID is evicted
+    to make room. A ring entry only removes its ID if the map still holds
+    that same sighting, so forgotten and re-added IDs are not dropped early.
+    """
+
+    def __init__(self, window: float = DEDUP_WINDOW, max_entries: int = DEDUP_MAX_ENTRIES):
+        self.window = window
+        self.max_entries = max_entries
+        self._ring: Deque[Tuple[float, str]] = deque()
+        self._ids: Dict[str, float] = {}
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def _expire(self, now: float):
+        cutoff = now - self.window
+        while self._ring and self._ring[0][0] < cutoff:
+            seen_at, message_id = self._ring.popleft()
+            self._discard(message_id, seen_at)
+            self.expired += 1
+
+    def _discard(self, message_id: str, seen_at: float):
+        if self._ids.get(message_id) == seen_at:
+            del self._ids[message_id]
+
+    def is_duplicate(self, message_id: Optional[str]) -> bool:
+        """Check a message ID, remembering it if it is new"""
+        if not message_id:
+            return False
+
+        now = time.monotonic()
+        self._expire(now)
+
+        if message_id in self._ids:
+            self.hits += 1
+            return True
+
+        self.misses += 1
+        if len(self._ring) >= self.max_entries:
+            seen_at, oldest = self._ring.popleft()
+            self._discard(oldest, seen_at)
+            self.evicted += 1
+        self._ring.append((now, message_id))
+        self._ids[message_id] = now
+        return False
+
+    def forget(self, message_id: Optional[str]):
+        """Drop a recorded ID, so a redelivery of that message is accepted again"""
+        if message_id:
+            self._ids.pop(message_id, None)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and memory bounds"""
+        return {
+            "tracked_ids": len(self._ids),
+            "max_entries": self.max_entries,
+            "window_seconds": self.window,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "evicted": self.evicted
+        }
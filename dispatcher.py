@@ -0,0 +1,277 @@
+import os
+import time
+import asyncio
+import logging
+import contextvars
+from collections import deque
+from typing import Dict, List, Optional, Any, Callable, Awaitable, Deque, Tuple
+
+from metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+# Outbound dispatch configuration
+DISPATCH_WORKERS = int(os.getenv("DISPATCH_WORKERS", "16"))
+DISPATCH_QUEUE_SIZE = int(os.getenv("DISPATCH_QUEUE_SIZE", "5000"))
+DISPATCH_GLOBAL_RATE = float(os.getenv("DISPATCH_GLOBAL_RATE", "80"))
+DISPATCH_GLOBAL_BURST = float(os.getenv("DISPATCH_GLOBAL_BURST", "80"))
+DISPATCH_RECIPIENT_RATE = float(os.getenv("DISPATCH_RECIPIENT_RATE", "1"))
+DISPATCH_RECIPIENT_BURST = float(os.getenv("DISPATCH_RECIPIENT_BURST", "5"))
+
+# Idle per-recipient buckets are pruned once the table grows past this size
+RECIPIENT_BUCKETS_PRUNE_AT = 10000
+
+
+class TokenBucket:
+    """Token bucket rate limiter"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        """Take one token, returning how long the caller must wait for it"""
+        if self.rate <= 0:
+            return 0.0
+
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+    def try_acquire(self) -> bool:
+        """Take a token only if one is available right now"""
+        if self.rate <= 0:
+            return True
+
+        self._refill(time.monotonic())
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def wait_time(self) -> float:
+        """Seconds until a token is available, without taking it"""
+        if self.rate <= 0:
+            return 0.0
+
+        self._refill(time.monotonic())
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+    def is_idle(self) -> bool:
+        """True when the bucket is full again, so dropping it loses nothing"""
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity
+
+    async def acquire(self):
+        """Wait until a token is available"""
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+def payload_recipient(payload: Any) -> Optional[str]:
+    """Extract the recipient of an outbound payload"""
+    if isinstance(payload, dict):
+        return payload.get("to")
+    return getattr(payload, "to", None)
+
+
+class OutboundDispatcher:
+    """
+    Bounded outbound send queue with a worker pool.
+
+    Each recipient has its own FIFO lane, so messages to the same `to`
+    keep their order and are sent one at a time, while workers take turns
+    serving whichever lanes are ready. A global token bucket caps
+    aggregate throughput to the Graph API and a per-recipient bucket caps
+    how fast a single user receives messages; a lane waiting for its
+    recipient's bucket is set aside until it refills, so it never holds
+    up sends to anyone else.
+    """
+
+    def __init__(
+        self,
+        sender: Callable[[Any], Awaitable[bool]],
+        workers: int = DISPATCH_WORKERS,
+        queue_size: int = DISPATCH_QUEUE_SIZE,
+        global_rate: float = DISPATCH_GLOBAL_RATE,
+        global_burst: float = DISPATCH_GLOBAL_BURST,
+        recipient_rate: float = DISPATCH_RECIPIENT_RATE,
+        recipient_burst: float = DISPATCH_RECIPIENT_BURST
+    ):
+        self.sender = sender
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.recipient_rate = recipient_rate
+        self.recipient_burst = recipient_burst
+        self.recipient_buckets: Dict[str, TokenBucket] = {}
+
+        # recipient -> queued sends; a lane exists while it is ready, deferred or being sent
+        self._lanes: Dict[str, Deque[Tuple[Any, asyncio.Future, float, contextvars.Context]]] = {}
+        self._ready: Optional[asyncio.Queue] = None
+        self._deferred: Dict[str, asyncio.TimerHandle] = {}
+        self._capacity: Optional[asyncio.Semaphore] = None
+        self._queued = 0
+        self._tasks: List[asyncio.Task] = []
+
+        # Counters
+        self.submitted = 0
+        self.sent = 0
+        self.failed = 0
+        self.deferrals = 0
+        self.queue_wait = Histogram()
+        self.send_latency = Histogram()
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self):
+        """Start the worker pool"""
+        if self.running:
+            return
+
+        self._ready = asyncio.Queue()
+        self._capacity = asyncio.Semaphore(self.queue_size)
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"dispatch-worker-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info(f"Outbound dispatcher started with {self.workers} workers")
+
+    async def stop(self):
+        """Stop the workers, failing any sends still queued"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        for timer in self._deferred.values():
+            timer.cancel()
+        self._deferred.clear()
+        for lane in self._lanes.values():
+            for _, future, _, _ in lane:
+                if not future.done():
+                    future.set_result(False)
+        self._lanes.clear()
+        self._queued = 0
+        self._ready = None
+        self._capacity = None
+
+    def _recipient_bucket(self, to: str) -> TokenBucket:
+        bucket = self.recipient_buckets.get(to)
+        if bucket is None:
+            if len(self.recipient_buckets) >= RECIPIENT_BUCKETS_PRUNE_AT:
+                self._prune_recipient_buckets()
+            bucket = TokenBucket(self.recipient_rate, self.recipient_burst)
+            self.recipient_buckets[to] = bucket
+        return bucket
+
+    def _prune_recipient_buckets(self):
+        idle = [to for to, bucket in self.recipient_buckets.items() if bucket.is_idle()]
+        for to in idle:
+            del self.recipient_buckets[to]
+
+    async def submit(self, payload: Any) -> bool:
+        """Queue a payload and wait for its send result"""
+        self.submitted += 1
+
+        if not self.running:
+            # Dispatcher not started (e.g. scripts), send inline
+            return await self.sender(payload)
+
+        to = payload_recipient(payload) or ""
+        future = asyncio.get_running_loop().create_future()
+        await self._capacity.acquire()
+        self._queued += 1
+        # Sends run in the submitter's context so per-conversation context vars survive the hop
+        item = (payload, future, time.monotonic(), contextvars.copy_context())
+        lane = self._lanes.get(to)
+        if lane is None:
+            self._lanes[to] = deque([item])
+            self._ready.put_nowait(to)
+        else:
+            lane.append(item)
+        return await future
+
+    def _undefer(self, to: str):
+        del self._deferred[to]
+        self._ready.put_nowait(to)
+
+    async def _worker(self):
+        while True:
+            to = await self._ready.get()
+            lane = self._lanes[to]
+
+            # Not this recipient's turn yet: set the lane aside instead of sleeping on it
+            if to:
+                bucket = self._recipient_bucket(to)
+                wait = bucket.wait_time()
+                if wait > 0:
+                    self.deferrals += 1
+                    self._deferred[to] = asyncio.get_running_loop().call_later(wait, self._undefer, to)
+                    continue
+                bucket.try_acquire()
+
+            payload, future, enqueued_at, context = lane.popleft()
+            self._queued -= 1
+            self._capacity.release()
+            try:
+                await self.global_bucket.acquire()
+
+                started = time.monotonic()
+                self.queue_wait.observe(started - enqueued_at)
+                success = await context.run(asyncio.create_task, self.sender(payload))
+                self.send_latency.observe(time.monotonic() - started)
+
+                if success:
+                    self.sent += 1
+                else:
+                    self.failed += 1
+                if not future.done():
+                    future.set_result(success)
+            except asyncio.CancelledError:
+                if not future.done():
+                    future.set_result(False)
+                raise
+            except Exception as e:
+                logger.error(f"Unexpected error in dispatch worker: {e}")
+                self.failed += 1
+                if not future.done():
+                    future.set_result(False)
+
+            # Back in line behind other ready recipients, or retire the empty lane
+            if lane:
+                self._ready.put_nowait(to)
+            else:
+                del self._lanes[to]
+
+    def queue_depth(self) -> int:
+        return self._queued
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and send latency counters"""
+        return {
+            "running": self.running,
+            "workers": self.workers,
+            "queue_depth": self.queue_depth(),
+            "queue_capacity": self.queue_size,
+            "submitted": self.submitted,
+            "sent": self.sent,
+            "failed": self.failed,
+            "active_recipients": len(self._lanes),
+            "deferrals": self.deferrals,
+            "tracked_recipients": len(self.recipient_buckets),
+            "queue_wait_seconds": self.queue_wait.snapshot(),
+            "send_latency_seconds": self.send_latency.snapshot()
+        }
@@ -0,0 +1,145 @@
+import os
+import time
+import logging
+from typing import Dict, Optional, Any, Union, TYPE_CHECKING
+
+from templates import SerializedPayload
+from metrics import HistogramFamily
+
+# httpx is imported when the client starts rather than at module load, keeping it off the cold-start path
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+# Connection pool configuration
+GRAPH_POOL_MAX_CONNECTIONS = int(os.getenv("GRAPH_POOL_MAX_CONNECTIONS", "100"))
+GRAPH_POOL_MAX_KEEPALIVE = int(os.getenv("GRAPH_POOL_MAX_KEEPALIVE", "20"))
+GRAPH_POOL_KEEPALIVE_EXPIRY = float(os.getenv("GRAPH_POOL_KEEPALIVE_EXPIRY", "30.0"))
+GRAPH_CONNECT_TIMEOUT = float(os.getenv("GRAPH_CONNECT_TIMEOUT", "5.0"))
+GRAPH_READ_TIMEOUT = float(os.getenv("GRAPH_READ_TIMEOUT", "30.0"))
+GRAPH_POOL_TIMEOUT = float(os.getenv("GRAPH_POOL_TIMEOUT", "10.0"))
+GRAPH_HTTP2 = os.getenv("GRAPH_HTTP2", "false").lower() in ("1", "true", "yes")
+
+
+def http2_available() -> bool:
+    """Check if the optional h2 package needed for HTTP/2 is installed"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class GraphClient:
+    """Long-lived, pooled HTTP client for the WhatsApp Graph API"""
+
+    def __init__(self, url: str, headers: Dict[str, str], http2: bool = GRAPH_HTTP2):
+        self.url = url
+        self.headers = headers
+        self.http2 = http2
+        self._client: Optional["httpx.AsyncClient"] = None
+
+        # Pool stats
+        self.requests = 0
+        self.new_connections = 0
+        self.tls_handshakes = 0
+        self.errors = 0
+        self.http_versions: Dict[str, int] = {}
+        # Request latency per HTTP status code ("error" when no response arrived)
+        self.latency = HistogramFamily(("status",))
+
+    def start(self):
+        """Create the shared AsyncClient, importing httpx on first use"""
+        if self._client is not None:
+            return
+
+        import httpx
+
+        if self.http2 and not http2_available():
+            logger.warning("GRAPH_HTTP2 enabled but 'h2' is not installed, falling back to HTTP/1.1")
+            self.http2 = False
+
+        self._client = httpx.AsyncClient(
+            headers=self.headers,
+            http2=self.http2,
+            limits=httpx.Limits(
+                max_connections=GRAPH_POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=GRAPH_POOL_MAX_KEEPALIVE,
+                keepalive_expiry=GRAPH_POOL_KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(
+                GRAPH_READ_TIMEOUT,
+                connect=GRAPH_CONNECT_TIMEOUT,
+                pool=GRAPH_POOL_TIMEOUT
+            )
+        )
+        logger.info(
+            f"Graph API client started (max_connections={GRAPH_POOL_MAX_CONNECTIONS}, "
+            f"keepalive={GRAPH_POOL_MAX_KEEPALIVE}, http2={self.http2})"
+        )
+
+    async def close(self):
+        """Close the shared AsyncClient and its pooled connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            logger.info("Graph API client closed")
+
+    async def _trace(self, event_name: str, info: Dict[str, Any]):
+        """httpcore trace hook used to count new connections"""
+        if event_name == "connection.connect_tcp.complete":
+            self.new_connections += 1
+        elif event_name == "connection.start_tls.complete":
+            self.tls_handshakes += 1
+
+    async def post(self, payload: Union[Dict, SerializedPayload]) -> "httpx.Response":
+        """POST a JSON payload (or a pre-serialized body) to the messages endpoint"""
+        import httpx
+
+        if self._client is None:
+            self.start()
+
+        if isinstance(payload, SerializedPayload):
+            body = {"content": payload.body}
+        else:
+            body = {"json": payload}
+
+        self.requests += 1
+        started = time.monotonic()
+        try:
+            response = await self._client.post(
+                self.url,
+                extensions={"trace": self._trace},
+                **body
+            )
+        except httpx.RequestError:
+            self.errors += 1
+            self.latency.observe(time.monotonic() - started, "error")
+            raise
+
+        self.latency.observe(time.monotonic() - started, str(response.status_code))
+        self.http_versions[response.http_version] = self.http_versions.get(response.http_version, 0) + 1
+        return response
+
+    def stats(self) -> Dict[str, Any]:
+        """Connection pool and reuse statistics"""
+        reused = max(self.requests - self.errors - self.new_connections, 0)
+        completed = self.requests - self.errors
+        return {
+            "started": self._client is not None,
+            "http2": self.http2,
+            "requests": self.requests,
+            "request_errors": self.errors,
+            "new_connections": self.new_connections,
+            "tls_handshakes": self.tls_handshakes,
+            "reused_connections": reused,
+            "reuse_rate": round(reused / completed, 4) if completed else 0.0,
+            "http_versions": self.http_versions,
+            "latency_seconds": self.latency.snapshot(),
+            "limits": {
+                "max_connections": GRAPH_POOL_MAX_CONNECTIONS,
+                "max_keepalive_connections": GRAPH_POOL_MAX_KEEPALIVE,
+                "keepalive_expiry": GRAPH_POOL_KEEPALIVE_EXPIRY
+            }
+        }
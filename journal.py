@@ -0,0 +1,269 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Any, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Journal configuration (an empty JOURNAL_PATH disables journaling)
+JOURNAL_PATH = os.getenv("JOURNAL_PATH", "journal.db")
+JOURNAL_COMMIT_INTERVAL = float(os.getenv("JOURNAL_COMMIT_INTERVAL", "0.002"))
+JOURNAL_MAX_BATCH = int(os.getenv("JOURNAL_MAX_BATCH", "500"))
+JOURNAL_COMPACT_INTERVAL = float(os.getenv("JOURNAL_COMPACT_INTERVAL", "300"))
+JOURNAL_RETENTION = float(os.getenv("JOURNAL_RETENTION", "3600"))
+JOURNAL_REPLAY_MAX_AGE = float(os.getenv("JOURNAL_REPLAY_MAX_AGE", "3600"))
+
+
+class MessageJournal:
+    """
+    Append-only SQLite (WAL) journal of accepted inbound messages.
+
+    Appends are group-committed: concurrent webhook requests queue their
+    messages and a single writer commits everything that arrived within
+    `commit_interval` in one fsync'd transaction. Processed entries are
+    marked done in batches, replayed at startup if still pending, and
+    periodically compacted away.
+    """
+
+    def __init__(
+        self,
+        path: str = JOURNAL_PATH,
+        commit_interval: float = JOURNAL_COMMIT_INTERVAL,
+        max_batch: int = JOURNAL_MAX_BATCH,
+        compact_interval: float = JOURNAL_COMPACT_INTERVAL,
+        retention: float = JOURNAL_RETENTION
+    ):
+        self.path = path
+        self.enabled = bool(path)
+        self.commit_interval = commit_interval
+        self.max_batch = max_batch
+        self.compact_interval = compact_interval
+        self.retention = retention
+
+        self._db: Optional[sqlite3.Connection] = None
+        # All database work runs on one thread, which also serializes it
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._appends: List[Tuple[Dict, asyncio.Future]] = []
+        self._done: List[int] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._writer: Optional[asyncio.Task] = None
+        self._compactor: Optional[asyncio.Task] = None
+
+        # Counters
+        self.appended = 0
+        self.completed = 0
+        self.commits = 0
+        self.append_commits = 0
+        self.compactions = 0
+        self.compacted = 0
+        self.replayed = 0
+
+    # ---- lifecycle ----
+
+    def open(self):
+        """Open the journal database"""
+        if not self.enabled or self._db is not None:
+            return
+
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS journal ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "message_id TEXT, "
+            "payload TEXT NOT NULL, "
+            "received_at REAL NOT NULL, "
+            "done_at REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS journal_pending ON journal (done_at)")
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="journal")
+
+    def start(self):
+        """Start the group-commit writer and the compactor"""
+        if not self.enabled:
+            return
+        self.open()
+        if self._writer is None:
+            self._wakeup = asyncio.Event()
+            self._writer = asyncio.create_task(self._write_loop(), name="journal-writer")
+        if self._compactor is None and self.compact_interval > 0:
+            self._compactor = asyncio.create_task(self._compact_loop(), name="journal-compactor")
+
+    async def stop(self):
+        """Flush outstanding work and close the journal"""
+        for task in (self._compactor, self._writer):
+            if task is not None:
+                task.cancel()
+        await asyncio.gather(
+            *[task for task in (self._compactor, self._writer) if task is not None],
+            return_exceptions=True
+        )
+        self._compactor = None
+        self._writer = None
+
+        if self._db is not None:
+            await self._flush()
+            self._executor.shutdown(wait=True)
+            self._db.close()
+            self._db = None
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    # ---- appends ----
+
+    async def append(self, message: Dict) -> Optional[int]:
+        """Durably record an accepted message, returning its journal entry ID"""
+        if not self.enabled:
+            return None
+        if self._writer is None:
+            self.start()
+
+        future = asyncio.get_running_loop().create_future()
+        self._appends.append((message, future))
+        self._wakeup.set()
+        return await future
+
+    def mark_done(self, entry_id: Optional[int]):
+        """Mark an entry processed; done marks are committed with the next batch"""
+        if entry_id is None or not self.enabled:
+            return
+        self._done.append(entry_id)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def backlog(self) -> int:
+        """Appends waiting for the next commit"""
+        return len(self._appends)
+
+    async def _write_loop(self):
+        while True:
+            await self._wakeup.wait()
+            # Give concurrent requests a moment to join this commit
+            if self.commit_interval > 0 and len(self._appends) < self.max_batch:
+                await asyncio.sleep(self.commit_interval)
+            self._wakeup.clear()
+            await self._flush()
+
+    async def _flush(self):
+        while self._appends or self._done:
+            appends = self._appends[:self.max_batch]
+            del self._appends[:self.max_batch]
+            done, self._done = self._done, []
+
+            try:
+                entry_ids = await self._run(self._commit, [message for message, _ in appends], done)
+            except Exception as e:
+                logger.error(f"Journal commit failed: {e}")
+                for _, future in appends:
+                    if not future.done():
+                        future.set_exception(e)
+                # Keep the done marks, or their entries would be replayed and answered twice
+                self._done[:0] = done
+                if not self._appends:
+                    # Retried with the next batch rather than in a tight loop
+                    break
+                continue
+
+            self.commits += 1
+            if appends:
+                self.append_commits += 1
+            self.appended += len(appends)
+            self.completed += len(done)
+            for (_, future), entry_id in zip(appends, entry_ids):
+                if not future.done():
+                    future.set_result(entry_id)
+
+    def _commit(self, messages: List[Dict], done: List[int]) -> List[int]:
+        now = time.time()
+        entry_ids = []
+        self._db.execute("BEGIN")
+        try:
+            for message in messages:
+                cursor = self._db.execute(
+                    "INSERT INTO journal (message_id, payload, received_at) VALUES (?, ?, ?)",
+                    (message.get("id"), json.dumps(message), now)
+                )
+                entry_ids.append(cursor.lastrowid)
+            if done:
+                self._db.executemany("UPDATE journal SET done_at = ? WHERE id = ?", [(now, i) for i in done])
+            self._db.execute("COMMIT")
+        except Exception:
+            self._db.execute("ROLLBACK")
+            raise
+        return entry_ids
+
+    # ---- replay ----
+
+    def pending(self, max_age: float = JOURNAL_REPLAY_MAX_AGE) -> List[Tuple[int, Dict]]:
+        """
+        Entries accepted but never marked done, oldest first.
+
+        Entries older than `max_age` are marked done without being returned,
+        so a long outage does not answer stale conversations.
+        """
+        if not self.enabled:
+            return []
+        self.open()
+
+        cutoff = time.time() - max_age
+        stale = self._db.execute(
+            "UPDATE journal SET done_at = ? WHERE done_at IS NULL AND received_at < ?",
+            (time.time(), cutoff)
+        ).rowcount
+        if stale:
+            logger.warning(f"Skipping {stale} journaled messages older than {max_age}s")
+
+        rows = self._db.execute(
+            "SELECT id, payload FROM journal WHERE done_at IS NULL ORDER BY id"
+        ).fetchall()
+        self.replayed += len(rows)
+        return [(entry_id, json.loads(payload)) for entry_id, payload in rows]
+
+    # ---- compaction ----
+
+    def _compact(self) -> int:
+        removed = self._db.execute(
+            "DELETE FROM journal WHERE done_at IS NOT NULL AND done_at < ?",
+            (time.time() - self.retention,)
+        ).rowcount
+        self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return removed
+
+    async def compact(self) -> int:
+        """Drop processed entries past retention and truncate the WAL"""
+        if self._db is None:
+            return 0
+        removed = await self._run(self._compact)
+        self.compactions += 1
+        self.compacted += removed
+        return removed
+
+    async def _compact_loop(self):
+        while True:
+            await asyncio.sleep(self.compact_interval)
+            try:
+                removed = await self.compact()
+                if removed:
+                    logger.info(f"Journal compaction removed {removed} entries")
+            except Exception as e:
+                logger.error(f"Journal compaction failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Journal counters"""
+        return {
+            "enabled": self.enabled,
+            "appended": self.appended,
+            "completed": self.completed,
+            "queued_appends": self.backlog(),
+            "commits": self.commits,
+            "avg_append_batch": round(self.appended / self.append_commits, 2) if self.append_commits else 0.0,
+            "replayed": self.replayed,
+            "compactions": self.compactions,
+            "compacted": self.compacted
+        }
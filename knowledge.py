@@ -0,0 +1,90 @@
+from typing import Dict, List, Optional, NamedTuple
+
+# Interactive IDs handled by the menus, which questions and categories must not reuse
+RESERVED_IDS = {"APP_MAIN", "HELP_YES", "HELP_NO", "RATE_EXCELLENT", "RATE_GOOD", "RATE_POOR"}
+
+
+class KnowledgeBaseError(ValueError):
+    """Raised when the knowledge base fails validation"""
+
+
+class QuestionEntry(NamedTuple):
+    """Precomputed lookup entry for a single question"""
+    category: Dict
+    question: Dict
+    answer_text: str
+
+
+def render_answer_text(question: Dict) -> str:
+    """Render the answer message shown to the user"""
+    return f"📋 *Pregunta:*\n{question['text']}\n\n💡 *Respuesta:*\n{question['answer']}"
+
+
+class QuestionIndex:
+    """Startup-built index from question ID to its category, question and rendered answer"""
+
+    def __init__(self, knowledge_base: Dict[str, Dict]):
+        self.questions: Dict[str, QuestionEntry] = {}
+        self.categories: Dict[str, List[QuestionEntry]] = {}
+        self._build(knowledge_base)
+
+    def _build(self, knowledge_base: Dict[str, Dict]):
+        errors: List[str] = []
+
+        for category_key, category in knowledge_base.items():
+            if category.get("id") != category_key:
+                errors.append(f"Category {category_key} has mismatched id {category.get('id')!r}")
+            if not category.get("title"):
+                errors.append(f"Category {category_key} is missing a title")
+            if category_key in RESERVED_IDS:
+                errors.append(f"Category {category_key} uses a reserved menu ID")
+
+            entries = []
+            for question in category.get("questions", []):
+                question_id = question.get("id")
+                if not question_id:
+                    errors.append(f"Question without id in category {category_key}")
+                    continue
+                if question_id in self.questions:
+                    errors.append(f"Duplicate question ID {question_id}")
+                    continue
+                if question_id in knowledge_base or question_id in RESERVED_IDS or question_id.startswith("RATE_"):
+                    errors.append(f"Question ID {question_id} collides with a category or menu ID")
+                    continue
+                if not question.get("text"):
+                    errors.append(f"Question {question_id} is missing its text")
+                    continue
+                if not question.get("answer"):
+                    errors.append(f"Question {question_id} is missing its answer")
+                    continue
+
+                entry = QuestionEntry(category, question, render_answer_text(question))
+                entries.append(entry)
+                self.questions[question_id] = entry
+
+            self.categories[category_key] = entries
+
+        if errors:
+            raise KnowledgeBaseError("Invalid knowledge base: " + "; ".join(errors))
+
+    def get(self, question_id: Optional[str]) -> Optional[QuestionEntry]:
+        """Look up a question by ID"""
+        return self.questions.get(question_id)
+
+    def category_questions(self, category_id: str) -> Optional[List[QuestionEntry]]:
+        """Questions of a category in display order, or None if it does not exist"""
+        return self.categories.get(category_id)
+
+    def has_category(self, category_id: Optional[str]) -> bool:
+        return category_id in self.categories
+
+    def __len__(self) -> int:
+        return len(self.questions)
+
+    def __contains__(self, question_id: object) -> bool:
+        return question_id in self.questions
+
+
+def build_question_index(knowledge_base: Dict[str, Dict]) -> QuestionIndex:
+    """Validate the knowledge base and build its question index"""
+    return QuestionIndex(knowledge_base)
@@ -0,0 +1,301 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import tracemalloc
+from collections import deque
+from typing import Dict, List, Optional, Any, Callable, Deque
+
+from knowledge import KnowledgeBaseError, QuestionIndex, RESERVED_IDS, build_question_index
+from search import QuestionSearch, build_question_search
+
+logger = logging.getLogger(__name__)
+
+# Knowledge base file and hot reload configuration (a zero interval disables the file watcher)
+KNOWLEDGE_BASE_PATH = os.getenv(
+    "KNOWLEDGE_BASE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "knowledge_base.json")
+)
+KB_WATCH_INTERVAL = float(os.getenv("KB_WATCH_INTERVAL", "5"))
+KB_HISTORY = int(os.getenv("KB_HISTORY", "10"))
+
+# Menus every knowledge base file must define
+REQUIRED_MENUS = ("main_menu", "app_submenu")
+
+
+def parse_knowledge_base(raw: bytes, path: str) -> Dict:
+    """Parse a JSON or YAML knowledge base file"""
+    if path.endswith((".yaml", ".yml")):
+        try:
+            import yaml
+        except ImportError:
+            raise KnowledgeBaseError("PyYAML is required to load a YAML knowledge base")
+        try:
+            document = yaml.safe_load(raw)
+        except yaml.YAMLError as e:
+            raise KnowledgeBaseError(f"Invalid YAML in {path}: {e}")
+    else:
+        try:
+            document = json.loads(raw)
+        except ValueError as e:
+            raise KnowledgeBaseError(f"Invalid JSON in {path}: {e}")
+
+    if not isinstance(document, dict):
+        raise KnowledgeBaseError(f"{path} must contain a mapping at the top level")
+    return document
+
+
+def validate_document(document: Dict):
+    """Check the file-level structure: version, categories and menus"""
+    errors: List[str] = []
+
+    if document.get("version") in (None, ""):
+        errors.append("Missing 'version'")
+    if not isinstance(document.get("categories"), dict) or not document["categories"]:
+        errors.append("'categories' must be a non-empty mapping")
+
+    menus = document.get("menus")
+    if not isinstance(menus, dict):
+        errors.append("'menus' must be a mapping")
+    else:
+        categories = document.get("categories") or {}
+        for name in REQUIRED_MENUS:
+            sections = menus.get(name)
+            if not isinstance(sections, list) or not sections:
+                errors.append(f"Menu {name} must be a non-empty list of sections")
+                continue
+            for section in sections:
+                for row in section.get("rows", []):
+                    if row.get("id") not in categories and row.get("id") not in RESERVED_IDS:
+                        errors.append(f"Menu {name} links to unknown category {row.get('id')!r}")
+
+    if errors:
+        raise KnowledgeBaseError("Invalid knowledge base: " + "; ".join(errors))
+
+
+class KnowledgeBaseVersion:
+    """One immutable, fully compiled version of the knowledge base"""
+
+    __slots__ = (
+        "version", "checksum", "source", "categories", "menus", "index", "search", "templates",
+        "build_seconds", "memory_bytes", "loaded_at"
+    )
+
+    def __init__(
+        self,
+        version: Any,
+        checksum: str,
+        source: str,
+        categories: Dict[str, Dict],
+        menus: Dict[str, List[Dict]],
+        index: QuestionIndex,
+        search: QuestionSearch,
+        templates: Dict[str, Any]
+    ):
+        self.version = version
+        self.checksum = checksum
+        self.source = source
+        self.categories = categories
+        self.menus = menus
+        self.index = index
+        self.search = search
+        self.templates = templates
+        self.build_seconds = 0.0
+        self.memory_bytes: Optional[int] = None
+        self.loaded_at = 0.0
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "checksum": self.checksum,
+            "source": self.source,
+            "categories": len(self.categories),
+            "questions": len(self.index),
+            "templates": len(self.templates),
+            "build_ms": round(self.build_seconds * 1000, 3),
+            "memory_bytes": self.memory_bytes,
+            "loaded_at": self.loaded_at
+        }
+
+
+def compile_knowledge_base(
+    raw: bytes,
+    source: str,
+    build_templates: Callable[[QuestionIndex, Dict[str, List[Dict]]], Dict[str, Any]],
+    measure_memory: bool = False
+) -> KnowledgeBaseVersion:
+    """
+    Parse, validate and compile a knowledge base file into a ready-to-serve version.
+
+    `measure_memory` traces allocations to report the retained memory. It
+    slows the compile several times over and every other thread with it,
+    so only benchmarks turn it on.
+    """
+    tracing = measure_memory and not tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.start()
+    memory_before = tracemalloc.get_traced_memory()[0] if measure_memory else 0
+    started = time.perf_counter()
+
+    try:
+        document = parse_knowledge_base(raw, source)
+        validate_document(document)
+        index = build_question_index(document["categories"])
+        compiled = KnowledgeBaseVersion(
+            version=document["version"],
+            checksum=hashlib.sha256(raw).hexdigest()[:16],
+            source=source,
+            categories=document["categories"],
+            menus=document["menus"],
+            index=index,
+            search=build_question_search(index),
+            templates=build_templates(index, document["menus"])
+        )
+        compiled.build_seconds = time.perf_counter() - started
+        if measure_memory:
+            # Retained allocations, approximate if other threads allocate meanwhile
+            compiled.memory_bytes = max(tracemalloc.get_traced_memory()[0] - memory_before, 0)
+    finally:
+        if tracing:
+            tracemalloc.stop()
+
+    return compiled
+
+
+class KnowledgeStore:
+    """
+    Holds the live knowledge base version and hot-reloads it.
+
+    A reload reads and compiles the file off the event loop, then swaps the
+    finished version in with a single reference assignment. Handlers take
+    `store.current` once and keep using that version, so a reload never
+    exposes a half-built index or mixes two versions in one reply. A file
+    that fails validation is rejected and the current version stays live.
+    """
+
+    def __init__(
+        self,
+        build_templates: Callable[[QuestionIndex, Dict[str, List[Dict]]], Dict[str, Any]],
+        path: str = KNOWLEDGE_BASE_PATH,
+        watch_interval: float = KB_WATCH_INTERVAL,
+        history: int = KB_HISTORY
+    ):
+        self.build_templates = build_templates
+        self.path = path
+        self.watch_interval = watch_interval
+        self.history: Deque[Dict[str, Any]] = deque(maxlen=history)
+        self._current: Optional[KnowledgeBaseVersion] = None
+        self._mtime: Optional[float] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._watcher: Optional[asyncio.Task] = None
+
+        # Counters
+        self.reloads = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def current(self) -> KnowledgeBaseVersion:
+        if self._current is None:
+            raise KnowledgeBaseError("Knowledge base has not been loaded")
+        return self._current
+
+    def _read(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+            with open(self.path, "rb") as f:
+                return f.read(), mtime
+        except OSError as e:
+            raise KnowledgeBaseError(f"Cannot read knowledge base {self.path}: {e}")
+
+    def _swap(self, compiled: KnowledgeBaseVersion, mtime: float):
+        compiled.loaded_at = time.time()
+        self._current = compiled
+        self._mtime = mtime
+        self.history.appendleft(compiled.info())
+        logger.info(
+            f"Knowledge base version {compiled.version} loaded from {compiled.source}: "
+            f"{len(compiled.index)} questions in {compiled.build_seconds * 1000:.1f} ms"
+        )
+
+    def load(self) -> KnowledgeBaseVersion:
+        """Load synchronously (startup), raising if the file is invalid"""
+        raw, mtime = self._read()
+        compiled = compile_knowledge_base(raw, self.path, self.build_templates)
+        self._swap(compiled, mtime)
+        return compiled
+
+    async def reload(self, force: bool = False) -> Optional[KnowledgeBaseVersion]:
+        """
+        Build the file's current contents in the background and swap them in.
+
+        Returns the new version, or None when the file is unchanged. Raises
+        KnowledgeBaseError, leaving the live version untouched, if the new
+        file is unreadable or invalid.
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            try:
+                raw, mtime = await loop.run_in_executor(None, self._read)
+                checksum = hashlib.sha256(raw).hexdigest()[:16]
+                if not force and self._current is not None and checksum == self._current.checksum:
+                    self._mtime = mtime
+                    return None
+                compiled = await loop.run_in_executor(
+                    None, compile_knowledge_base, raw, self.path, self.build_templates
+                )
+            except KnowledgeBaseError as e:
+                self.failures += 1
+                self.last_error = str(e)
+                live = self._current.version if self._current is not None else None
+                logger.error(f"Knowledge base reload rejected, keeping version {live}: {e}")
+                raise
+
+            self._swap(compiled, mtime)
+            self.reloads += 1
+            self.last_error = None
+            return compiled
+
+    def start(self):
+        """Start watching the file for changes"""
+        if self._watcher is None and self.watch_interval > 0:
+            self._watcher = asyncio.create_task(self._watch_loop(), name="kb-watcher")
+
+    async def stop(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            await asyncio.gather(self._watcher, return_exceptions=True)
+            self._watcher = None
+
+    async def _watch_loop(self):
+        while True:
+            await asyncio.sleep(self.watch_interval)
+            try:
+                if os.path.getmtime(self.path) == self._mtime:
+                    continue
+                await self.reload()
+            except (OSError, KnowledgeBaseError):
+                # Already logged; retry once the file changes again
+                try:
+                    self._mtime = os.path.getmtime(self.path)
+                except OSError:
+                    pass
+            except Exception as e:
+                logger.error(f"Knowledge base watcher error: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Live version and recent reload history"""
+        return {
+            "path": self.path,
+            "current": self._current.info() if self._current is not None else None,
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "watch_interval_seconds": self.watch_interval,
+            "history": list(self.history)
+        }
@@ -0,0 +1,91 @@
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Dict, Optional, Any, Callable, Awaitable, Deque, Tuple
+
+from metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+
+class MailboxExecutor:
+    """
+    Per-sender mailboxes: jobs for one key run strictly in order, one at a
+    time, while different keys run in parallel. A mailbox's drain task exits
+    and the mailbox is reclaimed as soon as it is empty.
+    """
+
+    def __init__(self):
+        self._mailboxes: Dict[str, Deque[Tuple[Callable[[], Awaitable], float]]] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+        # Instrumentation
+        self.submitted = 0
+        self.processed = 0
+        self.errors = 0
+        self.reclaimed = 0
+        self.max_backlog_seen = 0
+        self.queue_wait = Histogram()
+        self.processing_latency = Histogram()
+
+    def submit(self, key: str, job: Callable[[], Awaitable]):
+        """Queue a job behind everything already pending for `key`"""
+        self.submitted += 1
+        mailbox = self._mailboxes.get(key)
+        if mailbox is None:
+            mailbox = self._mailboxes[key] = deque()
+        mailbox.append((job, time.monotonic()))
+
+        if len(mailbox) > self.max_backlog_seen:
+            self.max_backlog_seen = len(mailbox)
+
+        if key not in self._tasks:
+            self._tasks[key] = asyncio.create_task(self._drain(key, mailbox), name=f"mailbox-{key}")
+
+    async def _drain(self, key: str, mailbox: Deque):
+        try:
+            while mailbox:
+                job, enqueued_at = mailbox.popleft()
+                started = time.monotonic()
+                self.queue_wait.observe(started - enqueued_at)
+                try:
+                    await job()
+                except Exception as e:
+                    self.errors += 1
+                    logger.error(f"Error processing mailbox job for {key}: {e}")
+                self.processing_latency.observe(time.monotonic() - started)
+                self.processed += 1
+        finally:
+            # Reclaim the idle mailbox
+            del self._tasks[key]
+            if self._mailboxes.get(key) is mailbox:
+                del self._mailboxes[key]
+            self.reclaimed += 1
+
+    async def stop(self):
+        """Cancel running mailboxes; anything unfinished stays in the journal"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def backlog(self, key: Optional[str] = None) -> int:
+        if key is not None:
+            return len(self._mailboxes.get(key, ()))
+        return sum(len(mailbox) for mailbox in self._mailboxes.values())
+
+    def stats(self) -> Dict[str, Any]:
+        """Mailbox counts, backlog and processing latency"""
+        return {
+            "active_mailboxes": len(self._mailboxes),
+            "backlog": self.backlog(),
+            "max_backlog": max((len(mailbox) for mailbox in self._mailboxes.values()), default=0),
+            "max_backlog_seen": self.max_backlog_seen,
+            "submitted": self.submitted,
+            "processed": self.processed,
+            "errors": self.errors,
+            "reclaimed": self.reclaimed,
+            "queue_wait_seconds": self.queue_wait.snapshot(),
+            "processing_latency_seconds": self.processing_latency.snapshot()
+        }
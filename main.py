@@ -5,18 +5,38 @@ import asyncio
 import logging
 import hmac
 import hashlib
-from typing import Dict, List, Optional, Any
+import functools
+import importlib
+from typing import Dict, List, Optional
 from datetime import datetime
 
-from fastapi import FastAPI, Request, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse
-import httpx
+from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+from graph_client import GraphClient
+from dispatcher import OutboundDispatcher, payload_recipient
+from timers import DelayedScheduler
+from knowledge import KnowledgeBaseError, QuestionEntry
+from knowledge_store import KnowledgeStore
+from conversation import ConversationRouter
+from templates import PayloadTemplate
+from sessions import create_session_store
+from journal import MessageJournal
+from dedup import MessageDeduplicator
+from mailboxes import MailboxExecutor
+from ratings import RatingsAggregator
+from statuses import StatusAggregator
+from correlation import DeliveryTracker, current_inbound
+from resilience import ResilientSender, CircuitBreaker
+from receipts import ReceiptSender
+from admission import AdmissionController, SHED
+from throttle import SenderThrottle, ALLOW, COOL_DOWN
+from broadcasts import BroadcastManager, BroadcastError, parse_message, parse_recipients, parse_recipients_csv
+from structured_logging import setup_logging
+from metrics import MetricsRegistry, Counter, Gauge, Histogram, HistogramFamily, MICRO_BUCKETS, PROMETHEUS_CONTENT_TYPE
+
+# Configure logging: records are queued and written as JSON lines by a background thread
+log_pipeline = setup_logging()
 logger = logging.getLogger(__name__)
 
 # Environment variables
@@ -24,125 +44,65 @@ WHATSAPP_TOKEN = os.getenv("WHATSAPP_TOKEN", "your_whatsapp_token_here")
 PHONE_NUMBER_ID = os.getenv("PHONE_NUMBER_ID", "your_phone_number_id_here")
 VERIFY_TOKEN = os.getenv("VERIFY_TOKEN", "your_verify_token_here")
 APP_SECRET = os.getenv("APP_SECRET", "your_app_secret_here")
+GRAPH_API_VERSION = os.getenv("GRAPH_API_VERSION", "v18.0")
+GRAPH_API_BASE_URL = os.getenv("GRAPH_API_BASE_URL", "https://graph.facebook.com").rstrip("/")
+# Bearer token for the admin routes (broadcasts, dead letters, throttle offenders, KB reload); they are disabled while unset
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+# Ack webhooks as soon as the journal is open and finish starting up in the background
+DEFERRED_STARTUP = os.getenv("DEFERRED_STARTUP", "false").lower() in ("1", "true", "yes")
 
 # WhatsApp API configuration
-GRAPH_API_URL = f"https://graph.facebook.com/v18.0/{PHONE_NUMBER_ID}/messages"
+GRAPH_API_URL = f"{GRAPH_API_BASE_URL}/{GRAPH_API_VERSION}/{PHONE_NUMBER_ID}/messages"
 HEADERS = {
     "Authorization": f"Bearer {WHATSAPP_TOKEN}",
     "Content-Type": "application/json"
 }
 
+# Shared Graph API client, opened on startup and closed on shutdown
+graph_client = GraphClient(GRAPH_API_URL, HEADERS)
+
+# Retries, circuit breaker and dead letters around every Graph API send
+resilient_sender = ResilientSender(graph_client.post)
+
 # Initialize FastAPI app
 app = FastAPI(title="Per Capital WhatsApp Chatbot")
 
 # Global state management (in production, use Redis or database)
-user_sessions: Dict[str, Dict] = {}
-user_ratings: List[Dict] = []
-
-# ==================== DATA STRUCTURE ====================
-
-KNOWLEDGE_BASE = {
-    "PER_CAPITAL": {
-        "id": "PER_CAPITAL",
-        "title": "Per Capital",
-        "questions": [
-            {"id": "Q1_PC", "text": "¿Que es Per Capital?", "answer": "Es un grupo de empresas del Mercado de Valores Venezolano reguladas por la SUNAVAL.", "short_title": "¿Qué es?"},
-            {"id": "Q2_PC", "text": "¿Quien regula a PER CAPITAL?", "answer": "La SUNAVAL (Superintendencia Nacional de Valores)", "short_title": "Regulación"},
-            {"id": "Q3_PC", "text": "¿Que es la SUNAVAL?", "answer": "Es quien protege a inversionistas y regula a intermediarios y emisores del Mercado de Valores venezolano", "short_title": "SUNAVAL"},
-            {"id": "Q4_PC", "text": "¿Que es la Bolsa de Valores de Caracas?", "answer": "Es el lugar donde se compran y venden bonos, acciones y otros instrumentos de manera ordenada a traves de las Casas de Bolsa y esta regulada por la SUNAVAL", "short_title": "BVC"},
-            {"id": "Q5_PC", "text": "¿Como invierto?", "answer": "Para invertir en el Fondo Mutual Abierto de PER CAPITAL debes descargar el app, registrate, subir recaudos y colocar tus ordenes de compra.", "short_title": "Cómo invertir"}
-        ]
-    },
-    "FONDO_MUTUAL": {
-        "id": "FONDO_MUTUAL",
-        "title": "Fondo Mutual Abierto",
-        "questions": [
-            {"id": "Q1_FMA", "text": "¿Que es un Fondo Mutual?", "answer": "Es un instrumento de inversion en grupo donde varias personas ponen dinero en un fondo que es gestionado por expertos y esta disenado para ser diversificado, de bajo riesgo y dirigido a pequenos inversionistas con poca experiencia", "short_title": "Fondo Mutual"},
-            {"id": "Q2_FMA", "text": "¿Que es una Unidad de Inversion?", "answer": "Es una 'porcion' del fondo. Cuando inviertes adquieres unidades que representan tu parte del fondo.", "short_title": "Unidad de Inversión"},
-            {"id": "Q3_FMA", "text": "¿Que es el VUI?", "answer": "El Valor de la Unidad de Inversion (VUI) es el precio de una Unidad de Inversion. Si el VUI sube tu inversion gana valor. Se calcula diariamente al cierre del dia y depende del comportamiento de las inversiones del fondo.", "short_title": "Valor VUI"},
-            {"id": "Q4_FMA", "text": "¿Como invierto?", "answer": "Descarga el app para Android y IOS, registrate, sube recaudos, acepta los contratos, espera tu aprobacion y suscribe Unidades de Inversion cuando quieras y cuantas veces desees", "short_title": "Cómo invertir"},
-            {"id": "Q5_FMA", "text": "¿Cual es el monto minimo de inversion?", "answer": "1 Unidad de Inversion", "short_title": "Monto Mínimo"},
-            {"id": "Q6_FMA", "text": "¿Como gano?", "answer": "Ganas por apreciacion (subida del VUI) o por dividendo (en caso de que sea decretado)", "short_title": "Cómo gano"},
-            {"id": "Q7_FMA", "text": "¿En cuanto tiempo gano?", "answer": "Ganas a largo plazo, se recomienda medir resultados trimestralmente", "short_title": "Plazo"},
-            {"id": "Q8_FMA", "text": "¿Donde consigo mas informacion?", "answer": "En los prospectos y hojas de terminos en www.per-capital.com", "short_title": "Más información"}
-        ]
-    },
-    "APP_GENERAL": {
-        "id": "APP_GENERAL",
-        "title": "Información General App",
-        "questions": [
-            {"id": "Q1_APP_GEN", "text": "¿Puedo comprar acciones y bonos?", "answer": "No, nuestra app es únicamente para invertir en nuestro Fondo Mutual Abierto. Pronto saldrá la nueva versión de nuestra app para negociar", "short_title": "Acciones y bonos"}
-        ]
-    },
-    "APP_REGISTRO": {
-        "id": "APP_REGISTRO",
-        "title": "Registro en la App",
-        "questions": [
-            {"id": "Q1_APP_REG", "text": "¿Como me registro?", "answer": "Descarga el app, completa 100% de los datos, acepta los contratos, sube tus recaudos como Cedula de Identidad y Selfie y espera tu aprobacion.", "short_title": "Cómo registrarme"},
-            {"id": "Q2_APP_REG", "text": "¿Cuanto tarda mi aprobacion?", "answer": "De 2 a 5 dias habiles siempre que hayas completado 100% de registro y recaudos", "short_title": "Tiempo de aprobación"},
-            {"id": "Q3_APP_REG", "text": "¿Que hago si no me aprueban?", "answer": "Revisa que hayas completado 100% del registro y recaudos, sino contactanos en SOPORTE", "short_title": "Si no me aprueban"},
-            {"id": "Q4_APP_REG", "text": "¿Puedo invertir si soy menor de edad?", "answer": "Debes dirigirte a nuestras oficinas y registrarte con tu representante legal", "short_title": "Inversión menor de edad"},
-            {"id": "Q5_APP_REG", "text": "¿Puedo modificar alguno de mis datos?", "answer": "Si, pero por exigencia del ley entras nuevamente en revision", "short_title": "Modificar datos"},
-            {"id": "Q6_APP_REG", "text": "¿Debo tener cuenta en la Caja Venezolana?", "answer": "No, para invertir en nuestro Fondo Mutual Abierto no es necesaria la cuenta en la CVV", "short_title": "Cuenta CVV"}
-        ]
-    },
-    "APP_SUSCRIPCION": {
-        "id": "APP_SUSCRIPCION",
-        "title": "Suscripción",
-        "questions": [
-            {"id": "Q1_APP_SUS", "text": "¿Como suscribo (compro)?", "answer": "Haz click en Negociacion > Suscripcion > Monto a invertir > Suscribir > Metodo de Pago. Recuerda pagar desde TU cuenta bancaria y subir comprobante de pago", "short_title": "Cómo suscribir"},
-            {"id": "Q2_APP_SUS", "text": "¿Como pago mi suscripcion?", "answer": "Debes pagar desde TU cuenta bancaria via Pago Movil. Y recuerda subir comprobante. IMPORTANTE: no se aceptan pagos de terceros.", "short_title": "Cómo pagar"},
-            {"id": "Q3_APP_SUS", "text": "¿Puede pagar alguien por mi?", "answer": "No, la ley prohibe los pagos de terceros. Siempre debes pagar desde tu cuenta bancaria.", "short_title": "Pago de terceros"},
-            {"id": "Q4_APP_SUS", "text": "¿Como veo mi inversion?", "answer": "En el Home en la seccion Mi Cuenta", "short_title": "Ver inversión"},
-            {"id": "Q5_APP_SUS", "text": "¿Cuando veo mi inversion?", "answer": "Al cierre del sistema en dias habiles bancarios despues del cierre de mercado y la publicacion de tasas del Banco Central de Venezuela.", "short_title": "Cuándo la veo"},
-            {"id": "Q6_APP_SUS", "text": "¿Cuales son las comisiones?", "answer": "3% flat Suscripcion, 3% flat Rescate y 5% anual Administracion", "short_title": "Comisiones"},
-            {"id": "Q7_APP_SUS", "text": "¿Que hago despues de suscribir?", "answer": "Monitorea tu inversion desde el app", "short_title": "Después de suscribir"},
-            {"id": "Q8_APP_SUS", "text": "¿Debo invertir siempre el mismo monto?", "answer": "No, puedes invertir el monto que desees", "short_title": "Monto de inversión"},
-            {"id": "Q9_APP_SUS", "text": "¿Puedo invertir cuando quiera?", "answer": "Si, puedes invertir cuando quieras, las veces que quieras", "short_title": "Invertir cuando quiera"}
-        ]
-    },
-    "APP_RESCATE": {
-        "id": "APP_RESCATE",
-        "title": "Rescate",
-        "questions": [
-            {"id": "Q1_APP_RES", "text": "¿Como rescato (vendo)?", "answer": "Haz click en Negociacion > Rescate > Unidades a Rescatar > Rescatar. Recuerda se enviaran fondos a TU cuenta bancaria", "short_title": "Cómo rescatar"},
-            {"id": "Q2_APP_RES", "text": "¿Cuando me pagan mis rescates (ventas)?", "answer": "Al proximo dia habil bancario en horario de mercado", "short_title": "Pago de rescate"},
-            {"id": "Q3_APP_RES", "text": "¿Como veo el saldo de mi inversion?", "answer": "En el Home en la seccion Mi Cuenta", "short_title": "Ver saldo"},
-            {"id": "Q4_APP_RES", "text": "¿Cuando veo el saldo de mi inversion?", "answer": "Al cierre del sistema en dias habiles bancarios despues del cierre de mercado y la publicacion de tasas del Banco Central de Venezuela.", "short_title": "Actualización de saldo"},
-            {"id": "Q5_APP_RES", "text": "¿Cuando puedo Rescatar?", "answer": "Cuando tu quieras, y se liquida en dias habiles bancarios.", "short_title": "Cuándo rescatar"},
-            {"id": "Q6_APP_RES", "text": "¿Cuales son las comisiones?", "answer": "3% flat Suscripcion, 3% flat Rescate y 5% anual Administracion", "short_title": "Comisiones"}
-        ]
-    },
-    "APP_POSICION": {
-        "id": "APP_POSICION",
-        "title": "Posición (Saldo)",
-        "questions": [
-            {"id": "Q1_APP_POS", "text": "¿Cuando se actualiza mi posicion (saldo)?", "answer": "Al cierre del sistema en dias habiles bancarios despues del cierre de mercado y la publicacion de tasas del Banco Central de Venezuela.", "short_title": "Actualización de saldo"},
-            {"id": "Q2_APP_POS", "text": "¿Por que varia mi posicion (saldo)?", "answer": "Tu saldo y rendimiento sube si suben los precios de las inversiones del fondo, se reciben dividendos o cupones y bajan si estos precios caen.", "short_title": "Variación de saldo"},
-            {"id": "Q3_APP_POS", "text": "¿Donde veo mi historico?", "answer": "En la seccion Historial", "short_title": "Ver historial"},
-            {"id": "Q4_APP_POS", "text": "¿Donde veo reportes?", "answer": "En la seccion Documentos > Reportes > Año > Trimestre", "short_title": "Ver reportes"}
-        ]
-    },
-    "RIESGOS": {
-        "id": "RIESGOS",
-        "title": "Riesgos",
-        "questions": [
-            {"id": "Q1_RIE", "text": "¿Cuales son los riesgos al invertir?", "answer": "Todas las inversionbes estan sujetas a riesgos y la perdida de capital es posible. Agunos riesgos son: riesgo de mercado, riesgo pais, riesgo cambiario, riesgo sector, entre otros.", "short_title": "Riesgos de inversión"}
-        ]
-    },
-    "SOPORTE": {
-        "id": "SOPORTE",
-        "title": "Soporte",
-        "questions": [
-            {"id": "Q1_SOP", "text": "Estoy en revision, que hago?", "answer": "Asegurate de haber completado 100% datos y recaudos y espera tu aprobacion. Si tarda mas de lo habitual contactanos en SOPORTE", "short_title": "En revisión"},
-            {"id": "Q2_SOP", "text": "No me llega el SMS", "answer": "Asegurate de tener buena senal y de que hayas colocado correctamente un numero telefonico venezolano", "short_title": "Problema con SMS"},
-            {"id": "Q3_SOP", "text": "No me llega el Correo", "answer": "Asegurate de no dejar espacios al final cuando escribiste tu correo electronico", "short_title": "Problema con correo"},
-            {"id": "Q4_SOP", "text": "No logro descargar el App", "answer": "Asegurate de que tu app store este configurada en la region de Venezuela", "short_title": "No puedo descargar app"},
-            {"id": "Q5_SOP", "text": "No me abre el App", "answer": "Asegurate de tener la version actualizada y que tu tienda de apps este configurada en la region de Venezuela", "short_title": "La app no abre"},
-            {"id": "Q6_SOP", "text": "Como recupero mi clave", "answer": "Seleccione Recuperar, te legara una clave temporal para ingresar y luego actualiza tu nueva clave", "short_title": "Recuperar clave"}
-        ]
-    }
-}
+user_sessions = create_session_store()
+user_ratings = RatingsAggregator()
+
+# Durable record of accepted inbound messages, replayed on restart
+journal = MessageJournal()
+
+# Recently seen message IDs, so Meta redeliveries are processed once
+dedup = MessageDeduplicator()
+
+# Per-sender inbound rate limits in fixed memory, so one looping client cannot burn the outbound quota
+throttle = SenderThrottle()
+
+# Per-sender mailboxes: one sender's messages are handled in order, senders in parallel
+mailboxes = MailboxExecutor()
+
+def queued_work() -> int:
+    """Inbound messages and outbound sends waiting anywhere between the webhook and the Graph API"""
+    return journal.backlog() + mailboxes.backlog() + scheduler.pending() + dispatcher.queue_depth()
+
+# Bounds inbound work: sheds webhooks with 503 or skips typing pauses under overload
+admission = AdmissionController(queued_work)
+
+# Delivery status callbacks, counted per window instead of logged one by one
+status_aggregator = StatusAggregator()
+
+# Sent wamids awaiting delivered/read callbacks, for end-to-end latency
+delivery_tracker = DeliveryTracker()
+
+# Set once everything message processing needs is running; accepted messages wait for it
+startup_complete = asyncio.Event()
+
+# Hot-path instruments, exposed with the other components' metrics on /metrics
+webhook_latency = HistogramFamily(("status",))
+signature_latency = Histogram(MICRO_BUCKETS)
+messages_received = Counter(("type",))
 
 # ==================== UTILITY FUNCTIONS ====================
 
@@ -228,41 +188,227 @@ def build_reply_button_message(to: str, body: str, buttons: List[Dict]) -> Dict:
         }
     }
 
-def build_read_receipt(message_id: str) -> Dict:
-    """Build a read receipt payload"""
+def build_template_message(to: str, name: str, language: str, components: List[Dict]) -> Dict:
+    """Build a template message payload"""
+    template = {"name": name, "language": {"code": language}}
+    if components:
+        template["components"] = components
     return {
+        "messaging_product": "whatsapp",
+        "to": to,
+        "type": "template",
+        "template": template
+    }
+
+def build_read_receipt(message_id: str, typing: bool = False) -> Dict:
+    """Build a read receipt payload, optionally showing a typing indicator until the next reply"""
+    payload = {
         "messaging_product": "whatsapp",
         "status": "read",
         "message_id": message_id
     }
+    if typing:
+        payload["typing_indicator"] = {"type": "text"}
+    return payload
+
+# ==================== PAYLOAD TEMPLATES ====================
+
+MORE_HELP_BUTTONS = [
+    {
+        "type": "reply",
+        "reply": {
+            "id": "HELP_YES",
+            "title": "Sí, por favor"
+        }
+    },
+    {
+        "type": "reply",
+        "reply": {
+            "id": "HELP_NO",
+            "title": "No, gracias"
+        }
+    }
+]
+
+RATING_BUTTONS = [
+    {
+        "type": "reply",
+        "reply": {"id": "RATE_EXCELLENT", "title": "⭐⭐⭐ Excelente"}
+    },
+    {
+        "type": "reply", 
+        "reply": {"id": "RATE_GOOD", "title": "⭐⭐ Bueno"}
+    },
+    {
+        "type": "reply",
+        "reply": {"id": "RATE_POOR", "title": "⭐ Necesita mejorar"}
+    }
+]
+
+def build_main_menu_message(to: str, sections: List[Dict]) -> Dict:
+    """Build the main menu list message"""
+    return build_interactive_list_message(
+        to=to,
+        header="Menú Principal",
+        body="Selecciona la categoría sobre la que necesitas información:",
+        sections=sections
+    )
+
+def build_app_submenu_message(to: str, sections: List[Dict]) -> Dict:
+    """Build the App submenu list message"""
+    return build_interactive_list_message(
+        to=to,
+        header="App Per Capital",
+        body="¿Sobre qué aspecto de la app necesitas información?",
+        sections=sections
+    )
+
+def build_category_questions_message(to: str, category: Dict, questions: List[Dict]) -> Dict:
+    """Build the question picker for a category"""
+    if len(questions) <= 3:
+        # Use reply buttons for 3 or fewer questions
+        buttons = []
+        for i, q in enumerate(questions[:3]):
+            formatted_title = format_question_for_button(q, i+1)
+            buttons.append({
+                "type": "reply",
+                "reply": {
+                    "id": q["id"],
+                    "title": formatted_title
+                }
+            })
+        
+        return build_reply_button_message(
+            to=to,
+            body=f"*{category['title']}*\n\nSelecciona tu pregunta:",
+            buttons=buttons
+        )
+    
+    # Use interactive list for 4+ questions (max 10 per section)
+    rows = []
+    for i, q in enumerate(questions[:10]):  # Limit to 10 questions per section
+        formatted_q = format_question_for_list(q, i+1)
+        rows.append({
+            "id": q["id"],
+            "title": formatted_q["title"],
+            "description": formatted_q["description"]
+        })
+    
+    sections = [{"title": category["title"], "rows": rows}]
+    
+    return build_interactive_list_message(
+        to=to,
+        header=category["title"],
+        body="Selecciona tu pregunta:",
+        sections=sections
+    )
+
+def build_question_choices_message(to: str, entries: List[QuestionEntry]) -> Dict:
+    """Build a picker for free text that matches questions with different answers"""
+    rows = [
+        {
+            "id": entry.question["id"],
+            "title": truncate_text(entry.category["title"], 24),
+            "description": truncate_text(entry.question["text"], 72)
+        }
+        for entry in entries
+    ]
+    return build_interactive_list_message(
+        to=to,
+        header="Varias respuestas",
+        body="Encontré varias respuestas posibles. Selecciona la que buscas:",
+        sections=[{"title": "Respuestas", "rows": rows}]
+    )
+
+def build_more_help_message(to: str) -> Dict:
+    """Build the 'anything else?' buttons"""
+    # El cuerpo del mensaje incluye el emoji para un tono más amigable.
+    return build_reply_button_message(
+        to=to,
+        body="¿Algo más? 👋",
+        buttons=MORE_HELP_BUTTONS
+    )
+
+def build_rating_request_message(to: str) -> Dict:
+    """Build the rating buttons"""
+    return build_reply_button_message(
+        to=to,
+        body="¡Gracias por usar nuestro asistente virtual! 😊\n\nPor favor, califica la atención recibida para ayudarnos a mejorar:",
+        buttons=RATING_BUTTONS
+    )
+
+def build_payload_templates(question_index, menus: Dict[str, List[Dict]]) -> Dict[str, PayloadTemplate]:
+    """Render every static menu and category picker once"""
+    templates = {
+        "main_menu": PayloadTemplate(lambda to: build_main_menu_message(to, menus["main_menu"])),
+        "app_submenu": PayloadTemplate(lambda to: build_app_submenu_message(to, menus["app_submenu"])),
+        "more_help": PayloadTemplate(build_more_help_message),
+        "rating_request": PayloadTemplate(build_rating_request_message),
+    }
+    
+    for category_id, entries in question_index.categories.items():
+        if not entries:
+            continue
+        category = entries[0].category
+        questions = [entry.question for entry in entries]
+        templates[f"category:{category_id}"] = PayloadTemplate(
+            lambda to, category=category, questions=questions: build_category_questions_message(to, category, questions)
+        )
+    
+    return templates
+
+# Knowledge base loaded from file, compiled once per version and swapped in whole on reload
+knowledge_store = KnowledgeStore(build_payload_templates)
+
+# Validated at import time so a broken knowledge base fails fast on deploy
+knowledge_store.load()
 
 # ==================== WHATSAPP API FUNCTIONS ====================
 
-async def send_message(payload: Dict) -> bool:
-    """Send message to WhatsApp API"""
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(GRAPH_API_URL, headers=HEADERS, json=payload, timeout=30.0)
-            response.raise_for_status()
-            logger.info(f"Message sent successfully to {payload.get('to')}")
-            return True
-    except httpx.RequestError as e:
-        logger.error(f"Request error sending message: {e}")
+async def deliver_message(payload: Dict) -> bool:
+    """Post a message to the WhatsApp API, retrying transient failures"""
+    response = await resilient_sender.send(payload)
+    if response is None:
         return False
-    except httpx.HTTPStatusError as e:
-        logger.error(f"HTTP error sending message: {e.response.status_code} - {e.response.text}")
-        return False
-    except Exception as e:
-        logger.error(f"Unexpected error sending message: {e}")
-        return False
-
-async def send_typing_indicator_and_wait(to: str, seconds: float = 2.0):
-    """Send typing indicator and wait"""
+    
+    # Remember the wamid so status callbacks can be matched to this reply
     try:
-        await asyncio.sleep(0.5)
-        await asyncio.sleep(seconds)
-    except Exception as e:
-        logger.error(f"Error in typing indicator: {e}")
+        wamid = (response.json().get("messages") or [{}])[0].get("id")
+    except (ValueError, AttributeError):
+        wamid = None
+    delivery_tracker.record_sent(wamid, current_inbound.get())
+    logger.info("Message sent to %s", payload_recipient(payload), extra={"event": "message.sent", "wamid": wamid})
+    return True
+
+# Outbound scheduler shared by every send_* helper
+dispatcher = OutboundDispatcher(deliver_message)
+
+async def send_message(payload: Dict) -> bool:
+    """Send message to WhatsApp API through the outbound dispatcher"""
+    return await dispatcher.submit(payload)
+
+async def post_receipt(payload: Dict):
+    """Post a read receipt once, bypassing retries and dead-lettering; skipped while the breaker is not closed"""
+    if resilient_sender.breaker.state != CircuitBreaker.CLOSED:
+        return None
+    return await resilient_sender.post(payload)
+
+# Read receipts and typing indicators, sent only with spare Graph API capacity
+receipts = ReceiptSender(post_receipt, build_read_receipt, dispatcher.global_bucket)
+
+# Delayed sends (typing pauses between conversation steps) without sleeping in handlers
+scheduler = DelayedScheduler()
+
+async def send_broadcast_message(to: str, message: Dict) -> bool:
+    """Send one recipient's copy of a broadcast"""
+    if message["type"] == "template":
+        payload = build_template_message(to, message["name"], message["language"], message["components"])
+    else:
+        payload = build_text_message(to, message["text"])
+    return await send_message(payload)
+
+# Bulk sends, checkpointed per recipient so they resume after a restart
+broadcasts = BroadcastManager(send_broadcast_message)
 
 async def send_welcome_sequence(to: str):
     """Send welcome message sequence with typing indicators"""
@@ -273,218 +419,86 @@ async def send_welcome_sequence(to: str):
         "¿Cómo puedo ayudarte hoy?"
     )
     
-    await send_typing_indicator_and_wait(to, 1.5)
-    await send_message(build_text_message(to, welcome_text))
-    await asyncio.sleep(1.0)
-    await send_main_menu(to)
+    async def send_welcome_text():
+        await send_message(build_text_message(to, welcome_text))
+        scheduler.schedule(admission.typing_delay(1.0), to, lambda: send_main_menu(to))
+    
+    # Typing pause before the welcome text
+    scheduler.schedule(admission.typing_delay(2.0), to, send_welcome_text)
 
 async def send_main_menu(to: str):
     """Send main interactive menu"""
-    sections = [{
-        "title": "Categorías disponibles",
-        "rows": [
-            {"id": "PER_CAPITAL", "title": "Per Capital", "description": "Información general de la empresa"},
-            {"id": "FONDO_MUTUAL", "title": "Fondo Mutual Abierto", "description": "Todo sobre nuestro fondo de inversión"},
-            {"id": "APP_MAIN", "title": "App Per Capital", "description": "Registro, suscripción, rescate y más"},
-            {"id": "RIESGOS", "title": "Riesgos de Inversión", "description": "Información sobre riesgos al invertir"},
-            {"id": "SOPORTE", "title": "Soporte Técnico", "description": "Ayuda con problemas técnicos"},
-        ]
-    }]
-    
-    payload = build_interactive_list_message(
-        to=to,
-        header="Menú Principal",
-        body="Selecciona la categoría sobre la que necesitas información:",
-        sections=sections
-    )
-    
-    await send_message(payload)
+    await send_message(knowledge_store.current.templates["main_menu"].render(to))
     
     user_sessions[to] = {
         "state": "main_menu",
-        "last_interaction": datetime.now().isoformat()
+        "last_interaction": int(time.time())
     }
 
 async def send_app_submenu(to: str):
     """Send App submenu"""
-    sections = [{
-        "title": "Opciones de la App",
-        "rows": [
-            {"id": "APP_GENERAL", "title": "Info General", "description": "Funciones generales de la app"},
-            {"id": "APP_REGISTRO", "title": "Registro", "description": "Cómo registrarse y aprobación"},
-            {"id": "APP_SUSCRIPCION", "title": "Suscripción", "description": "Cómo invertir y procesos de pago"},
-            {"id": "APP_RESCATE", "title": "Rescate", "description": "Cómo retirar inversiones"},
-            {"id": "APP_POSICION", "title": "Posición y Saldo", "description": "Consultar saldos y reportes"},
-        ]
-    }]
-    
-    payload = build_interactive_list_message(
-        to=to,
-        header="App Per Capital",
-        body="¿Sobre qué aspecto de la app necesitas información?",
-        sections=sections
-    )
-    
-    await send_message(payload)
+    await send_message(knowledge_store.current.templates["app_submenu"].render(to))
     
     user_sessions[to] = {
         "state": "app_submenu",
-        "last_interaction": datetime.now().isoformat()
+        "last_interaction": int(time.time())
     }
 
 async def send_category_questions(to: str, category_id: str):
     """Send questions for a specific category with improved formatting"""
-    category = KNOWLEDGE_BASE.get(category_id)
-    if not category:
+    kb = knowledge_store.current
+    entries = kb.index.category_questions(category_id)
+    if not entries:
         await send_message(build_text_message(to, "Lo siento, no pude encontrar esa categoría."))
         await send_main_menu(to)
         return
     
-    questions = category["questions"]
-    
-    if len(questions) <= 3:
-        # Use reply buttons for 3 or fewer questions
-        buttons = []
-        for i, q in enumerate(questions[:3]):
-            formatted_title = format_question_for_button(q, i+1)
-            buttons.append({
-                "type": "reply",
-                "reply": {
-                    "id": q["id"],
-                    "title": formatted_title
-                }
-            })
-        
-        payload = build_reply_button_message(
-            to=to,
-            body=f"*{category['title']}*\n\nSelecciona tu pregunta:",
-            buttons=buttons
-        )
-    else:
-        # Use interactive list for 4+ questions (max 10 per section)
-        rows = []
-        for i, q in enumerate(questions[:10]):  # Limit to 10 questions per section
-            formatted_q = format_question_for_list(q, i+1)
-            rows.append({
-                "id": q["id"],
-                "title": formatted_q["title"],
-                "description": formatted_q["description"]
-            })
-        
-        sections = [{"title": category["title"], "rows": rows}]
-        
-        payload = build_interactive_list_message(
-            to=to,
-            header=category["title"],
-            body="Selecciona tu pregunta:",
-            sections=sections
-        )
-    
-    await send_message(payload)
+    await send_message(kb.templates[f"category:{category_id}"].render(to))
     
     user_sessions[to] = {
         "state": "questions_menu",
         "category": category_id,
-        "last_interaction": datetime.now().isoformat()
+        "last_interaction": int(time.time())
     }
 
 async def send_answer(to: str, question_id: str):
     """Send answer for a specific question"""
-    # Find the question in the knowledge base
-    answer = None
-    question_text = None
-    for category in KNOWLEDGE_BASE.values():
-        for question in category["questions"]:
-            if question["id"] == question_id:
-                answer = question["answer"]
-                question_text = question["text"]
-                break
-        if answer:
-            break
-    
-    if not answer:
+    entry = knowledge_store.current.index.get(question_id)
+    
+    if not entry:
         await send_message(build_text_message(to, "Lo siento, no pude encontrar la respuesta a esa pregunta."))
         await send_main_menu(to)
         return
     
-    # Send typing indicator
-    await send_typing_indicator_and_wait(to, 1.5)
-    
-    # Send the answer with question context
-    answer_text = f"📋 *Pregunta:*\n{question_text}\n\n💡 *Respuesta:*\n{answer}"
-    await send_message(build_text_message(to, answer_text))
-    
-    # Wait a moment before asking for more help
-    await asyncio.sleep(1.5)
+    async def send_answer_text():
+        # Answer text with question context is pre-rendered in the index
+        await send_message(build_text_message(to, entry.answer_text))
+        # Wait a moment before asking for more help
+        scheduler.schedule(admission.typing_delay(1.5), to, lambda: send_more_help_options(to))
     
-    # Ask if they need more help
-    await send_more_help_options(to)
+    # Typing pause before the answer
+    scheduler.schedule(admission.typing_delay(2.0), to, send_answer_text)
 
 async def send_more_help_options(to: str):
     """
-    Envía opciones para continuar o finalizar la conversación 
+    Envía opciones para continuar o finalizar la conversación
     con un mensaje más conciso, amigable y profesional.
     """
-    buttons = [
-        {
-            "type": "reply",
-            "reply": {
-                "id": "HELP_YES",
-                "title": "Sí, por favor"
-            }
-        },
-        {
-            "type": "reply",
-            "reply": {
-                "id": "HELP_NO",
-                "title": "No, gracias"
-            }
-        }
-    ]
-    
-    # El cuerpo del mensaje ahora incluye el emoji para un tono más amigable.
-    payload = build_reply_button_message(
-        to=to,
-        body="¿Algo más? 👋",
-        buttons=buttons
-    )
-    
-    await send_message(payload)
+    await send_message(knowledge_store.current.templates["more_help"].render(to))
     
     # Actualiza el estado de la sesión del usuario
     user_sessions[to] = {
         "state": "more_help",
-        "last_interaction": datetime.now().isoformat()
+        "last_interaction": int(time.time())
     }
 
 async def send_rating_request(to: str):
     """Send rating options"""
-    buttons = [
-        {
-            "type": "reply",
-            "reply": {"id": "RATE_EXCELLENT", "title": "⭐⭐⭐ Excelente"}
-        },
-        {
-            "type": "reply", 
-            "reply": {"id": "RATE_GOOD", "title": "⭐⭐ Bueno"}
-        },
-        {
-            "type": "reply",
-            "reply": {"id": "RATE_POOR", "title": "⭐ Necesita mejorar"}
-        }
-    ]
-    
-    payload = build_reply_button_message(
-        to=to,
-        body="¡Gracias por usar nuestro asistente virtual! 😊\n\nPor favor, califica la atención recibida para ayudarnos a mejorar:",
-        buttons=buttons
-    )
-    
-    await send_message(payload)
+    await send_message(knowledge_store.current.templates["rating_request"].render(to))
     
     user_sessions[to] = {
         "state": "rating",
-        "last_interaction": datetime.now().isoformat()
+        "last_interaction": int(time.time())
     }
 
 async def handle_rating(to: str, rating_id: str):
@@ -498,11 +512,7 @@ async def handle_rating(to: str, rating_id: str):
     rating = rating_map.get(rating_id, "Desconocida")
     
     # Store rating
-    user_ratings.append({
-        "user": to,
-        "rating": rating,
-        "timestamp": datetime.now().isoformat()
-    })
+    user_ratings.record(to, rating)
     
     # Send thank you message
     thank_you_text = (
@@ -513,10 +523,7 @@ async def handle_rating(to: str, rating_id: str):
     await send_message(build_text_message(to, thank_you_text))
     
     # Wait a moment before ending conversation
-    await asyncio.sleep(2.0)
-    
-    # Send conversation end message
-    await send_conversation_end(to)
+    scheduler.schedule(admission.typing_delay(2.0), to, lambda: send_conversation_end(to))
 
 async def send_conversation_end(to: str):
     """Send conversation end message and mark as finished"""
@@ -533,95 +540,100 @@ async def send_conversation_end(to: str):
     # Mark session as finished instead of deleting immediately
     user_sessions[to] = {
         "state": "finished",
-        "last_interaction": datetime.now().isoformat()
+        "last_interaction": int(time.time())
     }
     
-    logger.info(f"Conversation ended for user {to}")
+    logger.info("Conversation ended for user %s", to, extra={"event": "conversation.ended"})
 
 # ==================== MESSAGE PROCESSING ====================
 
-def is_greeting(text: str) -> bool:
-    """Check if message is a greeting"""
-    greetings = [
-        "hola", "hello", "hi", "buenas", "buenos dias", "buenas tardes", 
-        "buenas noches", "saludos", "que tal", "hey", "inicio", "empezar",
-        "comenzar", "start"
-    ]
-    return text.lower().strip() in greetings
-
-def is_negative_response(text: str) -> bool:
-    """Check if message is a negative response"""
-    negative_responses = [
-        "no", "no gracias", "no, gracias", "nada más", "nada mas", 
-        "ya no", "suficiente", "está bien", "esta bien", "listo",
-        "perfecto", "ok", "vale"
-    ]
-    return text.lower().strip() in negative_responses
+async def answer_free_text(from_number: str, text: str) -> bool:
+    """Answer a clear knowledge base match, or offer the choices when matches disagree; False if nothing matched"""
+    entries = knowledge_store.current.search.best_matches(text)
+    if len(entries) == 1:
+        logger.info("Free-text match for %s: %s", from_number, entries[0].question["id"], extra={"event": "search.match"})
+        await send_answer(from_number, entries[0].question["id"])
+        return True
+    if entries:
+        question_ids = ", ".join(entry.question["id"] for entry in entries)
+        logger.info("Ambiguous free-text match for %s: %s", from_number, question_ids, extra={"event": "search.ambiguous"})
+        await send_message(build_question_choices_message(from_number, entries))
+        return True
+    return False
 
-async def process_text_message(from_number: str, text: str, message_id: str):
-    """Process incoming text message"""
-    logger.info(f"Processing text message from {from_number}: {text}")
-    
-    # Check if it's a greeting
-    if is_greeting(text):
+async def answer_or_welcome(from_number: str, text: str):
+    """Answer a clear knowledge base match, otherwise start with the welcome sequence"""
+    if not await answer_free_text(from_number, text):
         await send_welcome_sequence(from_number)
+
+async def answer_or_redirect(from_number: str, text: str):
+    """Answer a clear knowledge base match, otherwise point the user back to the menu"""
+    if await answer_free_text(from_number, text):
         return
     
-    # Get current user state
-    user_state = user_sessions.get(from_number, {}).get("state", "new")
-    
-    # If user has no active session or finished conversation, restart with welcome
-    if user_state in ["new", "finished"] or from_number not in user_sessions:
-        await send_welcome_sequence(from_number)
-        return
-    
-    # Check if it's a negative response while in more_help state
-    if user_state == "more_help" and is_negative_response(text):
-        await send_rating_request(from_number)
-        return
-    
-    # For any other text during active flow, redirect to main menu with helpful message
     redirect_text = (
         "Para brindarte la mejor ayuda, por favor utiliza los botones y opciones del menú. "
         "Te muestro nuevamente las opciones disponibles:"
     )
     await send_message(build_text_message(from_number, redirect_text))
-    await asyncio.sleep(1.0)
-    await send_main_menu(from_number)
+    scheduler.schedule(admission.typing_delay(1.0), from_number, lambda: send_main_menu(from_number))
 
-async def process_interactive_message(from_number: str, interactive_data: Dict):
-    """Process interactive message (button/list replies)"""
-    message_type = interactive_data.get("type")
-    
-    if message_type == "list_reply":
-        list_reply = interactive_data.get("list_reply", {})
-        selection_id = list_reply.get("id")
-        
-        logger.info(f"List reply from {from_number}: {selection_id}")
-        
-        if selection_id == "APP_MAIN":
-            await send_app_submenu(from_number)
-        elif selection_id in KNOWLEDGE_BASE:
-            await send_category_questions(from_number, selection_id)
-        else:
-            # It might be a question ID
-            await send_answer(from_number, selection_id)
-    
-    elif message_type == "button_reply":
-        button_reply = interactive_data.get("button_reply", {})
-        button_id = button_reply.get("id")
-        
-        logger.info(f"Button reply from {from_number}: {button_id}")
-        
-        if button_id == "HELP_YES":
-            await send_main_menu(from_number)
-        elif button_id == "HELP_NO":
-            await send_rating_request(from_number)
-        elif button_id.startswith("RATE_"):
-            await handle_rating(from_number, button_id)
-        else:
-            # It might be a question ID
-            await send_answer(from_number, button_id)
+async def send_media_redirect(from_number: str):
+    """Acknowledge a media message and show the menu"""
+    media_response = (
+        "He recibido tu archivo multimedia. "
+        "Para brindarte la mejor ayuda, por favor utiliza el menú de opciones:"
+    )
+    await send_message(build_text_message(from_number, media_response))
+    scheduler.schedule(admission.typing_delay(1.0), from_number, lambda: send_main_menu(from_number))
+
+async def ignore_message(from_number: str, reply_type: Optional[str]):
+    """Leave interactive replies the bot has no menu for (e.g. flow submissions) unanswered"""
+    logger.info("Ignoring %s reply from %s", reply_type, from_number, extra={"event": "message.ignored"})
+
+# Handlers for the actions named in conversation.CONVERSATION_FLOW, called with (to, argument)
+CONVERSATION_ACTIONS = {
+    "welcome": lambda to, _: send_welcome_sequence(to),
+    "answer_or_welcome": answer_or_welcome,
+    "answer_or_redirect": answer_or_redirect,
+    "main_menu": lambda to, _: send_main_menu(to),
+    "app_submenu": lambda to, _: send_app_submenu(to),
+    "category_questions": send_category_questions,
+    "answer": send_answer,
+    "not_found": send_answer,
+    "rating_request": lambda to, _: send_rating_request(to),
+    "rating": handle_rating,
+    "media_redirect": lambda to, _: send_media_redirect(to),
+    "ignore": ignore_message
+}
+
+# Compiled once at startup; unknown actions or states in the flow fail fast
+conversation = ConversationRouter(CONVERSATION_ACTIONS)
+
+# ==================== METRICS ====================
+
+metrics = MetricsRegistry()
+metrics.register("whatsapp_webhook_duration_seconds", "Time to handle and acknowledge a webhook POST, by response status", webhook_latency)
+metrics.register("whatsapp_webhook_signature_seconds", "Time spent verifying X-Hub-Signature-256", signature_latency)
+metrics.register("whatsapp_messages_received_total", "Inbound messages accepted, by message type", messages_received)
+metrics.register("whatsapp_graph_request_duration_seconds", "Graph API request latency, by HTTP status", graph_client.latency)
+metrics.register("whatsapp_dispatch_queue_wait_seconds", "Time outbound sends wait for a dispatcher worker", dispatcher.queue_wait)
+metrics.register("whatsapp_dispatch_send_seconds", "Outbound send latency including retries", dispatcher.send_latency)
+metrics.register("whatsapp_mailbox_queue_wait_seconds", "Time inbound messages wait in their sender's mailbox", mailboxes.queue_wait)
+metrics.register("whatsapp_mailbox_processing_seconds", "Time to process one inbound message", mailboxes.processing_latency)
+metrics.register("whatsapp_mailbox_backlog", "Inbound messages waiting to be processed", Gauge(mailboxes.backlog))
+metrics.register("whatsapp_dispatch_queue_depth", "Outbound sends waiting for a dispatcher worker", Gauge(dispatcher.queue_depth))
+metrics.register("whatsapp_scheduled_sends", "Delayed sends waiting for their due time", Gauge(scheduler.pending))
+metrics.register("whatsapp_admission_decisions_total", "Admission decisions for webhooks carrying messages", admission.decisions)
+metrics.register("whatsapp_admission_typing_delays_skipped_total", "Typing pauses skipped while overloaded", admission.skipped_delays)
+metrics.register("whatsapp_admission_slot_wait_seconds", "Time inbound messages wait for a processing slot", admission.slot_wait)
+metrics.register("whatsapp_admission_in_flight", "Inbound messages being processed", Gauge(lambda: admission.in_flight))
+metrics.register("whatsapp_admission_pending", "Queued inbound and outbound work admission decisions are based on", Gauge(admission.pending))
+metrics.register("whatsapp_throttle_decisions_total", "Per-sender rate limit decisions for inbound messages", throttle.decisions)
+metrics.register("whatsapp_throttled_senders", "Senders currently over the inbound rate limit", Gauge(throttle.throttled))
+metrics.register("whatsapp_read_receipts_total", "Read receipts and typing indicators, by outcome", receipts.outcomes)
+metrics.register("whatsapp_conversation_unknown_transitions_total", "Messages with no transition for their state and event, sent to the fallback action", conversation.unknown_transitions)
+metrics.register("whatsapp_sessions", "Sessions in the session store", Gauge(lambda: len(user_sessions)))
 
 # ==================== WEBHOOK VERIFICATION ====================
 
@@ -639,6 +651,14 @@ def verify_webhook_signature(payload: bytes, signature: str) -> bool:
     
     return hmac.compare_digest(f"sha256={expected_signature}", signature)
 
+def webhook_has_messages(data: Dict) -> bool:
+    """True if a webhook payload carries inbound messages, not just status callbacks"""
+    return any(
+        "messages" in change.get("value", {})
+        for entry in data.get("entry", [])
+        for change in entry.get("changes", [])
+    )
+
 # ==================== FASTAPI ENDPOINTS ====================
 
 @app.get("/webhook")
@@ -656,39 +676,79 @@ async def verify_webhook(request: Request):
     raise HTTPException(status_code=403, detail="Forbidden")
 
 @app.post("/webhook")
-async def handle_webhook(request: Request, background_tasks: BackgroundTasks):
+async def handle_webhook(request: Request):
     """Handle incoming WhatsApp messages"""
+    started = time.monotonic()
+    status = "500"
     try:
         body = await request.body()
         signature = request.headers.get("X-Hub-Signature-256", "")
         
-        if not verify_webhook_signature(body, signature):
+        verify_started = time.monotonic()
+        valid = verify_webhook_signature(body, signature)
+        signature_latency.observe(time.monotonic() - verify_started)
+        if not valid:
             logger.error("Invalid webhook signature")
             raise HTTPException(status_code=403, detail="Invalid signature")
         
         data = json.loads(body.decode())
         
+        # Shed before recording anything, so Meta's retry redelivers the whole payload
+        if webhook_has_messages(data) and admission.admit() == SHED:
+            status = "503"
+            return JSONResponse(
+                status_code=503,
+                content={"status": "overloaded"},
+                headers={"Retry-After": str(admission.retry_after)}
+            )
+        
         if data.get("object") == "whatsapp_business_account":
             for entry in data.get("entry", []):
                 for change in entry.get("changes", []):
                     value = change.get("value", {})
                     
                     if "messages" in value:
-                        for message in value["messages"]:
-                            background_tasks.add_task(process_message, message)
+                        # Journal before acknowledging so a restart cannot lose accepted messages
+                        messages = [
+                            m for m in value["messages"]
+                            if not dedup.is_duplicate(m.get("id")) and throttle_sender(m)
+                        ]
+                        entry_ids = await asyncio.gather(
+                            *(journal.append(m) for m in messages),
+                            return_exceptions=True
+                        )
+                        append_error = None
+                        for entry_id, message in zip(entry_ids, messages):
+                            if isinstance(entry_id, BaseException):
+                                # Not journaled: let Meta's redelivery past the dedup check
+                                dedup.forget(message.get("id"))
+                                append_error = entry_id
+                                continue
+                            messages_received.inc(message.get("type", "unknown"))
+                            mailboxes.submit(
+                                message.get("from"),
+                                functools.partial(process_journaled_message, entry_id, message)
+                            )
+                        if append_error is not None:
+                            raise append_error
                     
                     if "statuses" in value:
-                        for status in value["statuses"]:
-                            logger.info(f"Message status update: {status}")
+                        for status_update in value["statuses"]:
+                            status_aggregator.record(status_update)
+                            delivery_tracker.on_status(status_update)
         
+        status = "200"
         return JSONResponse(content={"status": "success"})
     
     except json.JSONDecodeError:
+        status = "400"
         logger.error("Invalid JSON in webhook")
         raise HTTPException(status_code=400, detail="Invalid JSON")
     except Exception as e:
         logger.error(f"Error processing webhook: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
+    finally:
+        webhook_latency.observe(time.monotonic() - started, status)
 
 async def process_message(message: Dict):
     """Process individual message"""
@@ -697,33 +757,70 @@ async def process_message(message: Dict):
         message_id = message.get("id")
         message_type = message.get("type")
         
-        logger.info(f"Processing message {message_id} from {from_number}, type: {message_type}")
+        logger.info(
+            "Processing message %s from %s, type: %s", message_id, from_number, message_type,
+            extra={"event": "message.received"}
+        )
+        receipts.mark_read(from_number, message_id, typing=True)
         
-        if message_type == "text":
-            text_data = message.get("text", {})
-            text_body = text_data.get("body", "")
-            await process_text_message(from_number, text_body, message_id)
-            
-        elif message_type == "interactive":
-            interactive_data = message.get("interactive", {})
-            await process_interactive_message(from_number, interactive_data)
-            
-        elif message_type in ["image", "document", "audio", "video", "sticker"]:
-            media_response = (
-                "He recibido tu archivo multimedia. "
-                "Para brindarte la mejor ayuda, por favor utiliza el menú de opciones:"
-            )
-            await send_message(build_text_message(from_number, media_response))
-            await asyncio.sleep(1.0)
-            await send_main_menu(from_number)
-            
-        else:
-            logger.info(f"Unsupported message type: {message_type}")
-            await send_main_menu(from_number)
+        # Replies sent while handling this message are correlated with its timestamp
+        try:
+            current_inbound.set(float(message.get("timestamp")))
+        except (TypeError, ValueError):
+            current_inbound.set(time.time())
+        
+        user_state = user_sessions.get(from_number, {}).get("state", "new")
+        event, action, argument = conversation.route(user_state, message, knowledge_store.current.index)
+        logger.info(
+            "Routing %s from %s in state %s to %s", event, from_number, user_state, action,
+            extra={"event": "message.routed", "action": action}
+        )
+        
+        if action != "ignore":
+            # The user moved on: drop replies still pending from their previous step
+            scheduler.cancel(from_number)
+        
+        await CONVERSATION_ACTIONS[action](from_number, argument)
             
     except Exception as e:
         logger.error(f"Error processing message: {e}")
 
+async def process_journaled_message(entry_id: Optional[int], message: Dict):
+    """Process a journaled message; its entry is marked done once the replies it scheduled have gone out"""
+    await startup_complete.wait()
+    await admission.run(functools.partial(process_message, message))
+    # Not reached when cancelled at shutdown, and follow-ups dropped by the scheduler's stop never
+    # report idle, so in both cases the entry stays pending and is replayed on restart
+    scheduler.when_idle(message.get("from"), functools.partial(journal.mark_done, entry_id))
+
+def throttle_sender(message: Dict) -> bool:
+    """Count a message against its sender's rate limit; False if it should be dropped"""
+    decision = throttle.check(message.get("from"))
+    if decision == ALLOW:
+        return True
+    
+    if decision == COOL_DOWN:
+        from_number = message.get("from")
+        logger.warning(
+            "Throttling %s, sending a cool-down reply", from_number,
+            extra={"event": "sender.throttled"}
+        )
+        # Stop pending replies too; they would only add to the sender's traffic
+        scheduler.cancel(from_number)
+        cool_down_text = (
+            "Estás enviando mensajes muy rápido. ⏳\n\n"
+            "Por favor espera unos minutos antes de escribirnos nuevamente."
+        )
+        mailboxes.submit(from_number, lambda: send_message(build_text_message(from_number, cool_down_text)))
+    return False
+
+def replay_journal(pending: List):
+    """Re-queue messages accepted before the last shutdown, in arrival order"""
+    logger.info(f"Replaying {len(pending)} journaled messages")
+    for entry_id, message in pending:
+        dedup.is_duplicate(message.get("id"))
+        mailboxes.submit(message.get("from"), functools.partial(process_journaled_message, entry_id, message))
+
 @app.get("/")
 async def health_check():
     """Health check endpoint"""
@@ -732,25 +829,110 @@ async def health_check():
         "service": "Per Capital WhatsApp Chatbot",
         "version": "2.0.0",
         "active_sessions": len(user_sessions),
-        "total_ratings": len(user_ratings)
+        "total_ratings": len(user_ratings),
+        "ready": startup_complete.is_set()
     }
 
+def parse_time_param(value: Optional[str], name: str) -> Optional[float]:
+    """Parse an epoch-seconds or ISO 8601 query parameter"""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid '{name}': use epoch seconds or ISO 8601")
+
 @app.get("/stats")
-async def get_stats():
-    """Get chatbot statistics"""
-    rating_counts = {}
-    for rating_data in user_ratings:
-        rating = rating_data["rating"]
-        rating_counts[rating] = rating_counts.get(rating, 0) + 1
-    
-    return {
+async def get_stats(since: Optional[str] = None, until: Optional[str] = None, granularity: str = "hour"):
+    """Get chatbot statistics, optionally with ratings for a time range"""
+    kb = knowledge_store.current
+    stats = {
         "active_sessions": len(user_sessions),
         "total_ratings": len(user_ratings),
-        "rating_breakdown": rating_counts,
-        "knowledge_base_categories": len(KNOWLEDGE_BASE),
-        "total_questions": sum(len(cat["questions"]) for cat in KNOWLEDGE_BASE.values())
+        "rating_breakdown": user_ratings.breakdown(),
+        "knowledge_base_version": kb.version,
+        "knowledge_base_categories": len(kb.categories),
+        "total_questions": len(kb.index),
+        "graph_client": graph_client.stats(),
+        "resilience": resilient_sender.stats(),
+        "dispatcher": dispatcher.stats(),
+        "scheduler": scheduler.stats(),
+        "journal": journal.stats(),
+        "dedup": dedup.stats(),
+        "mailboxes": mailboxes.stats(),
+        "admission": admission.stats(),
+        "throttle": throttle.stats(),
+        "receipts": receipts.stats(),
+        "conversation": conversation.stats(),
+        "broadcasts": broadcasts.stats(),
+        "logging": log_pipeline.stats()
+    }
+    
+    if since is not None or until is not None:
+        try:
+            stats["ratings_range"] = user_ratings.query(
+                parse_time_param(since, "since"),
+                parse_time_param(until, "until"),
+                granularity
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    return stats
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus text exposition of latency histograms, counters and backlogs"""
+    return PlainTextResponse(metrics.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.get("/statuses")
+async def get_status_stats():
+    """Get aggregated delivery status counts and end-to-end delivery latency"""
+    return {
+        **status_aggregator.stats(),
+        "delivery": delivery_tracker.stats()
+    }
+
+def require_admin_token(request: Request):
+    """Admin routes expose phone numbers and payloads or trigger sends and rebuilds, so they need the admin token"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin routes are disabled; set ADMIN_TOKEN to enable them")
+    
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.strip().encode("utf-8"), ADMIN_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="Invalid admin token", headers={"WWW-Authenticate": "Bearer"})
+
+@app.get("/dead-letters")
+async def get_dead_letters(request: Request, limit: int = 100):
+    """List the most recent abandoned sends"""
+    require_admin_token(request)
+    return {
+        "count": await resilient_sender.dead_letters.count(),
+        "dead_letters": await resilient_sender.dead_letters.list(limit)
     }
 
+@app.get("/throttle/offenders")
+async def get_throttle_offenders(request: Request, limit: int = 20):
+    """Senders with the highest recent message rates, and whether they are throttled"""
+    require_admin_token(request)
+    return {"offenders": throttle.top_offenders(limit), "stats": throttle.stats()}
+
+@app.post("/dead-letters/{entry_id}/retry")
+async def retry_dead_letter(entry_id: int, request: Request):
+    """Resend an abandoned message"""
+    require_admin_token(request)
+    payload = await resilient_sender.dead_letters.pop(entry_id)
+    if payload is None:
+        raise HTTPException(status_code=404, detail="Dead letter not found")
+    
+    if await send_message(payload):
+        return {"status": "success", "message": "Message sent"}
+    raise HTTPException(status_code=502, detail="Send failed again and was dead-lettered")
+
 @app.post("/send-message")
 async def send_manual_message(request: Request):
     """Manual message sending endpoint for testing"""
@@ -778,6 +960,109 @@ async def send_manual_message(request: Request):
     except json.JSONDecodeError:
         raise HTTPException(status_code=400, detail="Invalid JSON")
 
+def broadcast_stream(broadcast_id: int, request: Request, stream_format: Optional[str]) -> StreamingResponse:
+    """Stream broadcast progress as NDJSON, or as server-sent events"""
+    sse = stream_format == "sse" or (stream_format is None and "text/event-stream" in request.headers.get("accept", ""))
+    
+    async def body():
+        async for event in broadcasts.events(broadcast_id):
+            data = json.dumps(event, ensure_ascii=False)
+            yield f"event: {event['event']}\ndata: {data}\n\n" if sse else data + "\n"
+    
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+        headers={"X-Broadcast-Id": str(broadcast_id)}
+    )
+
+@app.post("/broadcasts")
+async def create_broadcast(
+    request: Request,
+    text: Optional[str] = None,
+    template: Optional[str] = None,
+    language: Optional[str] = None,
+    stream: bool = True,
+    format: Optional[str] = None
+):
+    """
+    Send a text or template message to many recipients.
+    
+    JSON body: {"recipients": [...], "text": "..."} or {"recipients": [...], "template": {...}}.
+    CSV body (Content-Type: text/csv): a phone column, with the message in the query string.
+    Progress streams back per recipient unless stream=false.
+    Requires "Authorization: Bearer <ADMIN_TOKEN>".
+    """
+    require_admin_token(request)
+    body = await request.body()
+    try:
+        if request.headers.get("content-type", "").startswith("text/csv"):
+            recipients, invalid = parse_recipients_csv(body.decode("utf-8-sig"))
+            message = parse_message({"text": text, "template": template, "language": language})
+        else:
+            data = json.loads(body)
+            recipients, invalid = parse_recipients(data.get("recipients") or [])
+            message = parse_message(data)
+        broadcast_id = await broadcasts.create(message, recipients)
+    except (json.JSONDecodeError, UnicodeDecodeError, AttributeError):
+        raise HTTPException(status_code=400, detail="Body must be a JSON object or CSV")
+    except BroadcastError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if invalid:
+        logger.warning(f"Broadcast {broadcast_id} skipped {len(invalid)} invalid recipients")
+    if not stream:
+        return JSONResponse(
+            status_code=202,
+            content={"id": broadcast_id, "recipients": len(recipients), "invalid_recipients": invalid[:100]}
+        )
+    return broadcast_stream(broadcast_id, request, format)
+
+@app.get("/broadcasts")
+async def list_broadcasts(request: Request, limit: int = 20):
+    """Recent broadcasts with their progress"""
+    require_admin_token(request)
+    return {"broadcasts": await broadcasts.list(limit), "stats": broadcasts.stats()}
+
+@app.get("/broadcasts/{broadcast_id}")
+async def get_broadcast(broadcast_id: int, request: Request):
+    """Progress of one broadcast, with its first failures"""
+    require_admin_token(request)
+    summary = await broadcasts.summary(broadcast_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Broadcast not found")
+    return summary
+
+@app.get("/broadcasts/{broadcast_id}/events")
+async def stream_broadcast(broadcast_id: int, request: Request, format: Optional[str] = None):
+    """Follow a broadcast's progress"""
+    require_admin_token(request)
+    if await broadcasts.summary(broadcast_id) is None:
+        raise HTTPException(status_code=404, detail="Broadcast not found")
+    return broadcast_stream(broadcast_id, request, format)
+
+@app.post("/broadcasts/{broadcast_id}/resume")
+async def resume_broadcast(broadcast_id: int, request: Request):
+    """Send a cancelled or interrupted broadcast's pending recipients"""
+    require_admin_token(request)
+    if await broadcasts.summary(broadcast_id) is None:
+        raise HTTPException(status_code=404, detail="Broadcast not found")
+    if not await broadcasts.resume(broadcast_id):
+        raise HTTPException(status_code=409, detail="Broadcast is already running")
+    return await broadcasts.summary(broadcast_id)
+
+@app.delete("/broadcasts/{broadcast_id}")
+async def cancel_broadcast(broadcast_id: int, request: Request):
+    """Stop a running broadcast; its pending recipients can be resumed later"""
+    require_admin_token(request)
+    if not broadcasts.cancel(broadcast_id):
+        raise HTTPException(status_code=404, detail="No running broadcast with that ID")
+    return {"status": "cancelling", "id": broadcast_id}
+
+@app.get("/sessions")
+async def get_sessions_stats():
+    """Get session store size and expiry statistics"""
+    return user_sessions.stats()
+
 @app.delete("/sessions/{phone_number}")
 async def clear_user_session(phone_number: str):
     """Clear a specific user's session"""
@@ -794,11 +1079,31 @@ async def clear_all_sessions():
     user_sessions.clear()
     return {"status": "success", "message": f"Cleared {count} sessions"}
 
+@app.get("/knowledge-base")
+async def get_knowledge_base_info():
+    """Get the live knowledge base version and reload history"""
+    return knowledge_store.stats()
+
+@app.post("/knowledge-base/reload")
+async def reload_knowledge_base(request: Request, force: bool = False):
+    """Rebuild the knowledge base from its file and swap it in"""
+    require_admin_token(request)
+    try:
+        compiled = await knowledge_store.reload(force=force)
+    except KnowledgeBaseError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    
+    if compiled is None:
+        return {"status": "unchanged", "version": knowledge_store.current.info()}
+    return {"status": "reloaded", "version": compiled.info()}
+
 # ==================== STARTUP VALIDATION ====================
 
 @app.on_event("startup")
 async def startup_event():
     """Validate environment variables on startup"""
+    log_pipeline.start()
+    
     required_vars = {
         "WHATSAPP_TOKEN": WHATSAPP_TOKEN,
         "PHONE_NUMBER_ID": PHONE_NUMBER_ID,
@@ -820,10 +1125,60 @@ async def startup_event():
     if placeholder_vars:
         logger.warning(f"Please update placeholder values for: {', '.join(placeholder_vars)}")
     
-    logger.info("Per Capital WhatsApp Chatbot started successfully!")
-    logger.info(f"Knowledge base loaded with {len(KNOWLEDGE_BASE)} categories")
-    total_questions = sum(len(cat["questions"]) for cat in KNOWLEDGE_BASE.values())
-    logger.info(f"Total questions available: {total_questions}")
+    kb = knowledge_store.current
+    logger.info(f"Knowledge base version {kb.version} loaded with {len(kb.categories)} categories")
+    logger.info(f"Total questions available: {len(kb.index)}")
+    
+    # Webhooks can be journaled and acknowledged from here on
+    journal.start()
+    pending = journal.pending()
+    if pending:
+        replay_journal(pending)
+    
+    if DEFERRED_STARTUP:
+        app.state.startup_task = asyncio.create_task(complete_startup(), name="deferred-startup")
+    else:
+        await complete_startup()
+
+async def complete_startup():
+    """Start the components message processing needs, then release waiting messages"""
+    started = time.monotonic()
+    loop = asyncio.get_running_loop()
+    
+    # Creating the client imports httpx and loads CA certificates; keep that off the event loop
+    await loop.run_in_executor(None, graph_client.start)
+    await loop.run_in_executor(None, importlib.import_module, "fuzzywuzzy.fuzz")
+    
+    dispatcher.start()
+    scheduler.start()
+    user_sessions.start()
+    status_aggregator.start()
+    knowledge_store.start()
+    broadcasts.start()
+    
+    startup_complete.set()
+    logger.info(f"Per Capital WhatsApp Chatbot started successfully in {(time.monotonic() - started) * 1000:.0f} ms")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release shared resources on shutdown"""
+    startup_task = getattr(app.state, "startup_task", None)
+    if startup_task is not None:
+        await startup_task
+        app.state.startup_task = None
+    startup_complete.clear()
+    await broadcasts.stop()
+    await knowledge_store.stop()
+    await mailboxes.stop()
+    await receipts.stop()
+    await status_aggregator.stop()
+    await scheduler.stop()
+    await journal.stop()
+    await dispatcher.stop()
+    await graph_client.close()
+    await resilient_sender.dead_letters.close()
+    await user_sessions.stop()
+    log_pipeline.stop()
 
 # ==================== ERROR HANDLERS ====================
 
@@ -0,0 +1,163 @@
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Any, Callable, Tuple, Union, DefaultDict
+
+# Default latency buckets in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Buckets for sub-millisecond work such as signature checks
+MICRO_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    """Fixed-bucket histogram, cheap enough for the hot path"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts: List[int] = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        """Record a single observation"""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Approximate percentile as the upper bound of the matching bucket"""
+        if not self.count:
+            return None
+
+        target = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= target:
+                return min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+        return self.max
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Summary suitable for JSON endpoints"""
+        def rounded(value: Optional[float]) -> Optional[float]:
+            return round(value, 6) if value is not None else None
+
+        return {
+            "count": self.count,
+            "avg": round(self.sum / self.count, 6) if self.count else None,
+            "p50": rounded(self.percentile(0.5)),
+            "p90": rounded(self.percentile(0.9)),
+            "p99": rounded(self.percentile(0.99)),
+            "max": round(self.max, 6)
+        }
+
+
+class HistogramFamily:
+    """Histograms keyed by label values, e.g. Graph API latency per status code"""
+
+    def __init__(self, labels: Sequence[str], buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self.children: Dict[Tuple[str, ...], Histogram] = {}
+
+    def observe(self, value: float, *label_values: str):
+        """Record an observation for the given label values"""
+        child = self.children.get(label_values)
+        if child is None:
+            child = self.children[label_values] = Histogram(self.buckets)
+        child.observe(value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {",".join(key): child.snapshot() for key, child in self.children.items()}
+
+
+class Counter:
+    """Monotonic counter, optionally keyed by label values"""
+
+    def __init__(self, labels: Sequence[str] = ()):
+        self.labels = tuple(labels)
+        self.values: DefaultDict[Tuple[str, ...], float] = defaultdict(float)
+
+    def inc(self, *label_values: str, amount: float = 1.0):
+        self.values[label_values] += amount
+
+
+class Gauge:
+    """Value read from a callback at scrape time, so the hot path pays nothing"""
+
+    def __init__(self, read: Callable[[], float]):
+        self.read = read
+
+
+Metric = Union[Counter, Gauge, Histogram, HistogramFamily]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[str] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class MetricsRegistry:
+    """
+    Named instruments rendered in the Prometheus text exposition format.
+
+    Instruments are plain objects updated from the event loop without
+    locks; names, help text and label rendering only happen on scrape.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, Tuple[str, Metric]] = {}
+
+    def register(self, name: str, documentation: str, metric: Metric) -> Metric:
+        if name in self._metrics:
+            raise ValueError(f"Metric {name} already registered")
+        self._metrics[name] = (documentation, metric)
+        return metric
+
+    def _render_histogram(self, lines: List[str], name: str, histogram: Histogram, labels: Sequence[str], values: Sequence[str]):
+        cumulative = 0
+        for bound, bucket_count in zip(histogram.buckets, histogram.counts):
+            cumulative += bucket_count
+            le = 'le="%s"' % _format_value(bound)
+            lines.append(f"{name}_bucket{_format_labels(labels, values, le)} {cumulative}")
+        le = 'le="+Inf"'
+        lines.append(f"{name}_bucket{_format_labels(labels, values, le)} {histogram.count}")
+        lines.append(f"{name}_sum{_format_labels(labels, values)} {_format_value(histogram.sum)}")
+        lines.append(f"{name}_count{_format_labels(labels, values)} {histogram.count}")
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for name, (documentation, metric) in self._metrics.items():
+            lines.append(f"# HELP {name} {documentation}")
+            if isinstance(metric, Counter):
+                lines.append(f"# TYPE {name} counter")
+                for values, value in metric.values.items():
+                    lines.append(f"{name}{_format_labels(metric.labels, values)} {_format_value(value)}")
+            elif isinstance(metric, Gauge):
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {_format_value(metric.read())}")
+            elif isinstance(metric, HistogramFamily):
+                lines.append(f"# TYPE {name} histogram")
+                for values, child in metric.children.items():
+                    self._render_histogram(lines, name, child, metric.labels, values)
+            else:
+                lines.append(f"# TYPE {name} histogram")
+                self._render_histogram(lines, name, metric, (), ())
+        return "\n".join(lines) + "\n"
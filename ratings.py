@@ -0,0 +1,124 @@
+import os
+import json
+import time
+import logging
+import logging.handlers
+from collections import deque
+from typing import Dict, List, Optional, Any, Deque
+
+logger = logging.getLogger(__name__)
+
+# Ratings configuration (an empty RATINGS_LOG_PATH keeps raw events in memory only)
+RATINGS_RING_SIZE = int(os.getenv("RATINGS_RING_SIZE", "10000"))
+RATINGS_LOG_PATH = os.getenv("RATINGS_LOG_PATH", "")
+RATINGS_LOG_MAX_BYTES = int(os.getenv("RATINGS_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+RATINGS_LOG_BACKUPS = int(os.getenv("RATINGS_LOG_BACKUPS", "5"))
+RATINGS_HOURLY_RETENTION = int(os.getenv("RATINGS_HOURLY_RETENTION", str(7 * 24)))
+RATINGS_DAILY_RETENTION = int(os.getenv("RATINGS_DAILY_RETENTION", "400"))
+
+GRANULARITIES = {"hour": 3600, "day": 86400}
+
+
+class TimeBuckets:
+    """Per-rating counts in fixed-width time buckets, keeping the most recent `retention` buckets"""
+
+    def __init__(self, width: int, retention: int):
+        self.width = width
+        self.retention = retention
+        self.buckets: Dict[int, Dict[str, int]] = {}
+
+    def add(self, timestamp: float, rating: str):
+        start = int(timestamp) // self.width * self.width
+        bucket = self.buckets.get(start)
+        if bucket is None:
+            bucket = self.buckets[start] = {}
+            if len(self.buckets) > self.retention:
+                del self.buckets[min(self.buckets)]
+        bucket[rating] = bucket.get(rating, 0) + 1
+
+    def query(self, since: Optional[float], until: Optional[float]) -> List[Dict[str, Any]]:
+        """Buckets overlapping [since, until), oldest first"""
+        series = []
+        for start in sorted(self.buckets):
+            if since is not None and start + self.width <= since:
+                continue
+            if until is not None and start >= until:
+                continue
+            series.append({"start": start, "counts": dict(self.buckets[start])})
+        return series
+
+
+class RatingsAggregator:
+    """
+    Incrementally maintained rating counters.
+
+    Totals and hourly/daily buckets are updated on every rating, so stats
+    never rescan history. Raw events are kept in a bounded ring and,
+    when RATINGS_LOG_PATH is set, appended to a rotating JSONL log.
+    """
+
+    def __init__(
+        self,
+        ring_size: int = RATINGS_RING_SIZE,
+        log_path: str = RATINGS_LOG_PATH,
+        hourly_retention: int = RATINGS_HOURLY_RETENTION,
+        daily_retention: int = RATINGS_DAILY_RETENTION
+    ):
+        self.total = 0
+        self.counts: Dict[str, int] = {}
+        self.buckets = {
+            "hour": TimeBuckets(GRANULARITIES["hour"], hourly_retention),
+            "day": TimeBuckets(GRANULARITIES["day"], daily_retention)
+        }
+        self.recent: Deque[Dict[str, Any]] = deque(maxlen=ring_size)
+
+        self._event_log: Optional[logging.Logger] = None
+        if log_path:
+            self._event_log = logging.getLogger("ratings.events")
+            self._event_log.propagate = False
+            self._event_log.setLevel(logging.INFO)
+            handler = logging.handlers.RotatingFileHandler(
+                log_path, maxBytes=RATINGS_LOG_MAX_BYTES, backupCount=RATINGS_LOG_BACKUPS, encoding="utf-8"
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._event_log.addHandler(handler)
+
+    def record(self, user: str, rating: str, timestamp: Optional[float] = None):
+        """Record a single rating"""
+        timestamp = time.time() if timestamp is None else timestamp
+
+        self.total += 1
+        self.counts[rating] = self.counts.get(rating, 0) + 1
+        for buckets in self.buckets.values():
+            buckets.add(timestamp, rating)
+
+        event = {"user": user, "rating": rating, "timestamp": timestamp}
+        self.recent.append(event)
+        if self._event_log is not None:
+            self._event_log.info(json.dumps(event, ensure_ascii=False))
+
+    def __len__(self) -> int:
+        return self.total
+
+    def breakdown(self) -> Dict[str, int]:
+        return dict(self.counts)
+
+    def query(self, since: Optional[float] = None, until: Optional[float] = None, granularity: str = "hour") -> Dict[str, Any]:
+        """Rating counts for a time range, served from the time buckets"""
+        if granularity not in self.buckets:
+            raise ValueError(f"granularity must be one of: {', '.join(self.buckets)}")
+
+        series = self.buckets[granularity].query(since, until)
+        totals: Dict[str, int] = {}
+        for bucket in series:
+            for rating, count in bucket["counts"].items():
+                totals[rating] = totals.get(rating, 0) + count
+
+        return {
+            "since": since,
+            "until": until,
+            "granularity": granularity,
+            "total_ratings": sum(totals.values()),
+            "rating_breakdown": totals,
+            "buckets": series
+        }
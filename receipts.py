@@ -0,0 +1,127 @@
+import os
+import asyncio
+import logging
+from typing import Dict, Optional, Any, Callable, Awaitable, Set, Tuple
+
+from dispatcher import TokenBucket
+from metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+# Read receipts and typing indicators
+READ_RECEIPTS = os.getenv("READ_RECEIPTS", "true").lower() in ("1", "true", "yes")
+TYPING_INDICATORS = os.getenv("TYPING_INDICATORS", "true").lower() in ("1", "true", "yes")
+RECEIPT_COALESCE_WINDOW = float(os.getenv("RECEIPT_COALESCE_WINDOW", "1.0"))
+RECEIPT_MAX_IN_FLIGHT = int(os.getenv("RECEIPT_MAX_IN_FLIGHT", "8"))
+
+
+class ReceiptSender:
+    """
+    Fire-and-forget read receipts, optionally showing a typing indicator.
+
+    A user's first receipt goes out at once. Further receipts within
+    `window` are coalesced into one for the latest message, sent when the
+    window closes; marking a message read marks the earlier ones read too.
+
+    Receipts are low priority: each needs a token from `bucket` right now
+    and a free slot among `max_in_flight` sends, otherwise it is skipped
+    rather than queued, so replies never wait behind them. Failures are
+    counted and dropped, never retried.
+    """
+
+    def __init__(
+        self,
+        post: Callable[[Dict], Awaitable[Any]],
+        build: Callable[[str, bool], Dict],
+        bucket: Optional[TokenBucket] = None,
+        enabled: bool = READ_RECEIPTS,
+        typing: bool = TYPING_INDICATORS,
+        window: float = RECEIPT_COALESCE_WINDOW,
+        max_in_flight: int = RECEIPT_MAX_IN_FLIGHT
+    ):
+        self.post = post
+        self.build = build
+        self.bucket = bucket
+        self.enabled = enabled
+        self.typing = typing
+        self.window = window
+        self.max_in_flight = max_in_flight
+
+        # user -> receipt waiting for the window to close (None if nothing is waiting)
+        self._windows: Dict[str, Optional[Tuple[str, bool]]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+        # Instrumentation
+        self.outcomes = Counter(("outcome",))
+
+    def mark_read(self, user: Optional[str], message_id: Optional[str], typing: bool = False):
+        """Mark a user's message read, coalescing with recent receipts for the same user"""
+        if not self.enabled or not user or not message_id:
+            return
+        typing = typing and self.typing
+
+        if user in self._windows:
+            if self._windows[user] is not None:
+                self.outcomes.inc("coalesced")
+            self._windows[user] = (message_id, typing)
+            return
+
+        self._open_window(user)
+        self._send(message_id, typing)
+
+    def _open_window(self, user: str):
+        self._windows[user] = None
+        self._timers[user] = asyncio.get_running_loop().call_later(self.window, self._close_window, user)
+
+    def _close_window(self, user: str):
+        del self._timers[user]
+        pending = self._windows.pop(user)
+        if pending is not None:
+            # Keep coalescing while the user keeps writing
+            self._open_window(user)
+            self._send(*pending)
+
+    def _send(self, message_id: str, typing: bool):
+        if len(self._tasks) >= self.max_in_flight or (self.bucket is not None and not self.bucket.try_acquire()):
+            self.outcomes.inc("skipped")
+            return
+        task = asyncio.create_task(self._post(self.build(message_id, typing)))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _post(self, payload: Dict):
+        try:
+            response = await self.post(payload)
+        except Exception as e:
+            self.outcomes.inc("failed")
+            logger.debug(f"Read receipt for {payload.get('message_id')} failed: {e}")
+            return
+
+        if response is None:
+            self.outcomes.inc("skipped")
+        elif response.status_code >= 400:
+            self.outcomes.inc("failed")
+            logger.debug(f"Read receipt for {payload.get('message_id')} failed with HTTP {response.status_code}")
+        else:
+            self.outcomes.inc("sent")
+
+    async def stop(self):
+        """Drop receipts still waiting and cancel those in flight"""
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        self._windows.clear()
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "typing_indicators": self.typing,
+            "open_windows": len(self._windows),
+            "in_flight": len(self._tasks),
+            **{outcome: int(self.outcomes.values.get((outcome,), 0)) for outcome in ("sent", "coalesced", "skipped", "failed")}
+        }
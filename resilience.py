@@ -0,0 +1,413 @@
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional, Any, Callable, Awaitable, Union, Tuple, TYPE_CHECKING
+
+from templates import SerializedPayload
+
+# httpx is only needed once a send happens, so it is imported there
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+# Retry and circuit breaker configuration
+GRAPH_RETRY_ATTEMPTS = int(os.getenv("GRAPH_RETRY_ATTEMPTS", "4"))
+GRAPH_RETRY_BASE_DELAY = float(os.getenv("GRAPH_RETRY_BASE_DELAY", "0.5"))
+GRAPH_RETRY_MAX_DELAY = float(os.getenv("GRAPH_RETRY_MAX_DELAY", "8.0"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "10"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "30.0"))
+DEAD_LETTER_PATH = os.getenv("DEAD_LETTER_PATH", "dead_letters.db")
+DEAD_LETTER_MAX_ROWS = int(os.getenv("DEAD_LETTER_MAX_ROWS", "10000"))
+DEAD_LETTER_RETENTION = float(os.getenv("DEAD_LETTER_RETENTION", str(7 * 24 * 3600)))
+DEAD_LETTER_FLUSH_INTERVAL = float(os.getenv("DEAD_LETTER_FLUSH_INTERVAL", "0.5"))
+
+# Graph API error codes that are worth retrying (throttling and temporary errors)
+TRANSIENT_GRAPH_CODES = {1, 2, 4, 17, 341, 80007, 130429, 131000, 131016, 131056}
+
+TRANSIENT = "transient"
+PERMANENT = "permanent"
+
+
+def classify_error(error: Exception) -> str:
+    """Classify a send failure as transient (retry) or permanent (give up)"""
+    import httpx
+
+    if isinstance(error, httpx.RequestError):
+        # Timeouts, connection resets and DNS failures
+        return TRANSIENT
+
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        if status == 429 or status >= 500:
+            return TRANSIENT
+        try:
+            code = error.response.json().get("error", {}).get("code")
+        except (ValueError, AttributeError):
+            code = None
+        return TRANSIENT if code in TRANSIENT_GRAPH_CODES else PERMANENT
+
+    return PERMANENT
+
+
+def retry_after_seconds(response: Optional["httpx.Response"]) -> Optional[float]:
+    """Parse a Retry-After header given in seconds or as an HTTP date"""
+    if response is None:
+        return None
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter"""
+
+    def __init__(
+        self,
+        max_attempts: int = GRAPH_RETRY_ATTEMPTS,
+        base_delay: float = GRAPH_RETRY_BASE_DELAY,
+        max_delay: float = GRAPH_RETRY_MAX_DELAY
+    ):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Delay before retry number `attempt` (1-based), honouring Retry-After"""
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+
+class CircuitBreaker:
+    """
+    Sheds outbound load while the Graph API keeps failing.
+
+    After `failure_threshold` consecutive transient failures the breaker
+    opens and sends fail fast. Once `reset_timeout` has passed a single
+    trial send is let through (half-open); success closes the breaker and
+    failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD, reset_timeout: float = BREAKER_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+
+        # Counters
+        self.trips = 0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        """Whether a send may be attempted now"""
+        if self.state == self.CLOSED:
+            return True
+
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self._trial_in_flight = False
+
+        if self.state == self.HALF_OPEN and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self._trial_in_flight = False
+
+    def release_trial(self):
+        """Let another half-open trial through when the current one ended without a verdict"""
+        if self.state == self.HALF_OPEN:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.trips += 1
+                logger.warning(f"Circuit breaker opened after {self.consecutive_failures} consecutive failures")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "failure_threshold": self.failure_threshold,
+            "reset_timeout_seconds": self.reset_timeout,
+            "trips": self.trips,
+            "rejected": self.rejected
+        }
+
+
+class DeadLetterStore:
+    """
+    Local SQLite store of sends that were abandoned.
+
+    `add` only queues the row; queued rows are inserted together every
+    `flush_interval` seconds on a single executor thread, so an outage that
+    dead-letters every send puts no disk I/O on the event loop. Rows older
+    than `retention` are pruned and the table is capped at `max_rows`,
+    dropping the oldest.
+    """
+
+    def __init__(
+        self,
+        path: str = DEAD_LETTER_PATH,
+        max_rows: int = DEAD_LETTER_MAX_ROWS,
+        retention: float = DEAD_LETTER_RETENTION,
+        flush_interval: float = DEAD_LETTER_FLUSH_INTERVAL
+    ):
+        self.path = path
+        self.max_rows = max_rows
+        self.retention = retention
+        self.flush_interval = flush_interval
+        self._db: Optional[sqlite3.Connection] = None
+        # All database work runs on one thread, which also serializes it
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._queued: List[Tuple[Optional[str], str, str, int, float]] = []
+        self._flusher: Optional[asyncio.Task] = None
+
+        # Counters
+        self.added = 0
+        self.pruned = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS dead_letters ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "recipient TEXT, "
+                "payload TEXT NOT NULL, "
+                "reason TEXT, "
+                "attempts INTEGER, "
+                "created_at REAL NOT NULL)"
+            )
+        return self._db
+
+    async def _run(self, fn, *args):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dead-letters")
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def add(self, payload: Union[Dict, SerializedPayload], reason: str, attempts: int):
+        """Queue an abandoned send to be recorded with the next batch"""
+        if isinstance(payload, SerializedPayload):
+            recipient, body = payload.to, payload.body.decode("utf-8")
+        else:
+            recipient, body = payload.get("to"), json.dumps(payload, ensure_ascii=False)
+        self._queued.append((recipient, body, reason, attempts, time.time()))
+        self.added += 1
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_later(), name="dead-letter-flush")
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        self._flusher = None
+        await self.flush()
+
+    async def flush(self):
+        """Insert the queued dead letters in one transaction"""
+        if not self._queued:
+            return
+        rows, self._queued = self._queued, []
+        try:
+            self.pruned += await self._run(self._insert, rows)
+        except sqlite3.Error as e:
+            logger.error(f"Could not store {len(rows)} dead letters: {e}")
+
+    def _insert(self, rows: List[Tuple]) -> int:
+        db = self._connect()
+        db.execute("BEGIN")
+        try:
+            db.executemany(
+                "INSERT INTO dead_letters (recipient, payload, reason, attempts, created_at) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            pruned = db.execute(
+                "DELETE FROM dead_letters WHERE created_at < ?", (time.time() - self.retention,)
+            ).rowcount
+            pruned += db.execute(
+                "DELETE FROM dead_letters WHERE id <= "
+                "(SELECT id FROM dead_letters ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                (self.max_rows,)
+            ).rowcount
+            db.execute("COMMIT")
+        except sqlite3.Error:
+            db.execute("ROLLBACK")
+            raise
+        return pruned
+
+    def _list(self, limit: int) -> List[Dict[str, Any]]:
+        rows = self._connect().execute(
+            "SELECT id, recipient, payload, reason, attempts, created_at FROM dead_letters ORDER BY id DESC LIMIT ?",
+            (limit,)
+        ).fetchall()
+        return [
+            {"id": r[0], "to": r[1], "payload": json.loads(r[2]), "reason": r[3], "attempts": r[4], "created_at": r[5]}
+            for r in rows
+        ]
+
+    async def list(self, limit: int = 100) -> List[Dict[str, Any]]:
+        await self.flush()
+        return await self._run(self._list, limit)
+
+    def _pop(self, entry_id: int) -> Optional[Dict]:
+        db = self._connect()
+        row = db.execute("SELECT payload FROM dead_letters WHERE id = ?", (entry_id,)).fetchone()
+        if row is None:
+            return None
+        db.execute("DELETE FROM dead_letters WHERE id = ?", (entry_id,))
+        return json.loads(row[0])
+
+    async def pop(self, entry_id: int) -> Optional[Dict]:
+        """Remove a dead letter and return its payload"""
+        return await self._run(self._pop, entry_id)
+
+    def _count(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM dead_letters").fetchone()[0]
+
+    async def count(self) -> int:
+        await self.flush()
+        return await self._run(self._count)
+
+    async def close(self):
+        """Write queued dead letters and close the database"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        await self.flush()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+class ResilientSender:
+    """Wraps a Graph API POST with error classification, retries, a circuit breaker and dead-lettering"""
+
+    def __init__(
+        self,
+        post: Callable[[Any], Awaitable["httpx.Response"]],
+        policy: Optional[RetryPolicy] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        dead_letters: Optional[DeadLetterStore] = None
+    ):
+        self.post = post
+        self.policy = policy or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self.dead_letters = dead_letters or DeadLetterStore()
+
+        # Counters
+        self.retries = 0
+        self.abandoned = 0
+        self.errors_by_status: Dict[str, int] = {}
+
+    def _count_error(self, error: Exception):
+        import httpx
+
+        if isinstance(error, httpx.HTTPStatusError):
+            key = str(error.response.status_code)
+        else:
+            key = type(error).__name__
+        self.errors_by_status[key] = self.errors_by_status.get(key, 0) + 1
+
+    def _abandon(self, payload: Any, reason: str, attempts: int):
+        self.abandoned += 1
+        self.dead_letters.add(payload, reason, attempts)
+
+    async def send(self, payload: Any) -> Optional["httpx.Response"]:
+        """Send a payload, returning the response or None once it is abandoned"""
+        import httpx
+
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                self._abandon(payload, "circuit_open", attempt)
+                logger.warning(f"Circuit open, dead-lettered message to {payload.get('to')}")
+                return None
+
+            # Whoever gets the half-open trial must settle it, whatever happens to the send
+            trial = self.breaker.state == CircuitBreaker.HALF_OPEN
+            attempt += 1
+            try:
+                response = await self.post(payload)
+                response.raise_for_status()
+                self.breaker.record_success()
+                return response
+            except (httpx.RequestError, httpx.HTTPStatusError) as e:
+                self._count_error(e)
+                kind = classify_error(e)
+                response = e.response if isinstance(e, httpx.HTTPStatusError) else None
+
+                if isinstance(e, httpx.HTTPStatusError):
+                    logger.error(f"HTTP error sending message: {e.response.status_code} - {e.response.text}")
+                else:
+                    logger.error(f"Request error sending message: {e}")
+
+                if kind == PERMANENT:
+                    if response is not None:
+                        # The API answered, so it is reachable: a 4xx says nothing about its health
+                        self.breaker.record_success()
+                    self._abandon(payload, f"permanent:{response.status_code if response is not None else type(e).__name__}", attempt)
+                    return None
+
+                self.breaker.record_failure()
+                trial = False
+                if attempt >= self.policy.max_attempts:
+                    self._abandon(payload, "retries_exhausted", attempt)
+                    return None
+
+                self.retries += 1
+                await asyncio.sleep(self.policy.delay(attempt, retry_after_seconds(response)))
+            except Exception as e:
+                logger.error(f"Unexpected error sending message: {e}")
+                self._abandon(payload, f"unexpected:{type(e).__name__}", attempt)
+                return None
+            finally:
+                # No-op once record_success/record_failure settled it; covers exceptions and cancellation
+                if trial:
+                    self.breaker.release_trial()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "retries": self.retries,
+            "abandoned": self.abandoned,
+            "errors": self.errors_by_status,
+            "max_attempts": self.policy.max_attempts,
+            "circuit_breaker": self.breaker.stats(),
+            "dead_letters": self.dead_letters.added,
+            "dead_letters_pruned": self.dead_letters.pruned
+        }
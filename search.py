@@ -0,0 +1,186 @@
+import os
+import re
+import math
+import unicodedata
+from typing import Dict, List, Optional, NamedTuple, Set, Tuple, FrozenSet
+
+from knowledge import QuestionIndex, QuestionEntry
+
+# fuzzywuzzy is imported by the first search, so importing this module stays cheap
+
+# Free-text search configuration
+SEARCH_CANDIDATES = int(os.getenv("SEARCH_CANDIDATES", "5"))
+SEARCH_MIN_SCORE = int(os.getenv("SEARCH_MIN_SCORE", "80"))
+SEARCH_MIN_MARGIN = int(os.getenv("SEARCH_MIN_MARGIN", "5"))
+
+# Minimum trigram similarity for a misspelt query token to match a vocabulary token
+TYPO_MIN_SIMILARITY = 0.45
+
+# Question text counts more than answer text when ranking candidates
+QUESTION_WEIGHT = 2.0
+ANSWER_WEIGHT = 1.0
+
+STOPWORDS = frozenset({
+    "a", "al", "como", "con", "cual", "cuales", "de", "del", "el", "en", "es", "esta", "este",
+    "la", "las", "lo", "los", "me", "mi", "para", "por", "puedo", "que", "se", "si", "su",
+    "tu", "un", "una", "y", "o", "quien", "donde", "cuando", "hay", "son", "ser", "yo"
+})
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def normalize(text: str) -> str:
+    """Lowercase, strip accents and punctuation"""
+    text = text.lower()
+    if not text.isascii():
+        decomposed = unicodedata.normalize("NFKD", text)
+        text = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return _NON_WORD.sub(" ", text).strip()
+
+
+def tokenize(text: str) -> List[str]:
+    """Normalized tokens without stopwords"""
+    return [token for token in normalize(text).split() if token not in STOPWORDS]
+
+
+def trigrams(token: str) -> Set[str]:
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchMatch(NamedTuple):
+    """A scored search hit"""
+    entry: QuestionEntry
+    score: int
+
+
+class QuestionSearch:
+    """
+    Free-text search over question texts and answers.
+
+    Built once per question index: every question gets normalized token
+    weights in an inverted index, and every vocabulary token is indexed by
+    its character trigrams so misspelt query tokens can be mapped back to
+    known words. A lookup gathers candidates from the inverted index, keeps
+    the best few by tf-idf style weight and only runs fuzzy scoring on
+    those, so cost grows with the query rather than the knowledge base.
+    """
+
+    def __init__(self, question_index: QuestionIndex, candidates: int = SEARCH_CANDIDATES):
+        self.candidates = candidates
+        self.entries: List[QuestionEntry] = []
+        self.question_texts: List[str] = []
+        self.postings: Dict[str, Dict[int, float]] = {}
+        self.idf: Dict[str, float] = {}
+        self.trigram_tokens: Dict[str, Set[str]] = {}
+        self.token_trigrams: Dict[str, FrozenSet[str]] = {}
+        self._build(question_index)
+
+    def _build(self, question_index: QuestionIndex):
+        for doc_id, entry in enumerate(question_index.questions.values()):
+            self.entries.append(entry)
+            question_tokens = tokenize(entry.question["text"])
+            self.question_texts.append(" ".join(question_tokens))
+
+            weights: Dict[str, float] = {}
+            for token in question_tokens:
+                weights[token] = weights.get(token, 0.0) + QUESTION_WEIGHT
+            for token in tokenize(entry.question["answer"]):
+                weights[token] = weights.get(token, 0.0) + ANSWER_WEIGHT
+            for token, weight in weights.items():
+                self.postings.setdefault(token, {})[doc_id] = weight
+
+        total = max(len(self.entries), 1)
+        for token, docs in self.postings.items():
+            self.idf[token] = math.log(1 + total / len(docs))
+            token_trigrams = frozenset(trigrams(token))
+            self.token_trigrams[token] = token_trigrams
+            for trigram in token_trigrams:
+                self.trigram_tokens.setdefault(trigram, set()).add(token)
+
+    def _expand(self, token: str) -> List[Tuple[str, float]]:
+        """Vocabulary tokens for a query token, with a similarity factor"""
+        if token in self.postings:
+            return [(token, 1.0)]
+
+        # A token with Jaccard similarity >= TYPO_MIN_SIMILARITY must share at
+        # least one of the rarest trigrams, so only those are scanned for candidates
+        query_trigrams = trigrams(token)
+        min_overlap = math.ceil(TYPO_MIN_SIMILARITY * len(query_trigrams))
+        rarest = sorted(query_trigrams, key=lambda trigram: len(self.trigram_tokens.get(trigram, ())))
+        candidates: Set[str] = set()
+        for trigram in rarest[:len(query_trigrams) - min_overlap + 1]:
+            candidates.update(self.trigram_tokens.get(trigram, ()))
+
+        expansions = []
+        for known in candidates:
+            known_trigrams = self.token_trigrams[known]
+            shared = len(query_trigrams & known_trigrams)
+            similarity = shared / (len(query_trigrams) + len(known_trigrams) - shared)
+            if similarity >= TYPO_MIN_SIMILARITY:
+                expansions.append((known, similarity))
+        expansions.sort(key=lambda item: item[1], reverse=True)
+        return expansions[:3]
+
+    def search(self, text: str, limit: int = 3) -> List[SearchMatch]:
+        """Best matching questions for free text, highest score first"""
+        tokens = tokenize(text)
+        if not tokens:
+            return []
+
+        scores: Dict[int, float] = {}
+        corrected = []
+        for token in tokens:
+            expansions = self._expand(token)
+            if expansions:
+                corrected.append(expansions[0][0])
+            for known, similarity in expansions:
+                idf = self.idf[known] * similarity
+                for doc_id, weight in self.postings[known].items():
+                    scores[doc_id] = scores.get(doc_id, 0.0) + weight * idf
+
+        if not scores:
+            return []
+
+        from fuzzywuzzy import fuzz
+
+        top = sorted(scores, key=scores.get, reverse=True)[:self.candidates]
+        query = " ".join(corrected)
+        matches = []
+        for doc_id in top:
+            question = self.question_texts[doc_id]
+            score = (fuzz.token_set_ratio(query, question) + fuzz.token_sort_ratio(query, question)) // 2
+            matches.append(SearchMatch(self.entries[doc_id], score))
+        matches.sort(key=lambda match: match.score, reverse=True)
+        return matches[:limit]
+
+    def best_matches(self, text: str, min_score: int = SEARCH_MIN_SCORE, min_margin: int = SEARCH_MIN_MARGIN) -> List[QuestionEntry]:
+        """
+        Questions to offer for free text: one when the answer is clear,
+        up to three when close candidates give different answers, none
+        when nothing matches confidently
+        """
+        matches = self.search(text, limit=3)
+        if not matches or matches[0].score < min_score:
+            return []
+
+        # Close candidates with the same answer (e.g. a question listed under two categories) count once
+        entries, answers = [], set()
+        for match in matches:
+            if matches[0].score - match.score >= min_margin:
+                break
+            answer = normalize(match.entry.question["answer"])
+            if answer not in answers:
+                answers.add(answer)
+                entries.append(match.entry)
+        return entries
+
+    def best_match(self, text: str, min_score: int = SEARCH_MIN_SCORE, min_margin: int = SEARCH_MIN_MARGIN) -> Optional[QuestionEntry]:
+        """The matching question if it is confident and unambiguous, else None"""
+        entries = self.best_matches(text, min_score, min_margin)
+        return entries[0] if len(entries) == 1 else None
+
+
+def build_question_search(question_index: QuestionIndex) -> QuestionSearch:
+    """Build the free-text search index for a question index"""
+    return QuestionSearch(question_index)
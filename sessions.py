@@ -0,0 +1,542 @@
+import os
+import abc
+import time
+import asyncio
+import logging
+import sqlite3
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Any, Iterator, Union, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Session store configuration
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "sessions.db")
+SESSION_TTL = float(os.getenv("SESSION_TTL", str(24 * 3600)))
+SESSION_FINISHED_TTL = float(os.getenv("SESSION_FINISHED_TTL", "3600"))
+SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "100000"))
+SESSION_SWEEP_INTERVAL = float(os.getenv("SESSION_SWEEP_INTERVAL", "60"))
+SESSION_FLUSH_INTERVAL = float(os.getenv("SESSION_FLUSH_INTERVAL", "1.0"))
+
+FINISHED_STATE = "finished"
+
+# Conversation states, interned as small ints (unknown states are appended on first use)
+SESSION_STATES = ("new", "main_menu", "app_submenu", "questions_menu", "more_help", "rating", FINISHED_STATE)
+
+
+class Interner:
+    """Two-way mapping between strings and small ints, at most `limit` of them"""
+
+    def __init__(self, values: tuple = (), limit: int = 0xFFFF):
+        self.limit = limit
+        self.values: List[str] = []
+        self.codes: Dict[str, int] = {}
+        for value in values:
+            self.code(value)
+
+    def code(self, value: Optional[str]) -> int:
+        """Code for a value, 0 meaning None"""
+        if value is None:
+            return 0
+        code = self.codes.get(value)
+        if code is None:
+            # Codes never change once handed out, since packed sessions hold them
+            if len(self.values) >= self.limit:
+                raise OverflowError(f"Cannot intern '{value}': all {self.limit} codes are in use")
+            self.values.append(value)
+            code = self.codes[value] = len(self.values)
+        return code
+
+    def value(self, code: int) -> Optional[str]:
+        return self.values[code - 1] if code else None
+
+
+# Sized to the state and category fields of a packed session
+STATES = Interner(SESSION_STATES, limit=0xFF)
+CATEGORIES = Interner(limit=0xFFFF)
+FINISHED_CODE = STATES.code(FINISHED_STATE)
+
+
+class SessionRecord:
+    """
+    Compact session: interned state/category codes plus an epoch-seconds timestamp.
+
+    The in-memory store keeps each session packed into one int and only
+    materializes a record when a handler reads it.
+
+    Exposes the read side of a dict (`get`, `[]`, `in`) so handlers can keep
+    treating sessions as `{"state": ..., "category": ..., "last_interaction": ...}`.
+    """
+
+    __slots__ = ("state_code", "category_code", "last_interaction")
+
+    FIELDS = ("state", "category", "last_interaction")
+
+    def __init__(self, state: Optional[str], category: Optional[str] = None, last_interaction: Optional[int] = None):
+        self.state_code = STATES.code(state)
+        self.category_code = CATEGORIES.code(category)
+        self.last_interaction = int(time.time()) if last_interaction is None else int(last_interaction)
+
+    @classmethod
+    def from_dict(cls, session: Union[Dict, "SessionRecord"]) -> "SessionRecord":
+        if isinstance(session, SessionRecord):
+            return session
+        last_interaction = session.get("last_interaction")
+        return cls(
+            session.get("state"),
+            session.get("category"),
+            last_interaction if isinstance(last_interaction, (int, float)) else None
+        )
+
+    def pack(self) -> int:
+        """Pack into a single int: timestamp, 16-bit category code, 8-bit state code"""
+        return (self.last_interaction << 24) | (self.category_code << 8) | self.state_code
+
+    @classmethod
+    def unpack(cls, packed: int) -> "SessionRecord":
+        record = cls.__new__(cls)
+        record.state_code = packed & 0xFF
+        record.category_code = (packed >> 8) & 0xFFFF
+        record.last_interaction = packed >> 24
+        return record
+
+    @property
+    def state(self) -> Optional[str]:
+        return STATES.value(self.state_code)
+
+    @property
+    def category(self) -> Optional[str]:
+        return CATEGORIES.value(self.category_code)
+
+    @property
+    def finished(self) -> bool:
+        return self.state_code == FINISHED_CODE
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key == "state":
+            value = self.state
+        elif key == "category":
+            value = self.category
+        elif key == "last_interaction":
+            value = self.last_interaction
+        else:
+            return default
+        return default if value is None else value
+
+    def __getitem__(self, key: str) -> Any:
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.FIELDS and self.get(key) is not None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: self.get(key) for key in self.FIELDS if self.get(key) is not None}
+
+    def __repr__(self) -> str:
+        return f"SessionRecord({self.to_dict()})"
+
+
+class SessionStore(abc.ABC):
+    """
+    Dict-like session storage with idle expiry.
+
+    Handlers keep using `user_sessions[to] = {...}`, `.get()`, `in` and
+    `del`; sessions are stored as compact `SessionRecord`s. Sessions idle
+    for longer than `ttl` are dropped, and finished conversations are
+    dropped after the shorter `finished_ttl`.
+    """
+
+    backend = "base"
+
+    def __init__(
+        self,
+        ttl: float = SESSION_TTL,
+        finished_ttl: float = SESSION_FINISHED_TTL,
+        max_entries: int = SESSION_MAX_ENTRIES,
+        sweep_interval: float = SESSION_SWEEP_INTERVAL
+    ):
+        self.ttl = ttl
+        self.finished_ttl = finished_ttl
+        self.max_entries = max_entries
+        self.sweep_interval = sweep_interval
+        self._sweeper: Optional[asyncio.Task] = None
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+        self.sweeps = 0
+        self.last_sweep_removed = 0
+
+    def _is_expired(self, record: SessionRecord, now: float) -> bool:
+        ttl = self.finished_ttl if record.finished else self.ttl
+        return now - record.last_interaction > ttl
+
+    # ---- backend interface ----
+
+    @abc.abstractmethod
+    def _load(self, key: str) -> Optional[SessionRecord]:
+        ...
+
+    @abc.abstractmethod
+    def _store(self, key: str, record: SessionRecord):
+        ...
+
+    @abc.abstractmethod
+    def _remove(self, key: str) -> bool:
+        ...
+
+    @abc.abstractmethod
+    def _clear(self) -> int:
+        ...
+
+    @abc.abstractmethod
+    def _size(self) -> int:
+        ...
+
+    @abc.abstractmethod
+    def sweep(self) -> int:
+        """Remove expired sessions, returning how many were dropped"""
+
+    @abc.abstractmethod
+    def __iter__(self) -> Iterator[str]:
+        """Phone numbers with a stored session"""
+
+    def close(self):
+        """Release backend resources"""
+
+    # ---- dict-like facade ----
+
+    def get(self, key: str, default: Any = None) -> Any:
+        record = self._load(key)
+        if record is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return record
+
+    def __getitem__(self, key: str) -> SessionRecord:
+        record = self.get(key)
+        if record is None:
+            raise KeyError(key)
+        return record
+
+    def __setitem__(self, key: str, session: Union[Dict, SessionRecord]):
+        self._store(key, SessionRecord.from_dict(session))
+
+    def __delitem__(self, key: str):
+        if not self._remove(key):
+            raise KeyError(key)
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, str) and self._load(key) is not None
+
+    def __len__(self) -> int:
+        return self._size()
+
+    def clear(self) -> int:
+        return self._clear()
+
+    # ---- background sweeper ----
+
+    def start(self):
+        """Start the periodic expiry sweeper"""
+        if self._sweeper is None and self.sweep_interval > 0:
+            self._sweeper = asyncio.create_task(self._sweep_loop(), name="session-sweeper")
+
+    async def stop(self):
+        """Stop the sweeper and close the backend"""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+        self.close()
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                removed = self.sweep()
+                self.sweeps += 1
+                self.last_sweep_removed = removed
+                if removed:
+                    logger.info(f"Session sweep removed {removed} expired sessions")
+            except Exception as e:
+                logger.error(f"Error sweeping sessions: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Size and expiry statistics"""
+        return {
+            "backend": self.backend,
+            "active_sessions": len(self),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "finished_ttl_seconds": self.finished_ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "sweeps": self.sweeps,
+            "last_sweep_removed": self.last_sweep_removed
+        }
+
+
+class InMemorySessionStore(SessionStore):
+    """In-process store with idle-TTL expiry, evicting the least recently written session when full"""
+
+    backend = "memory"
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # Packed SessionRecords, ordered from least to most recently written
+        self._sessions: "OrderedDict[str, int]" = OrderedDict()
+        # Finished conversations, ordered by when they finished
+        self._finished: "OrderedDict[str, None]" = OrderedDict()
+
+    def _load(self, key: str) -> Optional[SessionRecord]:
+        packed = self._sessions.get(key)
+        if packed is None:
+            return None
+
+        record = SessionRecord.unpack(packed)
+        if self._is_expired(record, time.time()):
+            self._remove(key)
+            self.expired += 1
+            return None
+        return record
+
+    def _store(self, key: str, record: SessionRecord):
+        self._sessions[key] = record.pack()
+        self._sessions.move_to_end(key)
+
+        if record.finished:
+            self._finished[key] = None
+            self._finished.move_to_end(key)
+        else:
+            self._finished.pop(key, None)
+
+        while len(self._sessions) > self.max_entries:
+            self._evict(next(iter(self._sessions)))
+
+    def _evict(self, key: str):
+        del self._sessions[key]
+        self._finished.pop(key, None)
+        self.evicted += 1
+
+    def _remove(self, key: str) -> bool:
+        self._finished.pop(key, None)
+        return self._sessions.pop(key, None) is not None
+
+    def _clear(self) -> int:
+        count = len(self._sessions)
+        self._sessions.clear()
+        self._finished.clear()
+        return count
+
+    def _size(self) -> int:
+        return len(self._sessions)
+
+    def sweep(self) -> int:
+        now = time.time()
+        removed = 0
+
+        # Least recently written sessions sit at the front
+        while self._sessions:
+            key, packed = next(iter(self._sessions.items()))
+            if now - (packed >> 24) <= self.ttl:
+                break
+            self._remove(key)
+            removed += 1
+
+        while self._finished:
+            key = next(iter(self._finished))
+            if now - (self._sessions[key] >> 24) <= self.finished_ttl:
+                break
+            self._remove(key)
+            removed += 1
+
+        self.expired += removed
+        return removed
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._sessions))
+
+
+class SQLiteSessionStore(InMemorySessionStore):
+    """
+    In-memory sessions persisted to local SQLite, so they survive restarts of a single instance.
+
+    Handlers read and write the in-memory copy. Changes are written behind
+    in batches every `flush_interval` seconds on a single executor thread,
+    as the journal does, so the event loop never waits on the database.
+    Unexpired sessions are loaded back when the store is created; changes
+    from the last `flush_interval` before a crash are lost.
+    """
+
+    backend = "sqlite"
+
+    def __init__(self, path: str = SESSION_DB_PATH, flush_interval: float = SESSION_FLUSH_INTERVAL, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.flush_interval = flush_interval
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "phone TEXT PRIMARY KEY, state TEXT, category TEXT, last_interaction INTEGER NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_last_interaction ON sessions (last_interaction)")
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sessions")
+        self._flusher: Optional[asyncio.Task] = None
+
+        # phone -> (state, category, last_interaction) to write, or None to delete
+        self._dirty: Dict[str, Optional[Tuple[Optional[str], Optional[str], int]]] = {}
+        self._cleared = False
+        self._prune_due = False
+
+        # Counters
+        self.restored = 0
+        self.flushes = 0
+
+        self._restore()
+
+    def _restore(self):
+        # Runs while the app is being created, before the event loop serves anything
+        rows = self._db.execute(
+            "SELECT phone, state, category, last_interaction FROM "
+            "(SELECT * FROM sessions ORDER BY last_interaction DESC LIMIT ?) ORDER BY last_interaction",
+            (self.max_entries,)
+        ).fetchall()
+        now = time.time()
+        for phone, state, category, last_interaction in rows:
+            record = SessionRecord(state, category, last_interaction)
+            if not self._is_expired(record, now):
+                super()._store(phone, record)
+                self.restored += 1
+
+    def _store(self, key: str, record: SessionRecord):
+        super()._store(key, record)
+        self._dirty[key] = (record.state, record.category, record.last_interaction)
+
+    def _remove(self, key: str) -> bool:
+        self._dirty[key] = None
+        return super()._remove(key)
+
+    def _evict(self, key: str):
+        self._dirty[key] = None
+        super()._evict(key)
+
+    def _clear(self) -> int:
+        self._dirty.clear()
+        self._cleared = True
+        return super()._clear()
+
+    def sweep(self) -> int:
+        # Also expire and trim the database on the next flush, for rows left by earlier runs
+        self._prune_due = True
+        return super().sweep()
+
+    # ---- write-behind ----
+
+    def _write(self, batch: Dict[str, Optional[Tuple]], cleared: bool, prune: bool):
+        db = self._db
+        db.execute("BEGIN")
+        try:
+            if cleared:
+                db.execute("DELETE FROM sessions")
+            db.executemany(
+                "DELETE FROM sessions WHERE phone = ?",
+                [(key,) for key, row in batch.items() if row is None]
+            )
+            db.executemany(
+                "INSERT INTO sessions (phone, state, category, last_interaction) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(phone) DO UPDATE SET state = excluded.state, category = excluded.category, "
+                "last_interaction = excluded.last_interaction",
+                [(key, *row) for key, row in batch.items() if row is not None]
+            )
+            if prune:
+                now = time.time()
+                db.execute(
+                    "DELETE FROM sessions WHERE last_interaction < ? OR (state = ? AND last_interaction < ?)",
+                    (now - self.ttl, FINISHED_STATE, now - self.finished_ttl)
+                )
+                db.execute(
+                    "DELETE FROM sessions WHERE phone NOT IN "
+                    "(SELECT phone FROM sessions ORDER BY last_interaction DESC LIMIT ?)",
+                    (self.max_entries,)
+                )
+            db.execute("COMMIT")
+        except sqlite3.Error:
+            db.execute("ROLLBACK")
+            raise
+
+    async def flush(self):
+        """Write the changes made since the last flush in one transaction"""
+        if not self._dirty and not self._cleared and not self._prune_due:
+            return
+
+        batch, self._dirty = self._dirty, {}
+        cleared, self._cleared = self._cleared, False
+        prune, self._prune_due = self._prune_due, False
+        try:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._write, batch, cleared, prune)
+            self.flushes += 1
+        except BaseException:
+            # Changes made while this batch was being written are newer and win
+            for key, row in batch.items():
+                self._dirty.setdefault(key, row)
+            self._cleared = self._cleared or cleared
+            self._prune_due = self._prune_due or prune
+            raise
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except sqlite3.Error as e:
+                logger.error(f"Error writing sessions: {e}")
+
+    def start(self):
+        """Start the expiry sweeper and the write-behind flusher"""
+        super().start()
+        if self._flusher is None and self.flush_interval > 0:
+            self._flusher = asyncio.create_task(self._flush_loop(), name="session-flusher")
+
+    async def stop(self):
+        """Write outstanding changes, then stop and close the database"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        try:
+            await self.flush()
+        except sqlite3.Error as e:
+            logger.error(f"Error writing sessions on shutdown: {e}")
+        await super().stop()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self._db.close()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        stats["restored"] = self.restored
+        stats["flushes"] = self.flushes
+        stats["unflushed_changes"] = len(self._dirty)
+        return stats
+
+
+def create_session_store(backend: str = SESSION_BACKEND) -> SessionStore:
+    """Create the session store selected by SESSION_BACKEND"""
+    if backend == "sqlite":
+        return SQLiteSessionStore()
+    if backend != "memory":
+        logger.warning(f"Unknown SESSION_BACKEND '{backend}', using in-memory store")
+    return InMemorySessionStore()
@@ -0,0 +1,97 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Dict, Optional, Any, Deque, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Status aggregation configuration
+STATUS_WINDOW = int(os.getenv("STATUS_WINDOW", "60"))
+STATUS_HISTORY = int(os.getenv("STATUS_HISTORY", "60"))
+
+KNOWN_STATUSES = ("sent", "delivered", "read", "failed")
+
+
+class StatusAggregator:
+    """
+    Counts delivery status callbacks per time window instead of logging each one.
+
+    Windows are flushed to the log as a single summary line and kept in a
+    short history for the stats endpoint. Failed statuses are still logged
+    individually, with their error details.
+    """
+
+    def __init__(self, window: int = STATUS_WINDOW, history: int = STATUS_HISTORY):
+        self.window = window
+        self.totals: Dict[str, int] = {}
+        self.history: Deque[Tuple[int, Dict[str, int]]] = deque(maxlen=history)
+        self._window_start = self._current_window()
+        self._counts: Dict[str, int] = {}
+        self._flusher: Optional[asyncio.Task] = None
+
+    def _current_window(self) -> int:
+        return int(time.time()) // self.window * self.window
+
+    def record(self, status: Dict):
+        """Count a single status callback"""
+        window_start = self._current_window()
+        if window_start != self._window_start:
+            self._roll(window_start)
+
+        name = status.get("status")
+        if name not in KNOWN_STATUSES:
+            name = "other"
+        self._counts[name] = self._counts.get(name, 0) + 1
+        self.totals[name] = self.totals.get(name, 0) + 1
+
+        if name == "failed":
+            logger.warning(
+                "Message %s to %s failed: %s",
+                status.get("id"), status.get("recipient_id"), status.get("errors")
+            )
+
+    def _roll(self, window_start: int):
+        if self._counts:
+            self.history.append((self._window_start, self._counts))
+            logger.info(
+                "Status callbacks for window %s: %s",
+                time.strftime("%H:%M:%S", time.localtime(self._window_start)),
+                ", ".join(f"{name}={count}" for name, count in sorted(self._counts.items()))
+            )
+        self._window_start = window_start
+        self._counts = {}
+
+    def flush(self):
+        """Close the current window if it has ended"""
+        window_start = self._current_window()
+        if window_start != self._window_start:
+            self._roll(window_start)
+
+    def start(self):
+        """Start the periodic flusher"""
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_loop(), name="status-flusher")
+
+    async def stop(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        self._roll(self._current_window())
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.window - time.time() % self.window + 0.01)
+            self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        """Totals, the open window and recent closed windows"""
+        self.flush()
+        return {
+            "window_seconds": self.window,
+            "totals": dict(self.totals),
+            "current_window": {"start": self._window_start, "counts": dict(self._counts)},
+            "windows": [{"start": start, "counts": counts} for start, counts in reversed(self.history)]
+        }
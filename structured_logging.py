@@ -0,0 +1,158 @@
+import os
+import sys
+import json
+import queue
+import random
+import logging
+import logging.handlers
+from typing import Dict, Any
+
+# Logging configuration
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Per-logger levels, e.g. "httpx=WARNING,journal=DEBUG"
+LOG_LEVELS = os.getenv("LOG_LEVELS", "httpx=WARNING,httpcore=WARNING")
+# Sampling rates per event category, e.g. "message.sent=0.1,message.routed=0.05"
+LOG_SAMPLING = os.getenv("LOG_SAMPLING", "")
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# LogRecord attributes that are not user-supplied `extra` fields
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+
+def parse_mapping(value: str) -> Dict[str, str]:
+    """Parse "key=value,key=value" settings"""
+    mapping = {}
+    for item in value.split(","):
+        if "=" in item:
+            key, _, setting = item.partition("=")
+            mapping[key.strip()] = setting.strip()
+    return mapping
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with `extra` fields as top-level keys"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps only a fraction of high-volume records.
+
+    Records are categorized by their `event` extra field; records without
+    one, and anything at WARNING or above, always pass.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self.sampled_out: Dict[str, int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        event = getattr(record, "event", None)
+        rate = self.rates.get(event)
+        if rate is None or random.random() < rate:
+            return True
+        self.sampled_out[event] = self.sampled_out.get(event, 0) + 1
+        return False
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to the listener thread without formatting them.
+
+    The stdlib QueueHandler formats each message on the calling thread;
+    here formatting is left to the listener, so the event loop only pays
+    for creating the record. Records are dropped and counted, never
+    waited on, if the queue is full.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LoggingPipeline:
+    """Root logger wiring: sampling filter -> bounded queue -> listener thread -> stream"""
+
+    def __init__(self, handler: NonBlockingQueueHandler, listener: logging.handlers.QueueListener, sampler: SamplingFilter):
+        self.handler = handler
+        self.listener = listener
+        self.sampler = sampler
+        self.running = False
+
+    def start(self):
+        """Start the listener thread that formats and writes records"""
+        if not self.running:
+            self.listener.start()
+            self.running = True
+
+    def stop(self):
+        """Flush queued records and stop the listener thread"""
+        if self.running:
+            self.listener.stop()
+            self.running = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "queue_depth": self.handler.queue.qsize(),
+            "queue_capacity": self.handler.queue.maxsize,
+            "dropped": self.handler.dropped,
+            "sampling_rates": self.sampler.rates,
+            "sampled_out": dict(self.sampler.sampled_out)
+        }
+
+
+def setup_logging(stream=None) -> LoggingPipeline:
+    """Replace the root logger's handlers with the queued pipeline"""
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT))
+
+    log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    handler = NonBlockingQueueHandler(log_queue)
+    sampler = SamplingFilter({event: float(rate) for event, rate in parse_mapping(LOG_SAMPLING).items()})
+    handler.addFilter(sampler)
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL.upper())
+
+    for name, level in parse_mapping(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    pipeline = LoggingPipeline(
+        handler,
+        logging.handlers.QueueListener(log_queue, output, respect_handler_level=True),
+        sampler
+    )
+    pipeline.start()
+    return pipeline
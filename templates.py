@@ -0,0 +1,41 @@
+import json
+from typing import Dict, Callable, NamedTuple
+
+# Recipient placeholder spliced out of the serialized template
+RECIPIENT_PLACEHOLDER = "__RECIPIENT__"
+
+
+def serialize_payload(payload: Dict) -> bytes:
+    """Compact JSON encoding used for every outbound body"""
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class SerializedPayload(NamedTuple):
+    """Outbound payload already encoded as a JSON request body"""
+    to: str
+    body: bytes
+
+    def get(self, key: str, default=None):
+        """Dict-style access for code that only needs the recipient"""
+        return self.to if key == "to" else default
+
+
+class PayloadTemplate:
+    """
+    A payload rendered and serialized once; only the recipient differs per send.
+
+    The builder is called with a placeholder recipient and the resulting
+    bytes are split around it, so `render` is two concatenations.
+    """
+
+    def __init__(self, builder: Callable[[str], Dict]):
+        body = serialize_payload(builder(RECIPIENT_PLACEHOLDER))
+        marker = json.dumps(RECIPIENT_PLACEHOLDER).encode("utf-8")
+        parts = body.split(marker)
+        if len(parts) != 2:
+            raise ValueError("Payload template must contain the recipient exactly once")
+        self.prefix, self.suffix = parts
+
+    def render(self, to: str) -> SerializedPayload:
+        """Splice the recipient into the serialized template"""
+        return SerializedPayload(to, self.prefix + json.dumps(to).encode("utf-8") + self.suffix)
@@ -0,0 +1,215 @@
+import os
+import math
+import time
+from array import array
+from typing import Dict, List, Optional, Any
+
+from metrics import Counter
+
+# Per-sender inbound throttling (THROTTLE_LIMIT=0 disables it)
+THROTTLE_LIMIT = float(os.getenv("THROTTLE_LIMIT", "30"))
+THROTTLE_HALF_LIFE = float(os.getenv("THROTTLE_HALF_LIFE", "60"))
+THROTTLE_COOLDOWN = float(os.getenv("THROTTLE_COOLDOWN", "300"))
+THROTTLE_SKETCH_WIDTH = int(os.getenv("THROTTLE_SKETCH_WIDTH", "4096"))
+THROTTLE_SKETCH_DEPTH = int(os.getenv("THROTTLE_SKETCH_DEPTH", "4"))
+THROTTLE_TOP_K = int(os.getenv("THROTTLE_TOP_K", "50"))
+
+ALLOW = "allow"
+DROP = "drop"
+COOL_DOWN = "cool_down"
+
+# Forward-decay weights grow without bound; rescale the sketch before they overflow
+_RESCALE_AT = 1e100
+
+
+class DecayingSketch:
+    """
+    Count-min sketch of exponentially decayed counts.
+
+    Memory is `depth` x `width` floats however many keys are counted.
+    Decay uses forward decay: increments are weighted by e^(λ·t) and
+    estimates divided by the current weight, so no cell has to be touched
+    as time passes. Conservative update keeps overestimates from hash
+    collisions small.
+    """
+
+    def __init__(self, half_life: float, width: int = THROTTLE_SKETCH_WIDTH, depth: int = THROTTLE_SKETCH_DEPTH):
+        self.width = width
+        self.depth = depth
+        self.decay = math.log(2) / half_life
+        self._cells = [array("d", bytes(8 * width)) for _ in range(depth)]
+        self._origin = time.monotonic()
+        self.rescales = 0
+
+    def _weight(self, now: float) -> float:
+        weight = math.exp(self.decay * (now - self._origin))
+        if weight >= _RESCALE_AT:
+            for row in self._cells:
+                for i in range(self.width):
+                    row[i] /= weight
+            self._origin = now
+            self.rescales += 1
+            weight = 1.0
+        return weight
+
+    def _slots(self, key: str) -> List[int]:
+        # Double hashing: one 64-bit hash gives each row an independent-enough slot
+        h = hash(key) & 0xFFFFFFFFFFFFFFFF
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        return [(h1 + row * h2) % self.width for row in range(self.depth)]
+
+    def add(self, key: str, now: float) -> float:
+        """Count one event for `key`, returning its decayed count including it"""
+        weight = self._weight(now)
+        slots = self._slots(key)
+        value = min(self._cells[row][slot] for row, slot in enumerate(slots)) + weight
+        for row, slot in enumerate(slots):
+            if self._cells[row][slot] < value:
+                self._cells[row][slot] = value
+        return value / weight
+
+    def estimate(self, key: str, now: float) -> float:
+        weight = self._weight(now)
+        return min(self._cells[row][slot] for row, slot in enumerate(self._slots(key))) / weight
+
+    def memory_bytes(self) -> int:
+        return sum(row.itemsize * len(row) for row in self._cells)
+
+
+class Offender:
+    """A sender in the top-offenders table"""
+
+    __slots__ = ("sender", "score", "updated", "messages", "dropped", "throttled_at", "notified_at")
+
+    def __init__(self, sender: str, now: float):
+        self.sender = sender
+        self.score = 0.0
+        self.updated = now
+        self.messages = 0
+        self.dropped = 0
+        self.throttled_at: Optional[float] = None
+        self.notified_at: Optional[float] = None
+
+
+class SenderThrottle:
+    """
+    Per-sender inbound rate limiting in fixed memory.
+
+    Each sender's message rate is tracked as a count decaying with
+    `half_life`, kept in a DecayingSketch. A sender whose count exceeds
+    `limit` has messages dropped until it decays below it again, and is
+    sent one cool-down reply per `cooldown` seconds. A sender keeping up
+    r messages/s settles at a count of about r * half_life / ln 2.
+
+    The `top_k` heaviest senders seen above half the limit are kept in an
+    offenders table for reporting; it is bounded too, evicting the lowest
+    score when a heavier sender shows up.
+    """
+
+    def __init__(
+        self,
+        limit: float = THROTTLE_LIMIT,
+        half_life: float = THROTTLE_HALF_LIFE,
+        cooldown: float = THROTTLE_COOLDOWN,
+        top_k: int = THROTTLE_TOP_K
+    ):
+        self.limit = limit
+        self.half_life = half_life
+        self.cooldown = cooldown
+        self.top_k = top_k
+        self.enabled = limit > 0
+        self.sketch = DecayingSketch(half_life) if self.enabled else None
+        self._offenders: Dict[str, Offender] = {}
+
+        # Instrumentation
+        self.decisions = Counter(("decision",))
+        self.evicted = 0
+
+    def _decayed(self, offender: Offender, now: float) -> float:
+        return offender.score * math.exp(-self.sketch.decay * (now - offender.updated))
+
+    def _track(self, sender: str, score: float, now: float) -> Optional[Offender]:
+        """The sender's offenders-table entry, added if it is heavy enough"""
+        offender = self._offenders.get(sender)
+        if offender is None:
+            if score < self.limit / 2:
+                return None
+            if len(self._offenders) >= self.top_k:
+                lightest = min(self._offenders.values(), key=lambda o: self._decayed(o, now))
+                if self._decayed(lightest, now) >= score:
+                    return None
+                del self._offenders[lightest.sender]
+                self.evicted += 1
+            offender = self._offenders[sender] = Offender(sender, now)
+        offender.score = score
+        offender.updated = now
+        offender.messages += 1
+        return offender
+
+    def check(self, sender: Optional[str]) -> str:
+        """Count an inbound message: ALLOW it, DROP it, or drop it and send a COOL_DOWN reply"""
+        if not self.enabled or not sender:
+            return ALLOW
+
+        now = time.monotonic()
+        score = self.sketch.add(sender, now)
+        offender = self._track(sender, score, now)
+
+        if score <= self.limit:
+            decision = ALLOW
+            if offender is not None:
+                offender.throttled_at = None
+        elif offender is None:
+            # Already top_k heavier senders in the table: drop without tracking a cool-down
+            decision = DROP
+        else:
+            offender.dropped += 1
+            if offender.throttled_at is None:
+                offender.throttled_at = now
+            if offender.notified_at is None or now - offender.notified_at >= self.cooldown:
+                offender.notified_at = now
+                decision = COOL_DOWN
+            else:
+                decision = DROP
+        self.decisions.inc(decision)
+        return decision
+
+    def throttled(self) -> int:
+        """Senders in the offenders table currently over the limit"""
+        if not self.enabled:
+            return 0
+        now = time.monotonic()
+        return sum(1 for offender in self._offenders.values() if self._decayed(offender, now) > self.limit)
+
+    def top_offenders(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Heaviest senders by current decayed message count"""
+        if not self.enabled:
+            return []
+        now = time.monotonic()
+        offenders = sorted(self._offenders.values(), key=lambda o: self._decayed(o, now), reverse=True)
+        report = []
+        for offender in offenders[:limit]:
+            score = self._decayed(offender, now)
+            report.append({
+                "sender": offender.sender,
+                "score": round(score, 2),
+                "throttled": score > self.limit,
+                "messages_tracked": offender.messages,
+                "dropped": offender.dropped,
+                "last_seen_seconds_ago": round(now - offender.updated, 1),
+                "throttled_seconds_ago": round(now - offender.throttled_at, 1) if offender.throttled_at is not None else None
+            })
+        return report
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "limit": self.limit,
+            "half_life_seconds": self.half_life,
+            "cooldown_seconds": self.cooldown,
+            "throttled_senders": self.throttled(),
+            "tracked_offenders": len(self._offenders),
+            "evicted_offenders": self.evicted,
+            "decisions": {values[0]: int(count) for values, count in self.decisions.values.items()},
+            "sketch_bytes": self.sketch.memory_bytes() if self.enabled else 0
+        }
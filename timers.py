@@ -0,0 +1,190 @@
+import time
+import heapq
+import asyncio
+import logging
+import contextvars
+from typing import Dict, List, Optional, Any, Callable, Awaitable
+
+logger = logging.getLogger(__name__)
+
+# Item whose action is currently running, so follow-ups it schedules can be cancelled with it
+_current_item: contextvars.ContextVar = contextvars.ContextVar("current_scheduled_item", default=None)
+
+
+class ScheduledItem:
+    """A delayed action waiting in the scheduler heap"""
+
+    __slots__ = ("due", "seq", "key", "action", "context", "cancelled")
+
+    def __init__(self, due: float, seq: int, key: str, action: Callable[[], Awaitable], context: contextvars.Context):
+        self.due = due
+        self.seq = seq
+        self.key = key
+        self.action = action
+        self.context = context
+        self.cancelled = False
+
+    def __lt__(self, other: "ScheduledItem") -> bool:
+        return (self.due, self.seq) < (other.due, other.seq)
+
+
+class DelayedScheduler:
+    """
+    Heap-based delayed delivery scheduler.
+
+    Handlers call `schedule(delay, key, action)` and return immediately;
+    a single loop fires due actions as tasks. Items are grouped by key
+    (the recipient) so a user's pending sends can be cancelled when they
+    move on to something else.
+    """
+
+    def __init__(self):
+        self._heap: List[ScheduledItem] = []
+        self._by_key: Dict[str, List[ScheduledItem]] = {}
+        self._seq = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._running: set = set()
+        self._firing: Dict[str, List[ScheduledItem]] = {}
+        self._idle_callbacks: Dict[str, List[Callable[[], None]]] = {}
+
+        # Counters
+        self.scheduled_total = 0
+        self.fired = 0
+        self.cancelled = 0
+        self.errors = 0
+
+    def start(self):
+        """Start the scheduler loop"""
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run(), name="delayed-scheduler")
+
+    async def stop(self):
+        """Stop the loop and drop everything still pending"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._heap.clear()
+        self._by_key.clear()
+        # Dropped, not called: whatever was waiting on these keys did not finish
+        self._idle_callbacks.clear()
+
+    def schedule(self, delay: float, key: str, action: Callable[[], Awaitable]) -> Optional[ScheduledItem]:
+        """Run `action` after `delay` seconds unless `key` is cancelled first"""
+        if self._task is None:
+            self.start()
+
+        # A follow-up scheduled by an action that was cancelled mid-flight is dropped
+        parent = _current_item.get()
+        if parent is not None and parent.key == key and parent.cancelled:
+            self.cancelled += 1
+            return None
+
+        self._seq += 1
+        item = ScheduledItem(time.monotonic() + delay, self._seq, key, action, contextvars.copy_context())
+        heapq.heappush(self._heap, item)
+        self._by_key.setdefault(key, []).append(item)
+        self.scheduled_total += 1
+
+        # Wake the loop if this item is now the earliest
+        if self._heap[0] is item:
+            self._wakeup.set()
+        return item
+
+    def cancel(self, key: str) -> int:
+        """Cancel every pending item for a key, returning how many were dropped"""
+        items = self._by_key.pop(key, [])
+        for item in items + self._firing.get(key, []):
+            item.cancelled = True
+        self.cancelled += len(items)
+        self._notify_idle(key)
+        return len(items)
+
+    def when_idle(self, key: str, callback: Callable[[], None]):
+        """Call `callback` once `key` has nothing pending or running; right away if it is idle now"""
+        if self._is_idle(key):
+            callback()
+        else:
+            self._idle_callbacks.setdefault(key, []).append(callback)
+
+    def _is_idle(self, key: str) -> bool:
+        return key not in self._by_key and key not in self._firing
+
+    def _notify_idle(self, key: str):
+        if key in self._idle_callbacks and self._is_idle(key):
+            for callback in self._idle_callbacks.pop(key):
+                callback()
+
+    def pending(self, key: Optional[str] = None) -> int:
+        """Number of items still waiting to fire"""
+        if key is not None:
+            return len(self._by_key.get(key, []))
+        return sum(len(items) for items in self._by_key.values())
+
+    def _forget(self, item: ScheduledItem):
+        items = self._by_key.get(item.key)
+        if items is None:
+            return
+        try:
+            items.remove(item)
+        except ValueError:
+            pass
+        if not items:
+            del self._by_key[item.key]
+
+    async def _run(self):
+        while True:
+            # Drop cancelled items sitting at the top of the heap
+            while self._heap and self._heap[0].cancelled:
+                heapq.heappop(self._heap)
+
+            if not self._heap:
+                timeout = None
+            else:
+                timeout = self._heap[0].due - time.monotonic()
+
+            if timeout is None or timeout > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            item = heapq.heappop(self._heap)
+            # Counted as firing before it leaves the pending set, so the key never looks idle in between
+            self._firing.setdefault(item.key, []).append(item)
+            self._forget(item)
+            self.fired += 1
+            task = item.context.run(asyncio.create_task, self._fire(item))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _fire(self, item: ScheduledItem):
+        _current_item.set(item)
+        firing = self._firing[item.key]
+        try:
+            await item.action()
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Error running scheduled action for {item.key}: {e}")
+        finally:
+            firing.remove(item)
+            if not firing and self._firing.get(item.key) is firing:
+                del self._firing[item.key]
+            self._notify_idle(item.key)
+
+    def stats(self) -> Dict[str, Any]:
+        """Scheduler counters"""
+        return {
+            "scheduled": self.pending(),
+            "recipients_with_pending": len(self._by_key),
+            "heap_size": len(self._heap),
+            "running_actions": len(self._running),
+            "scheduled_total": self.scheduled_total,
+            "fired": self.fired,
+            "cancelled": self.cancelled,
+            "errors": self.errors
+        }